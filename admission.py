@@ -0,0 +1,208 @@
+"""请求准入控制：按接口分级限流，多个 gunicorn 进程共享同一组限额
+
+每个通道（lane）有固定数量的执行槽位和排队位置：
+    <ADMISSION_DIR>/<lane>/slot-<i>.lock   持有排他锁即占用一个执行槽位
+    <ADMISSION_DIR>/<lane>/queue.lock      内容为各进程在该通道排队的请求数（JSON），读写时持有该文件的锁
+执行槽位使用 flock 实现，进程异常退出时锁由操作系统自动释放；排队数按进程号记录，
+读写时剔除已退出的进程，同样不会残留占用。查看排队数不会占用排队位置，不影响其他请求排队。
+低优先级通道在高优先级通道有请求排队时让出槽位；排队已满或等待超时
+立即返回 503 并携带 Retry-After，而不是让请求一直挂起直到超时。
+"""
+import functools
+import json
+import os
+import time
+
+from flask import current_app, jsonify
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境下不做限流
+    fcntl = None
+
+# 通道配置：priority 越小优先级越高；limit 为同时执行数，queue 为排队上限，
+# timeout 为排队最长等待秒数，retry_after 为拒绝时建议客户端重试的秒数
+DEFAULT_LANES = {
+    'auth': {'priority': 0, 'limit': 64, 'queue': 64, 'timeout': 5, 'retry_after': 1},
+    'submit': {'priority': 1, 'limit': 8, 'queue': 64, 'timeout': 60, 'retry_after': 5},
+    'draft': {'priority': 2, 'limit': 16, 'queue': 32, 'timeout': 5, 'retry_after': 10},
+    'export': {'priority': 3, 'limit': 2, 'queue': 4, 'timeout': 30, 'retry_after': 30},
+}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, lane, retry_after):
+        super().__init__(f"通道 {lane} 已满")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+# 尝试以非阻塞方式锁定一组锁文件中的任意一个，成功返回文件描述符，否则返回None
+def _try_lock_any(directory, prefix, count):
+    for i in range(count):
+        fd = os.open(os.path.join(directory, f"{prefix}-{i}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+    return None
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# 在排队计数文件的锁内读取各进程的排队数，交给 update 处理（可原地修改），修改后写回；
+# 返回 update 的结果。只读取时使用共享锁
+def _with_queue(directory, update, write=True):
+    fd = os.open(os.path.join(directory, 'queue.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+        os.lseek(fd, 0, os.SEEK_SET)
+        data = os.read(fd, os.fstat(fd).st_size)
+        try:
+            counts = {int(pid): count for pid, count in json.loads(data).items()}
+        except (ValueError, AttributeError):
+            counts = {}  # 新建或写入中途进程退出的文件
+        counts = {pid: count for pid, count in counts.items() if count > 0 and _process_alive(pid)}
+        result = update(counts)
+        if write:
+            data = json.dumps({str(pid): count for pid, count in counts.items() if count > 0}).encode()
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, data)
+        return result
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+# 在通道中占用一个排队位置，排队已满时返回False
+def _enter_queue(directory, limit):
+    def update(counts):
+        if sum(counts.values()) >= limit:
+            return False
+        counts[os.getpid()] = counts.get(os.getpid(), 0) + 1
+        return True
+    return _with_queue(directory, update)
+
+
+def _leave_queue(directory):
+    def update(counts):
+        counts[os.getpid()] = counts.get(os.getpid(), 0) - 1
+    _with_queue(directory, update)
+
+
+# 通道中是否有请求在排队
+def _any_waiting(directory):
+    return _with_queue(directory, lambda counts: sum(counts.values()) > 0, write=False)
+
+
+def _release(fd):
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+class Admission:
+    def __init__(self, root, lanes=None):
+        self.root = root
+        self.lanes = lanes or DEFAULT_LANES
+
+    def _lane_dir(self, lane):
+        directory = os.path.join(self.root, lane)
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    # 是否有更高优先级的通道正在排队
+    def _higher_priority_waiting(self, lane):
+        priority = self.lanes[lane]['priority']
+        for name, conf in self.lanes.items():
+            if conf['priority'] < priority and _any_waiting(self._lane_dir(name)):
+                return True
+        return False
+
+    def _try_slot(self, lane):
+        if self._higher_priority_waiting(lane):
+            return None
+        return _try_lock_any(self._lane_dir(lane), 'slot', self.lanes[lane]['limit'])
+
+    # 获取执行槽位，返回需要在请求结束时释放的凭据；无法获取时抛出AdmissionRejected
+    def acquire(self, lane):
+        if fcntl is None:
+            return None
+        conf = self.lanes[lane]
+
+        slot = self._try_slot(lane)
+        if slot is not None:
+            return slot
+
+        # 占用一个排队位置，排队已满则立即拒绝
+        directory = self._lane_dir(lane)
+        if not _enter_queue(directory, conf['queue']):
+            raise AdmissionRejected(lane, conf['retry_after'])
+
+        try:
+            deadline = time.monotonic() + conf['timeout']
+            delay = 0.01
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                slot = self._try_slot(lane)
+                if slot is not None:
+                    return slot
+                delay = min(delay * 2, 0.2)
+            raise AdmissionRejected(lane, conf['retry_after'])
+        finally:
+            _leave_queue(directory)
+
+    def release(self, ticket):
+        if ticket is not None:
+            _release(ticket)
+
+
+# 按应用配置获取准入控制器（每个进程每个配置目录一个实例）
+_admissions = {}
+
+
+def get_admission():
+    root = current_app.config['ADMISSION_DIR']
+    lanes = current_app.config.get('ADMISSION_LANES') or DEFAULT_LANES
+    key = (root, id(lanes))
+    if key not in _admissions:
+        _admissions[key] = Admission(root, lanes)
+    return _admissions[key]
+
+
+# 视图装饰器：请求在指定通道中获得执行槽位后才执行
+def limit(lane):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            admission = get_admission()
+            try:
+                ticket = admission.acquire(lane)
+            except AdmissionRejected as e:
+                response = jsonify({'success': False, 'message': '服务器繁忙，请稍后重试'})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except BaseException:
+                admission.release(ticket)
+                raise
+            # 生成器形式的流式响应在内容发送完毕后才释放槽位；
+            # send_file 等直通响应不会触发 call_on_close，且耗时工作已经完成，直接释放
+            if response.is_streamed and not response.direct_passthrough:
+                response.call_on_close(lambda: admission.release(ticket))
+            else:
+                admission.release(ticket)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,238 @@
+"""提交数据的趋势分析
+
+把所有提交中的数值字段整理为列式快照（每个字段一个 NumPy 数组，按房间与统计期对齐），
+在快照上以向量化方式计算同比增长、各期合计、分位数与异常值标记。
+快照可保存为 .npz 文件，之后只需合并新增的提交即可更新。
+"""
+import numpy as np
+
+# 参与分析的数值字段（千元/件/项）
+NUMERIC_FIELDS = [
+    'totalRevenue', 'netProfit', 'exportAmount', 'rdExpenditure', 'taxPayment',
+    'financingAmount', 'incubatorFundAmount', 'bankLoanAmount',
+    'ipApplications', 'ipAuthorizations', 'inventionPatents', 'softwareCopyrights',
+    'techContracts', 'techContractAmount', 'nationalProjects'
+]
+
+PERIODS = ('year', 'quarter')
+
+# 分位数统计点
+PERCENTILES = (25, 50, 75, 90)
+
+# 稳健 z 分数（基于中位数与绝对中位差，后者为0时改用平均绝对偏差）超过该阈值即标记为异常
+OUTLIER_THRESHOLD = 3.5
+
+
+# 提交时间 -> 统计期序号（年：2025；季度：2025*4+季度-1，便于做差）
+def period_index(submitted_at, period):
+    year = int(submitted_at[:4])
+    if period == 'year':
+        return year
+    quarter = (int(submitted_at[5:7]) - 1) // 3 + 1
+    return year * 4 + quarter - 1
+
+
+# 统计期序号 -> 展示用标签
+def period_label(index, period):
+    if period == 'year':
+        return str(index)
+    return f"{index // 4}Q{index % 4 + 1}"
+
+
+def to_number(value):
+    if value is None or value == '':
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class Snapshot:
+    """列式快照：每行是一个（房间，统计期），同一统计期内以最新一次提交为准"""
+
+    def __init__(self, period, rooms, room_codes, periods, seqs, values, watermark=0):
+        self.period = period
+        self.rooms = rooms            # 房间号，按编码顺序
+        self.room_codes = room_codes  # int32，每行对应的房间编码
+        self.periods = periods        # int64，每行的统计期序号
+        self.seqs = seqs              # int64，每行来源提交的序号
+        self.values = values          # 字段名 -> float64 数组，缺失为 NaN
+        self.watermark = watermark    # 快照已包含的最大提交序号
+
+    @classmethod
+    def empty(cls, period='year'):
+        return cls(period, np.array([], dtype=object), np.array([], dtype=np.int32),
+                   np.array([], dtype=np.int64), np.array([], dtype=np.int64),
+                   {field: np.array([], dtype=np.float64) for field in NUMERIC_FIELDS})
+
+    def __len__(self):
+        return len(self.seqs)
+
+    # 合并新的提交行（包含 seq、room、submitted_at 及各数值字段），返回新快照
+    # watermark 为本次已处理到的提交序号（含无法读取而被跳过的提交）
+    def merge(self, rows, watermark=None):
+        rows = list(rows)
+        watermark = max(self.watermark, watermark or 0)
+        if not rows:
+            return Snapshot(self.period, self.rooms, self.room_codes, self.periods, self.seqs, self.values,
+                            watermark)
+
+        room_lookup = {room: code for code, room in enumerate(self.rooms)}
+        rooms = list(self.rooms)
+        new_codes = []
+        for row in rows:
+            code = room_lookup.get(row['room'])
+            if code is None:
+                code = room_lookup[row['room']] = len(rooms)
+                rooms.append(row['room'])
+            new_codes.append(code)
+
+        room_codes = np.concatenate([self.room_codes, np.array(new_codes, dtype=np.int32)])
+        periods = np.concatenate([self.periods, np.array(
+            [period_index(row['submitted_at'], self.period) for row in rows], dtype=np.int64)])
+        seqs = np.concatenate([self.seqs, np.array([row['seq'] for row in rows], dtype=np.int64)])
+        values = {
+            field: np.concatenate([self.values[field], np.array(
+                [to_number(row.get(field)) for row in rows], dtype=np.float64)])
+            for field in NUMERIC_FIELDS
+        }
+
+        # 同一（房间，统计期）只保留序号最大的提交，并按（房间，统计期）排序
+        order = np.lexsort((-seqs, periods, room_codes))
+        room_codes, periods, seqs = room_codes[order], periods[order], seqs[order]
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = (room_codes[1:] != room_codes[:-1]) | (periods[1:] != periods[:-1])
+
+        return Snapshot(
+            self.period,
+            np.array(rooms, dtype=object),
+            room_codes[keep],
+            periods[keep],
+            seqs[keep],
+            {field: column[order][keep] for field, column in values.items()},
+            max(watermark, int(seqs.max()))
+        )
+
+    def save(self, path):
+        np.savez(path, period=np.array(self.period), rooms=self.rooms.astype(str),
+                 room_codes=self.room_codes, periods=self.periods, seqs=self.seqs,
+                 watermark=np.array(self.watermark),
+                 **{f"value_{field}": column for field, column in self.values.items()})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if any(f"value_{field}" not in data for field in NUMERIC_FIELDS):
+                raise ValueError('快照字段与当前版本不一致')
+            return cls(str(data['period']), data['rooms'].astype(object), data['room_codes'],
+                       data['periods'], data['seqs'],
+                       {field: data[f"value_{field}"] for field in NUMERIC_FIELDS},
+                       int(data['watermark']))
+
+
+# 同比增长：与上一年同一统计期比较，(本期 - 上期) / |上期|，无上期或上期为0时为 NaN
+def year_over_year(snapshot, field):
+    values = snapshot.values[field]
+    lag = 1 if snapshot.period == 'year' else 4
+    span = int(snapshot.periods.max()) + lag + 1 if len(snapshot) else 1
+    keys = snapshot.room_codes.astype(np.int64) * span + snapshot.periods  # 已按房间、统计期排序
+    previous_keys = keys - lag
+
+    positions = np.clip(np.searchsorted(keys, previous_keys), 0, max(len(keys) - 1, 0))
+    found = keys[positions] == previous_keys
+    previous = np.where(found, values[positions], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (values - previous) / np.abs(previous)
+    growth[~np.isfinite(growth)] = np.nan
+    return previous, growth
+
+
+# 各统计期的汇总：合计、有效数、分位数；并返回每行的异常值标记
+def period_summary(snapshot, field):
+    values = snapshot.values[field]
+    # 按（统计期，数值）排序一次：每个统计期是连续的一段，段内数值升序、NaN 在末尾
+    order = np.lexsort((values, snapshot.periods))
+    sorted_values = values[order]
+    unique_periods, starts = np.unique(snapshot.periods[order], return_index=True)
+
+    valid = ~np.isnan(sorted_values)
+    totals = _segment_sums(np.where(valid, sorted_values, 0.0), starts)
+    counts = _segment_sums(valid.astype(np.int64), starts)
+    percentiles = _segment_percentiles(sorted_values, starts, counts, PERCENTILES)
+    medians = _segment_percentiles(sorted_values, starts, counts, (50,))[:, 0]
+
+    # 每行与所属统计期中位数的偏差；再按（统计期，偏差）排序得到绝对中位差
+    group = np.searchsorted(unique_periods, snapshot.periods)
+    deviations = np.abs(values - medians[group])
+    deviation_order = np.lexsort((deviations, snapshot.periods))
+    sorted_deviations = deviations[deviation_order]
+    mads = _segment_percentiles(sorted_deviations, starts, counts, (50,))[:, 0]
+
+    # 稳健 z 分数的尺度：绝对中位差 / 0.6745；大多数取值相同（如大多为0的专利数）时绝对中位差为0，
+    # 改用平均绝对偏差 / 0.7979。两者都为0说明该期取值全部相同，不标记异常
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_deviations = _segment_sums(np.nan_to_num(sorted_deviations), starts) / counts
+        scales = np.where(mads > 0, mads / 0.6745, mean_deviations / 0.7979)
+        robust_z = (values - medians[group]) / scales[group]
+    outliers = np.abs(robust_z) > OUTLIER_THRESHOLD
+
+    summaries = [
+        {
+            'period': period_label(int(period), snapshot.period),
+            'total': float(total),
+            'count': int(count),
+            **{f"p{p}": _clean(v) for p, v in zip(PERCENTILES, row)}
+        }
+        for period, total, count, row in zip(unique_periods, totals, counts, percentiles)
+    ]
+    return summaries, outliers
+
+
+# 按段求和，starts 为各段起点
+def _segment_sums(values, starts):
+    return np.add.reduceat(values, starts) if len(starts) else np.zeros(0, dtype=values.dtype)
+
+
+# 各段的分位数（线性插值，与 np.percentile 默认方式相同）：每段已升序排列、NaN 在末尾，
+# counts 为各段的有效数；返回（段数，分位点数）的数组，没有有效值的段为 NaN
+def _segment_percentiles(sorted_values, starts, counts, percentiles):
+    positions = (np.maximum(counts, 1) - 1)[:, None] * (np.asarray(percentiles, dtype=np.float64) / 100)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    low = sorted_values[starts[:, None] + lower]
+    high = sorted_values[starts[:, None] + upper]
+    result = low + (high - low) * (positions - lower)
+    result[counts == 0] = np.nan
+    return result
+
+
+# 计算某个字段的完整分析结果
+def analyze(snapshot, field):
+    if field not in NUMERIC_FIELDS:
+        raise ValueError(f"不支持的字段: {field}")
+
+    previous, growth = year_over_year(snapshot, field)
+    summaries, outliers = period_summary(snapshot, field)
+    values = snapshot.values[field]
+
+    rows = [
+        {
+            'room': str(snapshot.rooms[code]),
+            'period': period_label(int(period), snapshot.period),
+            'seq': int(seq),
+            'value': _clean(value),
+            'previous': _clean(prev),
+            'growth': _clean(rate),
+            'outlier': bool(flag)
+        }
+        for code, period, seq, value, prev, rate, flag in zip(
+            snapshot.room_codes, snapshot.periods, snapshot.seqs, values, previous, growth, outliers)
+    ]
+    return {'field': field, 'period': snapshot.period, 'rows': rows, 'periods': summaries}
+
+
+# NaN 转为 None，便于输出 JSON
+def _clean(value):
+    value = float(value)
+    return None if np.isnan(value) else value
@@ -3,73 +3,322 @@ import sqlite3
 import hashlib
 from datetime import datetime
 import io
+import json
 import base64
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file
-from flask import g
-from openpyxl import Workbook, load_workbook
-from openpyxl.drawing.image import Image
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font
-from PIL import Image as PILImage
-
-#
-app = Flask(__name__)
-app.secret_key = 'your_secret_key_here'  # 用于会话管理的密钥
-DATABASE = 'users.db'
-UPLOAD_FOLDER = 'uploads'
-EXCEL_FOLDER = 'excel_files'
-
-# 确保上传和Excel文件夹存在
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(EXCEL_FOLDER, exist_ok=True)
+import uuid
+import mimetypes
+import csv
+import tempfile
+import threading
+import time
+import random
+import multiprocessing
+import contextlib
+import secrets
+import hmac
+import heapq
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from itertools import groupby, islice
+from collections import OrderedDict
+import click
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, session, jsonify, \
+    send_file, abort, stream_with_context
+from flask import g, has_app_context
+
+import admission
+import backup
+import drafts
+import storage
+import tenants
+import validation
+import workbook_media
+import xlsx_writer
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境下不做跨进程加锁
+    fcntl = None
+
+# openpyxl 与 Pillow 导入较慢、占用内存较多，均在首次使用时于函数内导入
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# 预生成报表的定义：每个房间取最新一次提交，project_type 按项目类型（表单值）过滤
+DEFAULT_REPORT_DEFINITIONS = {
+    'latest_per_room': {'title': '全部房间最新提交', 'project_type': None},
+    'enterprise_rooms': {'title': '在孵企业最新提交', 'project_type': '1'},
+}
+
+
+# 进程池子进程的默认启动方式
+def default_start_method():
+    return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+# 默认配置，均可通过同名环境变量或 create_app(config) 覆盖
+# 路径默认相对于 app.py 所在目录，不依赖进程的工作目录
+def default_config():
+    return {
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'your_secret_key_here'),  # 用于会话管理的密钥
+        'DATABASE': os.environ.get('DATABASE', os.path.join(BASE_DIR, 'users.db')),
+        'UPLOAD_FOLDER': os.environ.get('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'uploads')),
+        'EXCEL_FOLDER': os.environ.get('EXCEL_FOLDER', os.path.join(BASE_DIR, 'excel_files')),
+        # 构建后的前端静态资源（由 build_assets.py 生成）
+        'ASSET_FOLDER': os.environ.get('ASSET_FOLDER', os.path.join(BASE_DIR, 'static', 'dist')),
+        'ASSET_MAX_AGE': 365 * 24 * 3600,
+        # 准入控制的共享状态目录（同一台机器上的所有 gunicorn 进程共用）
+        'ADMISSION_DIR': os.environ.get('ADMISSION_DIR', os.path.join(tempfile.gettempdir(), 'manager-admission')),
+        # 耗时操作（openpyxl读写、Pillow处理）的执行方式：
+        #   inline  - 在请求线程中直接执行（默认，与原行为一致）
+        #   thread  - 提交到有界线程池，配合 gthread/gevent 等并发工作模式使用
+        #   process - 提交到有界进程池，CPU密集的读写不再与请求线程争抢GIL
+        'HEAVY_EXECUTOR': os.environ.get('HEAVY_EXECUTOR', 'inline'),
+        'HEAVY_WORKERS': int(os.environ.get('HEAVY_WORKERS', '2')),
+        # 进程池子进程的启动方式：请求线程运行时 fork 会把其他线程持有的锁复制进子进程，
+        # 子进程可能因此死锁，默认用 forkserver（不支持的平台用 spawn）从单线程的服务进程启动
+        'HEAVY_START_METHOD': os.environ.get('HEAVY_START_METHOD', default_start_method()),
+        # 预生成报表：输出目录、报表定义、自动生成间隔（秒，0表示只通过命令行/手动触发）、保留版本数
+        'REPORT_FOLDER': os.environ.get('REPORT_FOLDER', os.path.join(BASE_DIR, 'reports')),
+        'REPORT_DEFINITIONS': DEFAULT_REPORT_DEFINITIONS,
+        'REPORT_SCHEDULE_INTERVAL': int(os.environ.get('REPORT_SCHEDULE_INTERVAL', '0')),
+        'REPORT_KEEP_VERSIONS': 3,
+        # 分析快照（.npz）的存放目录
+        'ANALYTICS_FOLDER': os.environ.get('ANALYTICS_FOLDER', os.path.join(BASE_DIR, 'analytics_cache')),
+        # 提交图片：原图与各尺寸缩略图按提交ID存放；尺寸为最长边限制（像素）
+        'IMAGE_FOLDER': os.environ.get('IMAGE_FOLDER', os.path.join(BASE_DIR, 'images')),
+        'IMAGE_SIZES': {'thumb': (240, 240), 'review': (1600, 1600)},
+        'IMAGE_MAX_AGE': 365 * 24 * 3600,
+        # 工作簿与图片的存储后端：local（EXCEL_FOLDER / IMAGE_FOLDER 目录）或 s3（S3 兼容的对象存储，
+        # 多台应用服务器共用同一个存储桶；访问密钥使用 boto3 的标准环境变量）
+        'STORAGE_BACKEND': os.environ.get('STORAGE_BACKEND', 'local'),
+        'S3_BUCKET': os.environ.get('S3_BUCKET'),
+        'S3_PREFIX': os.environ.get('S3_PREFIX', ''),
+        'S3_ENDPOINT_URL': os.environ.get('S3_ENDPOINT_URL'),  # MinIO 等兼容服务的地址
+        'S3_REGION': os.environ.get('S3_REGION'),
+        # 对象存储的本地读缓存目录与容量上限（字节）
+        'STORAGE_CACHE_FOLDER': os.environ.get('STORAGE_CACHE_FOLDER', os.path.join(BASE_DIR, 'storage_cache')),
+        'STORAGE_CACHE_MAX_BYTES': int(os.environ.get('STORAGE_CACHE_MAX_BYTES', str(512 * 1024 * 1024))),
+        # 提交幂等键的保留时间（秒），以及处理中状态的最长时间（超过后视为处理进程已退出，允许重新提交）
+        'IDEMPOTENCY_TTL': int(os.environ.get('IDEMPOTENCY_TTL', str(24 * 3600))),
+        'IDEMPOTENCY_PENDING_TIMEOUT': 600,
+        # 单个表单草稿的最大字节数（JSON）
+        'DRAFT_MAX_BYTES': int(os.environ.get('DRAFT_MAX_BYTES', str(64 * 1024))),
+        # 备份目录与保留的快照数（见 backup.py）
+        'BACKUP_FOLDER': os.environ.get('BACKUP_FOLDER', os.path.join(BASE_DIR, 'backups')),
+        'BACKUP_KEEP': int(os.environ.get('BACKUP_KEEP', '14')),
+        # 数据库在线备份每一步之间的等待（秒），默认不等待；需要给写入让出更多时间时调大
+        'BACKUP_STEP_SLEEP': float(os.environ.get('BACKUP_STEP_SLEEP', '0')),
+        # 多基地部署（见 tenants.py）：TENANT_MODE 为 subdomain（<基地>.TENANT_DOMAIN），
+        # 为空时为单基地部署；TENANTS 形如 "base1:一号基地,base2:二号基地"
+        'TENANT_MODE': os.environ.get('TENANT_MODE', ''),
+        'TENANTS': tenants.parse_tenants(os.environ.get('TENANTS')),
+        'TENANT_ROOT': os.environ.get('TENANT_ROOT', os.path.join(BASE_DIR, 'tenants')),
+        'TENANT_DOMAIN': os.environ.get('TENANT_DOMAIN'),
+        'TENANT_FANOUT_WORKERS': int(os.environ.get('TENANT_FANOUT_WORKERS', '8')),
+        # 超级管理员（跨基地查看），密码为 SHA-256 摘要，未设置时不启用
+        'SUPER_ADMIN_USERNAME': os.environ.get('SUPER_ADMIN_USERNAME', 'superadmin'),
+        'SUPER_ADMIN_PASSWORD_HASH': os.environ.get('SUPER_ADMIN_PASSWORD_HASH'),
+    }
+
+
+# 用户端蓝图
+main_bp = Blueprint('main', __name__)
+
+
+# 后台执行器按进程懒加载，避免 gunicorn fork 后复用父进程的线程池
+_heavy_executor = {'pid': None, 'executor': None}
+
+
+def get_heavy_executor():
+    if _heavy_executor['pid'] != os.getpid():
+        workers = current_app.config['HEAVY_WORKERS']
+        if current_app.config['HEAVY_EXECUTOR'] == 'process':
+            context = multiprocessing.get_context(current_app.config['HEAVY_START_METHOD'])
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='heavy')
+        _heavy_executor['pid'] = os.getpid()
+        _heavy_executor['executor'] = executor
+    return _heavy_executor['executor']
+
+
+# 执行耗时操作：按配置在当前线程或有界执行器中运行，并等待结果
+# 执行器满载时任务排队，请求线程仅阻塞等待，不占用CPU
+def run_heavy(func, *args):
+    if current_app.config['HEAVY_EXECUTOR'] == 'inline':
+        return func(*args)
+    return get_heavy_executor().submit(func, *args).result()
+
+
+# 按区域获取存储后端（每个进程每种配置一个实例）：
+#   workbooks - 房间工作簿（<房间号>.xlsx），本地存储时位于 EXCEL_FOLDER
+#   images    - 提交图片（<提交ID>/...），本地存储时位于 IMAGE_FOLDER
+_storages = {}
+
+
+def get_storage(area):
+    config = current_app.config
+    folder = config['EXCEL_FOLDER'] if area == 'workbooks' else config['IMAGE_FOLDER']
+    key = (area, config['STORAGE_BACKEND'], folder, config['S3_BUCKET'], config['S3_PREFIX'],
+           config['S3_ENDPOINT_URL'], config['STORAGE_CACHE_FOLDER'])
+    if key not in _storages:
+        if config['STORAGE_BACKEND'] == 's3':
+            backend = storage.S3Storage(config['S3_BUCKET'], f"{config['S3_PREFIX']}{area}/",
+                                        config['S3_ENDPOINT_URL'], config['S3_REGION'])
+            _storages[key] = storage.CachedStorage(backend, os.path.join(config['STORAGE_CACHE_FOLDER'], area),
+                                                   config['STORAGE_CACHE_MAX_BYTES'])
+        else:
+            _storages[key] = storage.LocalStorage(folder)
+    return _storages[key]
+
+
+# 房间工作簿在存储中的键
+def workbook_key(room):
+    return f"{room}.xlsx"
+
+
+# 房间号排序：数字房间号按数值排在前面，其余（如批量导入的 A101）按字符串排在后面
+def room_sort_key(room):
+    return (not room.isdigit(), int(room) if room.isdigit() else room)
+
+
+# 已建表的数据库文件（每个进程首次连接时自动建表，无需手动执行 init_db）
+_initialized_databases = set()
 
 
 # 数据库连接函数
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
+        database = current_app.config['DATABASE']
+        if database not in _initialized_databases:
+            # 新基地的数据目录在第一次访问时创建
+            os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+        db = g._database = sqlite3.connect(database)
         db.row_factory = sqlite3.Row
+        if database not in _initialized_databases:
+            init_schema(db)
+            ensure_submissions_indexed(db, get_storage('workbooks'))
+            _initialized_databases.add(database)
     return db
 
 
-# 初始化数据库
-def init_db():
-    with app.app_context():
-        db = get_db()
-        cursor = db.cursor()
-        # 创建用户表
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            room_number TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        # 添加管理员表
-        cursor.execute('''
-                CREATE TABLE IF NOT EXISTS admins (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                ''')
-
-        # 检查是否有管理员账号，如果没有则创建默认管理员
-        cursor.execute('SELECT * FROM admins WHERE username = ?', ('admin',))
-        if not cursor.fetchone():
-            default_pwd_hash = hash_password('123')  # 默认密码123
-            cursor.execute(
-                'INSERT INTO admins (username, password_hash) VALUES (?, ?)',
-                ('admin', default_pwd_hash)
+# 升级后首次连接时，把已有工作簿中的提交补录到索引表（只执行一次）
+def ensure_submissions_indexed(db, workbooks):
+    if db.execute("SELECT 1 FROM meta WHERE key = 'submissions_indexed'").fetchone():
+        return
+    index_existing_submissions(db, workbooks)
+    db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('submissions_indexed', '1')")
+    db.commit()
+
+
+# 创建数据表及默认管理员（可重复执行）
+def init_schema(db):
+    cursor = db.cursor()
+    # WAL 模式下写事务（如批量导入用户）进行时，登录等读操作不被阻塞；该设置保存在数据库文件中
+    cursor.execute('PRAGMA journal_mode=WAL')
+    # 创建用户表
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        room_number TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    # 添加管理员表
+    cursor.execute('''
+            CREATE TABLE IF NOT EXISTS admins (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
-        db.commit()
+            ''')
+
+    # 提交索引表：seq 为全局递增序号，作为增量导出的游标
+    cursor.execute('''
+            CREATE TABLE IF NOT EXISTS submissions (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                room_number TEXT NOT NULL,
+                sheet_name TEXT NOT NULL,
+                submitted_at TIMESTAMP NOT NULL,
+                UNIQUE (room_number, sheet_name)
+            )
+            ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_submissions_submitted_at ON submissions (submitted_at)')
+
+    # 稳健的提交ID：提交时分配，映射到房间工作簿中的工作表（旧库升级时补充该列并为已有记录生成ID）
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(submissions)')]
+    if 'submission_id' not in columns:
+        cursor.execute('ALTER TABLE submissions ADD COLUMN submission_id TEXT')
+    cursor.execute('UPDATE submissions SET submission_id = lower(hex(randomblob(16))) WHERE submission_id IS NULL')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_submissions_submission_id ON submissions (submission_id)')
+    # 提交时保存的结构化记录（JSON），记录详情接口直接读取
+    if 'record_json' not in columns:
+        cursor.execute('ALTER TABLE submissions ADD COLUMN record_json TEXT')
+
+    # 用户停用标记（停用后不能登录和提交，历史数据保留）
+    user_columns = [row[1] for row in cursor.execute('PRAGMA table_info(users)')]
+    if 'disabled' not in user_columns:
+        cursor.execute('ALTER TABLE users ADD COLUMN disabled INTEGER NOT NULL DEFAULT 0')
+
+    # 提交幂等键：同一房间重复使用同一个键时直接返回第一次的结果
+    cursor.execute('''
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                room_number TEXT NOT NULL,
+                idempotency_key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                response_json TEXT,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (room_number, idempotency_key)
+            )
+            ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at)')
+
+    # 表单草稿：每个房间一份，version 每次保存加一，提交成功后删除
+    cursor.execute('''
+            CREATE TABLE IF NOT EXISTS drafts (
+                room_number TEXT PRIMARY KEY,
+                draft_json TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                updated_at TIMESTAMP NOT NULL
+            )
+            ''')
+
+    # 键值表，记录一次性迁移等状态
+    cursor.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+            ''')
+
+    # 检查是否有管理员账号，如果没有则创建默认管理员
+    cursor.execute('SELECT * FROM admins WHERE username = ?', ('admin',))
+    if not cursor.fetchone():
+        default_pwd_hash = hash_password('123')  # 默认密码123
+        cursor.execute(
+            'INSERT INTO admins (username, password_hash) VALUES (?, ?)',
+            ('admin', default_pwd_hash)
+        )
+    db.commit()
+
+
+# 初始化数据库（兼容原有的手动初始化方式，也可使用 flask init-db）：传入的应用，或当前应用上下文所属的应用
+# 多基地部署时模块级的 app 是按域名分发的入口，不对应任何一个基地的数据库，因此不作为默认值
+def init_db(target_app=None):
+    if target_app is None:
+        if not has_app_context():
+            raise RuntimeError('init_db() 需要传入应用，或在应用上下文中调用')
+        init_schema(get_db())
+        return
+    with target_app.app_context():
+        init_schema(get_db())
 
 
 # 关闭数据库连接
-@app.teardown_appcontext
 def close_connection(exception):
     db = getattr(g, '_database', None)
     if db is not None:
@@ -87,7 +336,8 @@ def check_password(password, hashed):
 
 
 # 注册路由
-@app.route('/register', methods=['POST'])
+@main_bp.route('/register', methods=['POST'])
+@admission.limit('auth')
 def register():
     data = request.get_json()
     room = data.get('room')
@@ -111,7 +361,8 @@ def register():
 
 
 # 登录路由
-@app.route('/login', methods=['POST'])
+@main_bp.route('/login', methods=['POST'])
+@admission.limit('auth')
 def login():
     data = request.get_json()
     room = data.get('room')
@@ -123,21 +374,29 @@ def login():
     user = cursor.fetchone()
 
     if user and check_password(password, user['password_hash']):
+        if user['disabled']:
+            return jsonify({'success': False, 'message': '该房间号已停用，请联系管理员'})
         session['room'] = room
         return jsonify({'success': True, 'message': '登录成功'})
     else:
         return jsonify({'success': False, 'message': '房间号或密码错误'})
 
 
+# 房间号是否存在且未停用（登录后被停用或删除的房间不能再提交）
+def is_room_active(db, room):
+    row = db.execute('SELECT disabled FROM users WHERE room_number = ?', (room,)).fetchone()
+    return row is not None and not row['disabled']
+
+
 # 退出登录
-@app.route('/logout')
+@main_bp.route('/logout')
 def logout():
     session.pop('room', None)
     return jsonify({'success': True, 'message': '已退出登录'})
 
 
 # 获取当前登录用户
-@app.route('/get_current_user')
+@main_bp.route('/get_current_user')
 def get_current_user():
     if 'room' in session:
         return jsonify({'success': True, 'room': session['room']})
@@ -145,24 +404,81 @@ def get_current_user():
         return jsonify({'success': False, 'message': '未登录'})
 
 
+# 读取静态资源清单（逻辑文件名 -> 指纹文件名），按文件修改时间缓存
+_asset_manifest = {'mtime': None, 'data': {}}
+
+
+def get_asset_manifest():
+    manifest_path = os.path.join(current_app.config['ASSET_FOLDER'], 'manifest.json')
+    try:
+        mtime = os.path.getmtime(manifest_path)
+    except OSError:
+        return {}
+    if _asset_manifest['mtime'] != mtime:
+        with open(manifest_path, encoding='utf-8') as f:
+            _asset_manifest['data'] = json.load(f)
+        _asset_manifest['mtime'] = mtime
+    return _asset_manifest['data']
+
+
+# 模板中使用 {{ asset_url('app.css') }} 引用构建后的资源
+@main_bp.app_context_processor
+def inject_asset_url():
+    def asset_url(name):
+        return url_for('main.assets', filename=get_asset_manifest().get(name, name))
+    return {'asset_url': asset_url}
+
+
+# 提供构建后的静态资源：优先返回预压缩版本，指纹文件可长期缓存
+@main_bp.route('/assets/<path:filename>')
+def assets(filename):
+    asset_folder = current_app.config['ASSET_FOLDER']
+    path = os.path.normpath(os.path.join(asset_folder, filename))
+    if not path.startswith(asset_folder + os.sep) or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = None
+    encoding = None
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if candidate in accept_encoding and os.path.isfile(path + suffix):
+            mimetype = mimetypes.guess_type(path)[0]
+            encoding = candidate
+            path = path + suffix
+            break
+
+    response = send_file(path, mimetype=mimetype, download_name=os.path.basename(filename),
+                         conditional=True, max_age=current_app.config['ASSET_MAX_AGE'])
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    # 只有带指纹的文件才能标记为不可变
+    if filename in get_asset_manifest().values():
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = 0
+        response.cache_control.no_cache = True
+    return response
+
+
 # 首页路由（登录页面）
-@app.route('/')
+@main_bp.route('/')
 def index():
     if 'room' in session:
-        return redirect(url_for('user'))
+        return redirect(url_for('main.user'))
     return render_template('login.html')
 
 
 # 用户页面（表单填写）
-@app.route('/user')
+@main_bp.route('/user')
 def user():
     if 'room' not in session:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     return render_template('user.html')
 
 
 # 下载详细字段文档
-@app.route('/download_fields_doc')
+@main_bp.route('/download_fields_doc')
 def download_fields_doc():
     if 'room' not in session:
         return jsonify({'success': False, 'message': '请先登录'})
@@ -185,21 +501,40 @@ def download_fields_doc():
 
 
 # 保存上传的图片
+# 保存上传的图片，返回本地路径；不是图片时返回None
+# 文件名与扩展名只由图片内容决定，不使用客户端提供的文件名：JPEG、PNG 原样保存，其他格式转换为 JPEG/PNG
 def save_image(file):
-    if file and file.filename != '':
-        # 生成唯一文件名
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
-        filename = f"{timestamp}_{file.filename}"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-
-        # 保存文件
-        file.save(filepath)
-        return filepath
-    return None
+    from PIL import Image as PILImage
+
+    if not file or file.filename == '':
+        return None
+    data = file.read()
+    try:
+        img = PILImage.open(io.BytesIO(data))
+        if img.format in ('JPEG', 'PNG'):
+            extension = xlsx_writer.MEDIA_FORMATS[img.format.lower()][0]
+        else:
+            media_format, data = workbook_media.encode_image(img)
+            extension = xlsx_writer.MEDIA_FORMATS[media_format][0]
+    except (OSError, PILImage.DecompressionBombError):
+        return None
 
+    # 生成唯一文件名
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_folder, exist_ok=True)
+    filepath = os.path.join(upload_folder, f"{timestamp}_{uuid.uuid4().hex[:8]}.{extension}")
+
+    # 保存文件
+    with open(filepath, 'wb') as f:
+        f.write(data)
+    return filepath
+
+
+# 将图片插入到工作表：缩放到显示尺寸后编码（照片为JPEG），并调整所在行高和列宽以适应图片
+def insert_image_to_sheet(ws, image_path, row, col, max_width=300, max_height=200):
+    from PIL import Image as PILImage
 
-# 将图片插入到Excel
-def insert_image_to_excel(ws, image_path, row, col, max_width=300, max_height=200):
     if not image_path or not os.path.exists(image_path):
         return
 
@@ -208,161 +543,123 @@ def insert_image_to_excel(ws, image_path, row, col, max_width=300, max_height=20
         img = PILImage.open(image_path)
         img.thumbnail((max_width, max_height))
 
-        # 保存调整后的图片到临时内存
-        temp_img = io.BytesIO()
-        img.save(temp_img, format='PNG')
-        temp_img.seek(0)
-
-        # 插入到Excel
-        excel_img = Image(temp_img)
-        ws.add_image(excel_img, f"{get_column_letter(col)}{row}")
+        # 生成工作表时只编码这一次
+        image_format, data = workbook_media.encode_image(img)
+        ws.add_image(row, col, xlsx_writer.SheetImage(data, img.width, img.height, image_format))
 
         # 调整行高和列宽以适应图片
-        ws.row_dimensions[row].height = img.height * 0.75  # 行高大约是像素的0.75倍
-        ws.column_dimensions[get_column_letter(col)].width = img.width * 0.14  # 列宽大约是像素的0.14倍
+        ws.row_heights[row] = img.height * 0.75  # 行高大约是像素的0.75倍
+        ws.column_widths[col] = img.width * 0.14  # 列宽大约是像素的0.14倍
     except Exception as e:
         print(f"插入图片出错: {str(e)}")
 
 
 # 获取最后一次数据回填
-@app.route('/get_last_submission')
+@main_bp.route('/get_last_submission')
+@admission.limit('auth')
 def get_last_submission():
     if 'room' not in session:
         return jsonify({'success': False, 'message': '请先登录'})
 
     room = session['room']
-    excel_filename = f"{room}.xlsx"
-    excel_path = os.path.join(EXCEL_FOLDER, excel_filename)
+
+    # 有未提交的草稿时优先回填草稿
+    draft = get_draft_row(get_db(), room)
+    if draft is not None:
+        return jsonify({'success': True, 'source': 'draft', 'data': json.loads(draft['draft_json']),
+                        'version': draft['version'], 'updated_at': draft['updated_at']})
+
+    excel_path = get_storage('workbooks').local_path(workbook_key(room))
 
     if not os.path.exists(excel_path):
         return jsonify({'success': False, 'message': '没有历史数据'})
 
     try:
-        wb = load_workbook(excel_path, read_only=True, data_only=True)
+        form_data = run_heavy(read_last_submission, excel_path)
+        if form_data is None:
+            return jsonify({'success': False, 'message': '没有历史数据'})
+        return jsonify({'success': True, 'source': 'submission', 'data': form_data})
 
+    except Exception as e:
+        print(f"获取最后一次提交数据出错: {str(e)}")
+        return jsonify({'success': False, 'message': f'获取数据失败: {str(e)}'})
+
+
+# 读取房间工作簿中最新一次提交的数据，没有记录时返回None
+def read_last_submission(excel_path):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
         # 获取最新的工作表（按创建时间排序）
         # 排除默认工作表（如果存在）
         sheets = [sheet for sheet in wb.sheetnames if sheet != 'Sheet']
         if not sheets:
-            return jsonify({'success': False, 'message': '没有历史数据'})
+            return None
 
         # 按工作表名（包含时间戳）排序，取最后一个
         sheets.sort()
-        last_sheet_name = sheets[-1]
-        ws = wb[last_sheet_name]
-
-        # 解析表单数据
-        form_data = {}
-        current_row = 3  # 从项目负责人信息开始
-
-        # 解析项目负责人信息
-        leader_fields = [
-            ("projectLeaderName", "项目负责人姓名"),
-            ("projectLeaderCollege", "项目负责人学院"),
-            ("projectLeaderGrade", "项目负责人年级"),
-            ("projectLeaderGender", "项目负责人性别"),
-            ("projectLeaderPhone", "项目负责人联系电话"),
-            ("projectType", "项目类型")
-        ]
+        return parse_submission_sheet(wb[sheets[-1]])
+    finally:
+        wb.close()
 
-        for field_name, field_label in leader_fields:
-            # 查找标签所在行
-            while current_row <= ws.max_row:
-                cell_value = ws.cell(row=current_row, column=1).value
-                if cell_value == field_label:
-                    form_data[field_name] = ws.cell(row=current_row, column=2).value
-                    current_row += 1
-                    break
-                current_row += 1
 
-        # 如果是在孵企业，解析企业信息
-        project_type = form_data.get('projectType')
-        if project_type == '在孵企业':
-            form_data['projectType'] = '1'  # 转换为表单值
-            current_row += 1  # 跳过"企业信息"标题行
-
-            enterprise_fields = [
-                ("enterpriseAccount", "在孵企业帐号(18位统一社会信用代码)"),
-                ("enterpriseName", "企业名称"),
-                ("establishmentDate", "企业成立时间"),
-                ("registeredCapital", "企业成立时注册资本(千元)"),
-                ("incubationStartDate", "企业入驻时间"),
-                ("areaOccupied", "占用孵化器场地面积(平方米)"),
-                ("registrationType", "企业登记注册类型"),
-                ("techField", "企业所属技术领域"),
-                ("coreTechField1", "企业核心技术所属领域 - 大类"),
-                ("coreTechField2", "企业核心技术所属领域 - 中类"),
-                ("coreTechField3", "企业核心技术所属领域 - 小类"),
-                ("industryCategory1", "行业类别 - 大类"),
-                ("industryCategory2", "行业类别 - 中类"),
-                ("industryCategory3", "行业类别 - 小类"),
-                ("industryCategory4", "行业类别 - 细类"),
-                ("taxpayerType", "企业纳税人类型"),
-                ("totalRevenue", "在孵企业总收入(千元)"),
-                ("netProfit", "在孵企业净利润(千元)"),
-                ("exportAmount", "在孵企业出口总额(千元)"),
-                ("rdExpenditure", "研究与试验发展经费(千元)"),
-                ("taxPayment", "实际上缴税费(千元)")
-            ]
-
-            for field_name, field_label in enterprise_fields:
-                while current_row <= ws.max_row:
-                    cell_value = ws.cell(row=current_row, column=1).value
-                    if cell_value == field_label:
-                        form_data[field_name] = ws.cell(row=current_row, column=2).value
-                        current_row += 1
-                        break
-                    current_row += 1
+# 将提交记录工作表解析为表单数据（字段名 -> 表单值）
+def parse_submission_sheet(ws):
+    form_data = {}
+    current_row = 3  # 从项目负责人信息开始
 
-        # 解析项目成员信息
-        while current_row <= ws.max_row and ws.cell(row=current_row, column=1).value != "项目成员信息":
-            current_row += 1
-        current_row += 1  # 跳过标题行
-        current_row += 1  # 跳过头行
-        # 跳过成员数据行，直到下一个标题
+    # 解析项目负责人信息
+    leader_fields = [
+        ("projectLeaderName", "项目负责人姓名"),
+        ("projectLeaderCollege", "项目负责人学院"),
+        ("projectLeaderGrade", "项目负责人年级"),
+        ("projectLeaderGender", "项目负责人性别"),
+        ("projectLeaderPhone", "项目负责人联系电话"),
+        ("projectType", "项目类型")
+    ]
+
+    for field_name, field_label in leader_fields:
+        # 查找标签所在行
         while current_row <= ws.max_row:
             cell_value = ws.cell(row=current_row, column=1).value
-            if cell_value in ["知识产权信息", "赛事获奖信息"]:
-                break
-            current_row += 1
-
-        # 解析赛事获奖信息
-        form_data["awards"] = []
-        while current_row <= ws.max_row and ws.cell(row=current_row, column=1).value != "赛事获奖信息":
-            current_row += 1
-        if current_row <= ws.max_row and ws.cell(row=current_row, column=1).value == "赛事获奖信息":
-            current_row += 1  # 跳过标题行
-            current_row += 1  # 跳过头行
-
-            while current_row <= ws.max_row:
-                cell_value = ws.cell(row=current_row, column=1).value
-                # 检查是否到达下一个信息板块
-                if cell_value in ["知识产权信息", "企业资质信息", "投融资信息"]:
-                    break
-                if cell_value and str(cell_value).isdigit():
-                    award = {
-                        "competition": ws.cell(row=current_row, column=2).value,
-                        "prize": ws.cell(row=current_row, column=3).value
-                    }
-                    form_data["awards"].append(award)
+            if cell_value == field_label:
+                form_data[field_name] = ws.cell(row=current_row, column=2).value
                 current_row += 1
-
-        # 解析知识产权信息
-        while current_row <= ws.max_row and ws.cell(row=current_row, column=1).value != "知识产权信息":
+                break
             current_row += 1
-        current_row += 1  # 跳过标题行
 
-        ip_fields = [
-            ("ipApplications", "当年知识产权申请数(件)"),
-            ("ipAuthorizations", "当年知识产权授权数(件)"),
-            ("inventionPatents", "其中：发明专利(件)"),
-            ("softwareCopyrights", "软件著作权(件)"),
-            ("techContracts", "技术合同成交数量(项)"),
-            ("techContractAmount", "技术合同成交额(千元)"),
-            ("nationalProjects", "当年承担国家级科技计划项目数(项)")
+    # 如果是在孵企业，解析企业信息
+    project_type = form_data.get('projectType')
+    if project_type == '在孵企业':
+        form_data['projectType'] = '1'  # 转换为表单值
+        current_row += 1  # 跳过"企业信息"标题行
+
+        enterprise_fields = [
+            ("enterpriseAccount", "在孵企业帐号(18位统一社会信用代码)"),
+            ("enterpriseName", "企业名称"),
+            ("establishmentDate", "企业成立时间"),
+            ("registeredCapital", "企业成立时注册资本(千元)"),
+            ("incubationStartDate", "企业入驻时间"),
+            ("areaOccupied", "占用孵化器场地面积(平方米)"),
+            ("registrationType", "企业登记注册类型"),
+            ("techField", "企业所属技术领域"),
+            ("coreTechField1", "企业核心技术所属领域 - 大类"),
+            ("coreTechField2", "企业核心技术所属领域 - 中类"),
+            ("coreTechField3", "企业核心技术所属领域 - 小类"),
+            ("industryCategory1", "行业类别 - 大类"),
+            ("industryCategory2", "行业类别 - 中类"),
+            ("industryCategory3", "行业类别 - 小类"),
+            ("industryCategory4", "行业类别 - 细类"),
+            ("taxpayerType", "企业纳税人类型"),
+            ("totalRevenue", "在孵企业总收入(千元)"),
+            ("netProfit", "在孵企业净利润(千元)"),
+            ("exportAmount", "在孵企业出口总额(千元)"),
+            ("rdExpenditure", "研究与试验发展经费(千元)"),
+            ("taxPayment", "实际上缴税费(千元)")
         ]
 
-        for field_name, field_label in ip_fields:
+        for field_name, field_label in enterprise_fields:
             while current_row <= ws.max_row:
                 cell_value = ws.cell(row=current_row, column=1).value
                 if cell_value == field_label:
@@ -371,75 +668,155 @@ def get_last_submission():
                     break
                 current_row += 1
 
-        # 解析企业资质信息
-        while current_row <= ws.max_row and ws.cell(row=current_row, column=1).value != "企业资质信息":
-            current_row += 1
+    # 解析项目成员信息
+    while current_row <= ws.max_row and ws.cell(row=current_row, column=1).value != "项目成员信息":
+        current_row += 1
+    current_row += 1  # 跳过标题行
+    current_row += 1  # 跳过头行
+    # 跳过成员数据行，直到下一个标题
+    while current_row <= ws.max_row:
+        cell_value = ws.cell(row=current_row, column=1).value
+        if cell_value in ["知识产权信息", "赛事获奖信息"]:
+            break
+        current_row += 1
+
+    # 解析赛事获奖信息
+    form_data["awards"] = []
+    while current_row <= ws.max_row and ws.cell(row=current_row, column=1).value != "赛事获奖信息":
+        current_row += 1
+    if current_row <= ws.max_row and ws.cell(row=current_row, column=1).value == "赛事获奖信息":
         current_row += 1  # 跳过标题行
+        current_row += 1  # 跳过头行
 
-        qualification_fields = [
-            ("isHighTechEnterprise", "是否高新技术企业"),
-            ("highTechCertificateNo", "高新技术企业证书编号"),
-            ("isTechSme", "是否是科技型中小企业"),
-            ("techSmeCode", "科技型中小企业登记编码"),
-            ("isInnovativeSme", "是否创新型中小企业"),
-            ("isSpecializedSme", "是否专精特新中小企业"),
-            ("isGiantSme", "是否专精特新“小巨人”企业")
-        ]
+        while current_row <= ws.max_row:
+            cell_value = ws.cell(row=current_row, column=1).value
+            # 检查是否到达下一个信息板块
+            if cell_value in ["知识产权信息", "企业资质信息", "投融资信息"]:
+                break
+            if cell_value and str(cell_value).isdigit():
+                award = {
+                    "competition": ws.cell(row=current_row, column=2).value,
+                    "prize": ws.cell(row=current_row, column=3).value
+                }
+                form_data["awards"].append(award)
+            current_row += 1
 
-        for field_name, field_label in qualification_fields:
-            while current_row <= ws.max_row:
-                cell_value = ws.cell(row=current_row, column=1).value
-                if cell_value == field_label:
-                    val = ws.cell(row=current_row, column=2).value
-                    # 转换为表单值
-                    if val == "是":
-                        form_data[field_name] = "yes"
-                    elif val == "否":
-                        form_data[field_name] = "no"
-                    else:
-                        form_data[field_name] = val
-                    current_row += 1
-                    break
+    # 解析知识产权信息
+    while current_row <= ws.max_row and ws.cell(row=current_row, column=1).value != "知识产权信息":
+        current_row += 1
+    current_row += 1  # 跳过标题行
+
+    ip_fields = [
+        ("ipApplications", "当年知识产权申请数(件)"),
+        ("ipAuthorizations", "当年知识产权授权数(件)"),
+        ("inventionPatents", "其中：发明专利(件)"),
+        ("softwareCopyrights", "软件著作权(件)"),
+        ("techContracts", "技术合同成交数量(项)"),
+        ("techContractAmount", "技术合同成交额(千元)"),
+        ("nationalProjects", "当年承担国家级科技计划项目数(项)")
+    ]
+
+    for field_name, field_label in ip_fields:
+        while current_row <= ws.max_row:
+            cell_value = ws.cell(row=current_row, column=1).value
+            if cell_value == field_label:
+                form_data[field_name] = ws.cell(row=current_row, column=2).value
                 current_row += 1
+                break
+            current_row += 1
 
-        # 解析投融资信息
-        while current_row <= ws.max_row and ws.cell(row=current_row, column=1).value != "投融资信息":
+    # 解析企业资质信息
+    while current_row <= ws.max_row and ws.cell(row=current_row, column=1).value != "企业资质信息":
+        current_row += 1
+    current_row += 1  # 跳过标题行
+
+    qualification_fields = [
+        ("isHighTechEnterprise", "是否高新技术企业"),
+        ("highTechCertificateNo", "高新技术企业证书编号"),
+        ("isTechSme", "是否是科技型中小企业"),
+        ("techSmeCode", "科技型中小企业登记编码"),
+        ("isInnovativeSme", "是否创新型中小企业"),
+        ("isSpecializedSme", "是否专精特新中小企业"),
+        ("isGiantSme", "是否专精特新“小巨人”企业")
+    ]
+
+    for field_name, field_label in qualification_fields:
+        while current_row <= ws.max_row:
+            cell_value = ws.cell(row=current_row, column=1).value
+            if cell_value == field_label:
+                val = ws.cell(row=current_row, column=2).value
+                # 转换为表单值
+                if val == "是":
+                    form_data[field_name] = "yes"
+                elif val == "否":
+                    form_data[field_name] = "no"
+                else:
+                    form_data[field_name] = val
+                current_row += 1
+                break
             current_row += 1
-        current_row += 1  # 跳过标题行
 
-        finance_fields = [
-            ("financingAmount", "获得投融资金额(千元)"),
-            ("incubatorFundAmount", "其中：获得孵化器孵化基金投资额(千元)"),
-            ("bankLoanAmount", "其中：获银行贷款额(千元)")
-        ]
+    # 解析投融资信息
+    while current_row <= ws.max_row and ws.cell(row=current_row, column=1).value != "投融资信息":
+        current_row += 1
+    current_row += 1  # 跳过标题行
 
-        for field_name, field_label in finance_fields:
-            while current_row <= ws.max_row:
-                cell_value = ws.cell(row=current_row, column=1).value
-                if cell_value == field_label:
-                    form_data[field_name] = ws.cell(row=current_row, column=2).value
-                    current_row += 1
-                    break
-                current_row += 1
+    finance_fields = [
+        ("financingAmount", "获得投融资金额(千元)"),
+        ("incubatorFundAmount", "其中：获得孵化器孵化基金投资额(千元)"),
+        ("bankLoanAmount", "其中：获银行贷款额(千元)")
+    ]
 
-        wb.close()
-        return jsonify({'success': True, 'data': form_data})
+    for field_name, field_label in finance_fields:
+        while current_row <= ws.max_row:
+            cell_value = ws.cell(row=current_row, column=1).value
+            if cell_value == field_label:
+                form_data[field_name] = ws.cell(row=current_row, column=2).value
+                current_row += 1
+                break
+            current_row += 1
 
-    except Exception as e:
-        print(f"获取最后一次提交数据出错: {str(e)}")
-        return jsonify({'success': False, 'message': f'获取数据失败: {str(e)}'})
+    return form_data
 
 
 # 提交表单处理
-@app.route('/submit_form', methods=['POST'])
+@main_bp.route('/submit_form', methods=['POST'])
+@admission.limit('submit')
 def submit_form():
     if 'room' not in session:
         return jsonify({'success': False, 'message': '请先登录'})
 
     room = session['room']
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    excel_filename = f"{room}.xlsx"
-    excel_path = os.path.join(EXCEL_FOLDER, excel_filename)
+
+    if not is_room_active(get_db(), room):
+        return jsonify({'success': False, 'message': '该房间号已停用，请联系管理员'})
+
+    # 幂等键优先从请求头读取，此时重复请求无需解析上传的表单与图片
+    idempotency_key = request.headers.get('Idempotency-Key') or request.form.get('idempotencyKey')
+    if idempotency_key:
+        if len(idempotency_key) > 128:
+            return jsonify({'success': False, 'message': '幂等键无效'}), 400
+        previous = claim_idempotency_key(get_db(), room, idempotency_key)
+        if previous == 'pending':
+            response = jsonify({'success': False, 'pending': True, 'message': '相同的提交正在处理中，请稍候'})
+            response.status_code = 409
+            response.headers['Retry-After'] = '2'
+            return response
+        if previous is not None:
+            response = jsonify(previous)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+    # 先校验整个表单（不涉及图片与工作簿），有错误时一次全部返回
+    form, errors = validation.validate_submission(request.form, request.files, get_registration_type_map())
+    if errors:
+        if idempotency_key:
+            release_idempotency_key(get_db(), room, idempotency_key)
+        return jsonify({'success': False, 'message': '提交内容有误，请修改后重新提交', 'errors': errors}), 400
+
+    # 提交开始时的草稿版本：提交成功后只删除这一版本，提交期间（如在其他标签页）继续编辑的草稿保留
+    draft = get_draft_row(get_db(), room)
 
     try:
         # 保存上传的图片
@@ -454,255 +831,552 @@ def submit_form():
             path = save_image(cert)
             award_certificate_paths.append(path)
 
-        # 检查Excel文件是否存在，不存在则创建
-        if os.path.exists(excel_path):
-            wb = load_workbook(excel_path)
-        else:
-            wb = Workbook()
+        # 生成工作表（耗时操作，交给后台执行器），结构化记录直接从生成的工作表解析
+        sheet = run_heavy(render_submission_sheet, timestamp, form, business_license_path,
+                          invention_patent_path, software_copyright_path, award_certificate_paths)
+        record = parse_submission_record(sheet.iter_rows())
 
-        # 创建新的工作表，以时间戳命名
-        sheet_name = timestamp.replace(':', '-')  # 替换冒号，Excel不允许工作表名包含冒号
-        if len(sheet_name) > 31:  # Excel工作表名最大长度为31
-            sheet_name = sheet_name[:31]
+        # 追加到房间工作簿；本机同一房间的写入依次进行，工作簿被其他服务器同时改写时，重新读取后重试
+        # 索引与原图也在锁内写入，按房间恢复备份时不会只看到其中一部分
+        with room_write_lock(room):
+            for attempt in range(SUBMIT_WRITE_ATTEMPTS):
+                try:
+                    sheet_name = run_heavy(write_submission, get_storage('workbooks'), workbook_key(room),
+                                           timestamp, sheet)
+                    break
+                except storage.StorageConflict:
+                    if attempt == SUBMIT_WRITE_ATTEMPTS - 1:
+                        raise
+                    time.sleep(random.uniform(0.05, 0.2) * (attempt + 1))
+
+            # 记录到提交索引，分配提交ID
+            submission_id = record_submission(get_db(), room, sheet_name, timestamp, record)
+
+            # 保留原图供图片接口使用（移走后不再参与下面的清理）
+            store_submission_images(
+                get_storage('images'), submission_id,
+                submission_image_sources(record, business_license_path, invention_patent_path,
+                                         software_copyright_path, award_certificate_paths)
+            )
 
-        # 如果工作表名已存在，添加后缀
-        counter = 1
-        original_sheet_name = sheet_name
-        while sheet_name in wb.sheetnames:
-            sheet_name = f"{original_sheet_name}_{counter}"
-            counter += 1
+        # 清理临时图片文件
+        all_paths = [business_license_path, invention_patent_path, software_copyright_path] + award_certificate_paths
+        for path in all_paths:
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except:
+                    pass
 
-        ws = wb.create_sheet(title=sheet_name)
+        if draft is not None:
+            delete_draft(get_db(), room, draft['version'])
 
-        # 记录当前行号
-        current_row = 1
+        result = {'success': True, 'message': '表单提交成功', 'id': submission_id}
+        if idempotency_key:
+            complete_idempotency_key(get_db(), room, idempotency_key, result)
+        return jsonify(result)
+    except Exception as e:
+        print(f"提交表单出错: {str(e)}")
+        # 失败的提交不保留幂等键，客户端可用同一个键重试
+        if idempotency_key:
+            release_idempotency_key(get_db(), room, idempotency_key)
+        return jsonify({'success': False, 'message': f'提交失败: {str(e)}'})
 
-        # 添加提交时间
-        ws.cell(row=current_row, column=1, value="提交时间")
-        ws.cell(row=current_row, column=2, value=timestamp)
-        current_row += 2
 
-        # 项目负责人信息 - 修复字体设置方式
-        header_cell = ws.cell(row=current_row, column=1, value="项目负责人信息")
-        header_cell.font = get_header_font()  # 先创建单元格，再设置字体
-        current_row += 1
+# 登记幂等键：首次使用返回None（调用方继续处理）；
+# 已完成返回第一次的响应内容，仍在处理中返回'pending'
+def claim_idempotency_key(db, room, key):
+    now = time.time()
+    db.execute('DELETE FROM idempotency_keys WHERE created_at < ?', (now - current_app.config['IDEMPOTENCY_TTL'],))
+    try:
+        db.execute(
+            "INSERT INTO idempotency_keys (room_number, idempotency_key, status, created_at) "
+            "VALUES (?, ?, 'pending', ?)",
+            (room, key, now)
+        )
+        db.commit()
+        return None
+    except sqlite3.IntegrityError:
+        db.rollback()
+
+    row = db.execute(
+        'SELECT status, response_json, created_at FROM idempotency_keys '
+        'WHERE room_number = ? AND idempotency_key = ?',
+        (room, key)
+    ).fetchone()
+    if row is None:
+        # 刚好被清理，重新登记
+        return claim_idempotency_key(db, room, key)
+    if row['status'] == 'done':
+        return json.loads(row['response_json'])
+
+    # 处理中状态超时（处理进程异常退出），由本次请求接管
+    if row['created_at'] < now - current_app.config['IDEMPOTENCY_PENDING_TIMEOUT']:
+        cursor = db.execute(
+            'UPDATE idempotency_keys SET created_at = ? '
+            "WHERE room_number = ? AND idempotency_key = ? AND status = 'pending' AND created_at = ?",
+            (now, room, key, row['created_at'])
+        )
+        db.commit()
+        if cursor.rowcount == 1:
+            return None
+    return 'pending'
 
-        fields = [
-            ("projectLeaderName", "项目负责人姓名"),
-            ("projectLeaderCollege", "项目负责人学院"),
-            ("projectLeaderGrade", "项目负责人年级"),
-            ("projectLeaderGender", "项目负责人性别", {"male": "男", "female": "女"}),
-            ("projectLeaderPhone", "项目负责人联系电话"),
-            ("projectType", "项目类型", {"1": "在孵企业", "2": "创业团队"})
-        ]
 
-        current_row = add_fields_to_excel(ws, current_row, fields, request.form)
-        current_row += 1
+def complete_idempotency_key(db, room, key, result):
+    db.execute(
+        "UPDATE idempotency_keys SET status = 'done', response_json = ? "
+        'WHERE room_number = ? AND idempotency_key = ?',
+        (json.dumps(result, ensure_ascii=False), room, key)
+    )
+    db.commit()
 
-        # 如果是在孵企业，添加企业信息
-        project_type = request.form.get('projectType')
-        if project_type == '1':
-            header_cell = ws.cell(row=current_row, column=1, value="企业信息")
-            header_cell.font = get_header_font()
-            current_row += 1
 
-            enterprise_fields = [
-                ("enterpriseAccount", "在孵企业帐号(18位统一社会信用代码)"),
-                ("enterpriseName", "企业名称"),
-                ("establishmentDate", "企业成立时间"),
-                ("registeredCapital", "企业成立时注册资本(千元)"),
-                ("incubationStartDate", "企业入驻时间"),
-                ("areaOccupied", "占用孵化器场地面积(平方米)"),
-                ("registrationType", "企业登记注册类型", get_registration_type_map()),
-                ("techField", "企业所属技术领域"),
-                ("coreTechField1", "企业核心技术所属领域 - 大类"),
-                ("coreTechField2", "企业核心技术所属领域 - 中类"),
-                ("coreTechField3", "企业核心技术所属领域 - 小类"),
-                ("industryCategory1", "行业类别 - 大类"),
-                ("industryCategory2", "行业类别 - 中类"),
-                ("industryCategory3", "行业类别 - 小类"),
-                ("industryCategory4", "行业类别 - 细类"),
-                ("taxpayerType", "企业纳税人类型", {"general": "一般纳税人", "small": "小规模纳税人"}),
-                ("totalRevenue", "在孵企业总收入(千元)"),
-                ("netProfit", "在孵企业净利润(千元)"),
-                ("exportAmount", "在孵企业出口总额(千元)"),
-                ("rdExpenditure", "研究与试验发展经费(千元)"),
-                ("taxPayment", "实际上缴税费(千元)")
-            ]
-
-            current_row = add_fields_to_excel(ws, current_row, enterprise_fields, request.form)
-            current_row += 1
+def release_idempotency_key(db, room, key):
+    db.execute("DELETE FROM idempotency_keys WHERE room_number = ? AND idempotency_key = ? AND status = 'pending'",
+               (room, key))
+    db.commit()
 
-            # 插入营业执照图片
-            if business_license_path:
-                ws.cell(row=current_row, column=1, value="营业执照照片")
-                insert_image_to_excel(ws, business_license_path, current_row, 2)
-                current_row += 5  # 留出空间给图片
 
-        # 项目成员信息
-        header_cell = ws.cell(row=current_row, column=1, value="项目成员信息")
-        header_cell.font = get_header_font()
-        current_row += 1
+# 草稿保存冲突（其他标签页同时保存）时的最多尝试次数
+DRAFT_SAVE_ATTEMPTS = 5
 
-        # 获取所有成员信息
-        member_names = request.form.getlist('member_name[]')
-        member_genders = request.form.getlist('member_gender[]')
-        member_is_students = request.form.getlist('member_isStudent[]')
-        member_colleges = request.form.getlist('member_college[]')
-        member_grades = request.form.getlist('member_grade[]')
-        member_levels = request.form.getlist('member_level[]')
-        member_phones = request.form.getlist('member_phone[]')
-        member_is_overseas = request.form.getlist('member_isOverseas[]')
-
-        # 成员表头
-        member_headers = ["序号", "姓名", "性别", "是否在校生", "学院", "年级", "层次", "联系电话", "是否留学人员"]
-        for col, header in enumerate(member_headers, 1):
-            ws.cell(row=current_row, column=col, value=header)
-        current_row += 1
 
-        # 成员数据
-        gender_map = {"male": "男", "female": "女"}
-        yes_no_map = {"yes": "是", "no": "否"}
-        level_map = {"undergraduate": "本科", "junior": "专科"}
-
-        for i in range(len(member_names)):
-            ws.cell(row=current_row, column=1, value=i + 1)
-            ws.cell(row=current_row, column=2, value=member_names[i])
-            ws.cell(row=current_row, column=3, value=gender_map.get(member_genders[i], ""))
-            ws.cell(row=current_row, column=4, value=yes_no_map.get(member_is_students[i], ""))
-            ws.cell(row=current_row, column=5, value=member_colleges[i])
-            ws.cell(row=current_row, column=6, value=member_grades[i])
-            ws.cell(row=current_row, column=7, value=level_map.get(member_levels[i], ""))
-            ws.cell(row=current_row, column=8, value=member_phones[i])
-            ws.cell(row=current_row, column=9, value=yes_no_map.get(member_is_overseas[i], ""))
-            current_row += 1
+class DraftConflict(Exception):
+    def __init__(self, version):
+        super().__init__(f"草稿已更新为版本 {version}")
+        self.version = version
 
-        current_row += 1
 
-        # 赛事获奖信息
-        header_cell = ws.cell(row=current_row, column=1, value="赛事获奖信息")
-        header_cell.font = get_header_font()
-        current_row += 1
+class DraftTooLarge(Exception):
+    pass
 
-        # 获取所有赛事获奖信息
-        award_competitions = request.form.getlist('award_competition[]')
-        award_prizes = request.form.getlist('award_prize[]')
 
-        # 获奖记录表头
-        award_headers = ["序号", "赛事完整名称", "所获奖项", "图片证明"]
-        for col, header in enumerate(award_headers, 1):
-            ws.cell(row=current_row, column=col, value=header)
-        current_row += 1
+def get_draft_row(db, room):
+    return db.execute('SELECT * FROM drafts WHERE room_number = ?', (room,)).fetchone()
 
-        # 处理获奖记录和图片
-        for i in range(len(award_competitions)):
-            ws.cell(row=current_row, column=1, value=i + 1)
-            ws.cell(row=current_row, column=2, value=award_competitions[i])
-            ws.cell(row=current_row, column=3, value=award_prizes[i])
 
-            # 记录图片状态
-            if i < len(award_certificate_paths) and award_certificate_paths[i]:
-                ws.cell(row=current_row, column=4, value="有图片")
-            else:
-                ws.cell(row=current_row, column=4, value="无")
+# 删除草稿；指定 version 时只有草稿仍是该版本才删除
+def delete_draft(db, room, version=None):
+    if version is None:
+        db.execute('DELETE FROM drafts WHERE room_number = ?', (room,))
+    else:
+        db.execute('DELETE FROM drafts WHERE room_number = ? AND version = ?', (room, version))
+    db.commit()
+
+
+# 保存草稿：update(当前草稿) 返回新草稿；expected_version 不为 None 时草稿必须仍是该版本，
+# 否则抛出 DraftConflict。保存以版本号做条件更新，同时保存时以后到者重新读取后再应用
+def save_draft(db, room, update, expected_version=None):
+    for attempt in range(DRAFT_SAVE_ATTEMPTS):
+        row = get_draft_row(db, room)
+        version = row['version'] if row is not None else 0
+        if expected_version is not None and version != expected_version:
+            raise DraftConflict(version)
+
+        draft = update(json.loads(row['draft_json']) if row is not None else {})
+        draft_json = json.dumps(draft, ensure_ascii=False, separators=(',', ':'))
+        if len(draft_json.encode('utf-8')) > current_app.config['DRAFT_MAX_BYTES']:
+            raise DraftTooLarge()
+
+        updated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if row is None:
+            cursor = db.execute(
+                'INSERT OR IGNORE INTO drafts (room_number, draft_json, version, updated_at) VALUES (?, ?, 1, ?)',
+                (room, draft_json, updated_at)
+            )
+        else:
+            cursor = db.execute(
+                'UPDATE drafts SET draft_json = ?, version = version + 1, updated_at = ? '
+                'WHERE room_number = ? AND version = ?',
+                (draft_json, updated_at, room, version)
+            )
+        db.commit()
+        if cursor.rowcount == 1:
+            return version + 1, updated_at
+    raise DraftConflict(get_draft_row(db, room)['version'])
 
-            current_row += 1
 
-        current_row += 1
+# 客户端期望的草稿版本：If-Match 请求头（ETag 形式 "3" 或直接写 3），未指定时为None
+def draft_expected_version():
+    value = request.headers.get('If-Match', '').strip().strip('"')
+    return int(value) if value.isdigit() else None
 
-        # 插入获奖证明图片
-        for i, img_path in enumerate(award_certificate_paths):
-            if img_path:
-                ws.cell(row=current_row, column=1, value=f"获奖记录 {i + 1} 证明图片")
-                insert_image_to_excel(ws, img_path, current_row, 2)
-                current_row += 5  # 留出空间给图片
 
-        # 知识产权信息
-        header_cell = ws.cell(row=current_row, column=1, value="知识产权信息")
-        header_cell.font = get_header_font()
-        current_row += 1
+def draft_response(version, updated_at, data=None):
+    body = {'success': True, 'version': version, 'updated_at': updated_at}
+    if data is not None:
+        body['data'] = data
+    response = jsonify(body)
+    response.headers['ETag'] = f'"{version}"'
+    return response
 
-        ip_fields = [
-            ("ipApplications", "当年知识产权申请数(件)"),
-            ("ipAuthorizations", "当年知识产权授权数(件)"),
-            ("inventionPatents", "其中：发明专利(件)"),
-            ("softwareCopyrights", "软件著作权(件)"),
-            ("techContracts", "技术合同成交数量(项)"),
-            ("techContractAmount", "技术合同成交额(千元)"),
-            ("nationalProjects", "当年承担国家级科技计划项目数(项)")
-        ]
 
-        current_row = add_fields_to_excel(ws, current_row, ip_fields, request.form)
-        current_row += 1
+# 读取草稿
+@main_bp.route('/draft')
+@admission.limit('draft')
+def get_draft():
+    if 'room' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
 
-        # 插入发明专利证书图片
-        if invention_patent_path and int(request.form.get('inventionPatents', 0)) > 0:
-            ws.cell(row=current_row, column=1, value="发明专利证书")
-            insert_image_to_excel(ws, invention_patent_path, current_row, 2)
-            current_row += 5  # 留出空间给图片
+    row = get_draft_row(get_db(), session['room'])
+    if row is None:
+        return jsonify({'success': False, 'message': '没有草稿'})
+    return draft_response(row['version'], row['updated_at'], json.loads(row['draft_json']))
 
-        # 插入软件著作权证书图片
-        if software_copyright_path and int(request.form.get('softwareCopyrights', 0)) > 0:
-            ws.cell(row=current_row, column=1, value="软件著作权证书")
-            insert_image_to_excel(ws, software_copyright_path, current_row, 2)
-            current_row += 5  # 留出空间给图片
 
-        # 企业资质信息
-        header_cell = ws.cell(row=current_row, column=1, value="企业资质信息")
-        header_cell.font = get_header_font()
+# 保存草稿：PUT 提交完整草稿（JSON 对象），PATCH 提交 JSON Patch 操作数组（见 drafts.py）
+# 可带 If-Match 请求头（上次返回的 version），草稿已被其他页面更新时返回 409 与当前版本
+@main_bp.route('/draft', methods=['PUT', 'PATCH'])
+@admission.limit('draft')
+def save_draft_route():
+    if 'room' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    body = request.get_json(force=True, silent=True)
+    if request.method == 'PUT':
+        if not isinstance(body, dict):
+            return jsonify({'success': False, 'message': '草稿必须是JSON对象'}), 400
+        update = lambda current: body
+    else:
+        update = lambda current: drafts.apply_patch(current, body)
+
+    try:
+        version, updated_at = save_draft(get_db(), session['room'], update, draft_expected_version())
+    except DraftConflict as e:
+        response = jsonify({'success': False, 'message': '草稿已在其他页面更新，请重新加载', 'version': e.version})
+        response.status_code = 409
+        return response
+    except drafts.PatchError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except DraftTooLarge:
+        return jsonify({'success': False, 'message': '草稿内容过大'}), 413
+    return draft_response(version, updated_at)
+
+
+# 放弃草稿
+@main_bp.route('/draft', methods=['DELETE'])
+@admission.limit('draft')
+def discard_draft():
+    if 'room' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    delete_draft(get_db(), session['room'])
+    return jsonify({'success': True})
+
+
+# 工作簿写入冲突时的最多尝试次数
+SUBMIT_WRITE_ATTEMPTS = 5
+
+
+# 本机同一房间工作簿的写锁（所有 gunicorn 进程共用，锁文件位于 ADMISSION_DIR）
+@contextlib.contextmanager
+def room_write_lock(room):
+    if fcntl is None:
+        yield
+        return
+    lock_dir = os.path.join(current_app.config['ADMISSION_DIR'], 'rooms')
+    os.makedirs(lock_dir, exist_ok=True)
+    # 锁文件名包含工作簿目录，不同基地的同名房间互不影响
+    lock_name = hashlib.sha256(f"{current_app.config['EXCEL_FOLDER']}|{current_app.config['S3_PREFIX']}|{room}"
+                               .encode('utf-8')).hexdigest()[:16]
+    lock_fd = os.open(os.path.join(lock_dir, f"{lock_name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+
+# 生成一次提交的工作表（form 为校验后的表单，数值字段已是数值；不涉及房间工作簿，图片在此一次性缩放编码），
+# 写入冲突重试时直接复用；结构化记录由 parse_submission_record(sheet.iter_rows()) 得到
+def render_submission_sheet(timestamp, form, business_license_path, invention_patent_path,
+                            software_copyright_path, award_certificate_paths):
+    ws = xlsx_writer.Sheet()
+
+    # 记录当前行号
+    current_row = 1
+
+    # 添加提交时间
+    ws.cell(row=current_row, column=1, value="提交时间")
+    ws.cell(row=current_row, column=2, value=timestamp)
+    current_row += 2
+
+    # 项目负责人信息
+    ws.cell(row=current_row, column=1, value="项目负责人信息", style='header')
+    current_row += 1
+
+    fields = [
+        ("projectLeaderName", "项目负责人姓名"),
+        ("projectLeaderCollege", "项目负责人学院"),
+        ("projectLeaderGrade", "项目负责人年级"),
+        ("projectLeaderGender", "项目负责人性别", {"male": "男", "female": "女"}),
+        ("projectLeaderPhone", "项目负责人联系电话"),
+        ("projectType", "项目类型", {"1": "在孵企业", "2": "创业团队"})
+    ]
+
+    current_row = add_fields_to_excel(ws, current_row, fields, form)
+    current_row += 1
+
+    # 如果是在孵企业，添加企业信息
+    project_type = form.get('projectType')
+    if project_type == '1':
+        ws.cell(row=current_row, column=1, value="企业信息", style='header')
         current_row += 1
 
-        qualification_fields = [
-            ("isHighTechEnterprise", "是否高新技术企业", yes_no_map),
-            ("highTechCertificateNo", "高新技术企业证书编号"),
-            ("isTechSme", "是否是科技型中小企业", yes_no_map),
-            ("techSmeCode", "科技型中小企业登记编码"),
-            ("isInnovativeSme", "是否创新型中小企业", yes_no_map),
-            ("isSpecializedSme", "是否专精特新中小企业", yes_no_map),
-            ("isGiantSme", "是否专精特新“小巨人”企业", yes_no_map)
+        enterprise_fields = [
+            ("enterpriseAccount", "在孵企业帐号(18位统一社会信用代码)"),
+            ("enterpriseName", "企业名称"),
+            ("establishmentDate", "企业成立时间"),
+            ("registeredCapital", "企业成立时注册资本(千元)"),
+            ("incubationStartDate", "企业入驻时间"),
+            ("areaOccupied", "占用孵化器场地面积(平方米)"),
+            ("registrationType", "企业登记注册类型", get_registration_type_map()),
+            ("techField", "企业所属技术领域"),
+            ("coreTechField1", "企业核心技术所属领域 - 大类"),
+            ("coreTechField2", "企业核心技术所属领域 - 中类"),
+            ("coreTechField3", "企业核心技术所属领域 - 小类"),
+            ("industryCategory1", "行业类别 - 大类"),
+            ("industryCategory2", "行业类别 - 中类"),
+            ("industryCategory3", "行业类别 - 小类"),
+            ("industryCategory4", "行业类别 - 细类"),
+            ("taxpayerType", "企业纳税人类型", {"general": "一般纳税人", "small": "小规模纳税人"}),
+            ("totalRevenue", "在孵企业总收入(千元)"),
+            ("netProfit", "在孵企业净利润(千元)"),
+            ("exportAmount", "在孵企业出口总额(千元)"),
+            ("rdExpenditure", "研究与试验发展经费(千元)"),
+            ("taxPayment", "实际上缴税费(千元)")
         ]
 
-        current_row = add_fields_to_excel(ws, current_row, qualification_fields, request.form)
+        current_row = add_fields_to_excel(ws, current_row, enterprise_fields, form)
         current_row += 1
 
-        # 投融资信息
-        header_cell = ws.cell(row=current_row, column=1, value="投融资信息")
-        header_cell.font = get_header_font()
+        # 插入营业执照图片
+        if business_license_path:
+            ws.cell(row=current_row, column=1, value="营业执照照片")
+            insert_image_to_sheet(ws, business_license_path, current_row, 2)
+            current_row += 5  # 留出空间给图片
+
+    # 项目成员信息
+    ws.cell(row=current_row, column=1, value="项目成员信息", style='header')
+    current_row += 1
+
+    # 获取所有成员信息
+    member_names = form.getlist('member_name[]')
+    member_genders = form.getlist('member_gender[]')
+    member_is_students = form.getlist('member_isStudent[]')
+    member_colleges = form.getlist('member_college[]')
+    member_grades = form.getlist('member_grade[]')
+    member_levels = form.getlist('member_level[]')
+    member_phones = form.getlist('member_phone[]')
+    member_is_overseas = form.getlist('member_isOverseas[]')
+
+    # 成员表头
+    member_headers = ["序号", "姓名", "性别", "是否在校生", "学院", "年级", "层次", "联系电话", "是否留学人员"]
+    for col, header in enumerate(member_headers, 1):
+        ws.cell(row=current_row, column=col, value=header)
+    current_row += 1
+
+    # 成员数据
+    gender_map = {"male": "男", "female": "女"}
+    yes_no_map = {"yes": "是", "no": "否"}
+    level_map = {"undergraduate": "本科", "junior": "专科"}
+
+    for i in range(len(member_names)):
+        ws.cell(row=current_row, column=1, value=i + 1)
+        ws.cell(row=current_row, column=2, value=member_names[i])
+        ws.cell(row=current_row, column=3, value=gender_map.get(member_genders[i], ""))
+        ws.cell(row=current_row, column=4, value=yes_no_map.get(member_is_students[i], ""))
+        ws.cell(row=current_row, column=5, value=member_colleges[i])
+        ws.cell(row=current_row, column=6, value=member_grades[i])
+        ws.cell(row=current_row, column=7, value=level_map.get(member_levels[i], ""))
+        ws.cell(row=current_row, column=8, value=member_phones[i])
+        ws.cell(row=current_row, column=9, value=yes_no_map.get(member_is_overseas[i], ""))
         current_row += 1
 
-        finance_fields = [
-            ("financingAmount", "获得投融资金额(千元)"),
-            ("incubatorFundAmount", "其中：获得孵化器孵化基金投资额(千元)"),
-            ("bankLoanAmount", "其中：获银行贷款额(千元)")
-        ]
+    current_row += 1
 
-        current_row = add_fields_to_excel(ws, current_row, finance_fields, request.form)
+    # 赛事获奖信息
+    ws.cell(row=current_row, column=1, value="赛事获奖信息", style='header')
+    current_row += 1
 
-        # 调整列宽
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 50
+    # 获取所有赛事获奖信息
+    award_competitions = form.getlist('award_competition[]')
+    award_prizes = form.getlist('award_prize[]')
 
-        # 保存Excel文件
-        wb.save(excel_path)
+    # 获奖记录表头
+    award_headers = ["序号", "赛事完整名称", "所获奖项", "图片证明"]
+    for col, header in enumerate(award_headers, 1):
+        ws.cell(row=current_row, column=col, value=header)
+    current_row += 1
 
-        # 清理临时图片文件
-        all_paths = [business_license_path, invention_patent_path, software_copyright_path] + award_certificate_paths
-        for path in all_paths:
-            if path and os.path.exists(path):
-                try:
-                    os.remove(path)
-                except:
-                    pass
+    # 处理获奖记录和图片
+    for i in range(len(award_competitions)):
+        ws.cell(row=current_row, column=1, value=i + 1)
+        ws.cell(row=current_row, column=2, value=award_competitions[i])
+        ws.cell(row=current_row, column=3, value=award_prizes[i])
 
-        return jsonify({'success': True, 'message': '表单提交成功'})
-    except Exception as e:
-        print(f"提交表单出错: {str(e)}")
-        return jsonify({'success': False, 'message': f'提交失败: {str(e)}'})
+        # 记录图片状态
+        if i < len(award_certificate_paths) and award_certificate_paths[i]:
+            ws.cell(row=current_row, column=4, value="有图片")
+        else:
+            ws.cell(row=current_row, column=4, value="无")
+
+        current_row += 1
 
+    current_row += 1
 
-# 辅助函数：获取表头字体样式
-def get_header_font():
-    return Font(bold=True, size=12)
+    # 插入获奖证明图片
+    for i, img_path in enumerate(award_certificate_paths):
+        if img_path:
+            ws.cell(row=current_row, column=1, value=f"获奖记录 {i + 1} 证明图片")
+            insert_image_to_sheet(ws, img_path, current_row, 2)
+            current_row += 5  # 留出空间给图片
+
+    # 知识产权信息
+    ws.cell(row=current_row, column=1, value="知识产权信息", style='header')
+    current_row += 1
+
+    ip_fields = [
+        ("ipApplications", "当年知识产权申请数(件)"),
+        ("ipAuthorizations", "当年知识产权授权数(件)"),
+        ("inventionPatents", "其中：发明专利(件)"),
+        ("softwareCopyrights", "软件著作权(件)"),
+        ("techContracts", "技术合同成交数量(项)"),
+        ("techContractAmount", "技术合同成交额(千元)"),
+        ("nationalProjects", "当年承担国家级科技计划项目数(项)")
+    ]
+
+    current_row = add_fields_to_excel(ws, current_row, ip_fields, form)
+    current_row += 1
+
+    # 插入发明专利证书图片
+    if invention_patent_path and (form.get('inventionPatents') or 0) > 0:
+        ws.cell(row=current_row, column=1, value="发明专利证书")
+        insert_image_to_sheet(ws, invention_patent_path, current_row, 2)
+        current_row += 5  # 留出空间给图片
+
+    # 插入软件著作权证书图片
+    if software_copyright_path and (form.get('softwareCopyrights') or 0) > 0:
+        ws.cell(row=current_row, column=1, value="软件著作权证书")
+        insert_image_to_sheet(ws, software_copyright_path, current_row, 2)
+        current_row += 5  # 留出空间给图片
+
+    # 企业资质信息
+    ws.cell(row=current_row, column=1, value="企业资质信息", style='header')
+    current_row += 1
+
+    qualification_fields = [
+        ("isHighTechEnterprise", "是否高新技术企业", yes_no_map),
+        ("highTechCertificateNo", "高新技术企业证书编号"),
+        ("isTechSme", "是否是科技型中小企业", yes_no_map),
+        ("techSmeCode", "科技型中小企业登记编码"),
+        ("isInnovativeSme", "是否创新型中小企业", yes_no_map),
+        ("isSpecializedSme", "是否专精特新中小企业", yes_no_map),
+        ("isGiantSme", "是否专精特新“小巨人”企业", yes_no_map)
+    ]
+
+    current_row = add_fields_to_excel(ws, current_row, qualification_fields, form)
+    current_row += 1
+
+    # 投融资信息
+    ws.cell(row=current_row, column=1, value="投融资信息", style='header')
+    current_row += 1
+
+    finance_fields = [
+        ("financingAmount", "获得投融资金额(千元)"),
+        ("incubatorFundAmount", "其中：获得孵化器孵化基金投资额(千元)"),
+        ("bankLoanAmount", "其中：获银行贷款额(千元)")
+    ]
+
+    current_row = add_fields_to_excel(ws, current_row, finance_fields, form)
+
+    # 调整列宽
+    ws.column_widths[1] = 30
+    ws.column_widths[2] = 50
+
+    return ws
+
+
+# 将生成好的工作表追加到房间工作簿（以时间戳命名），返回工作表名
+# 已有的工作表原样复制，不经 openpyxl 加载；基于读取时的版本写回，期间工作簿被改写则抛出 StorageConflict
+def write_submission(workbooks, key, timestamp, sheet):
+    version = workbooks.version(key)
+    existing = xlsx_writer.sheet_names(workbooks.local_path(key)) if version is not None else []
+
+    # 以时间戳命名工作表
+    sheet_name = timestamp.replace(':', '-')  # 替换冒号，Excel不允许工作表名包含冒号
+    if len(sheet_name) > 31:  # Excel工作表名最大长度为31
+        sheet_name = sheet_name[:31]
+
+    # 如果工作表名已存在，添加后缀
+    counter = 1
+    original_sheet_name = sheet_name
+    while sheet_name in existing:
+        sheet_name = f"{original_sheet_name}_{counter}"
+        counter += 1
+
+    with workbooks.open_write(key, if_version=version) as f:
+        if version is None:
+            xlsx_writer.write_workbook(f, sheet_name, sheet)
+        else:
+            xlsx_writer.append_sheet(workbooks.local_path(key), f, sheet_name, sheet)
+    return sheet_name
+
+
+# 记录一次提交到索引表（连同结构化记录），返回提交ID
+# 该工作表已有索引记录时（如补录先于本次写入完成）沿用已有的提交ID，并补上缺少的结构化记录
+def record_submission(db, room, sheet_name, submitted_at, record=None):
+    record_json = json.dumps(record, ensure_ascii=False, default=str) if record is not None else None
+    cursor = db.execute(
+        'INSERT OR IGNORE INTO submissions (room_number, sheet_name, submitted_at, submission_id, record_json) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (room, sheet_name, submitted_at, uuid.uuid4().hex, record_json)
+    )
+    if cursor.rowcount == 0 and record_json is not None:
+        db.execute(
+            'UPDATE submissions SET record_json = ? WHERE room_number = ? AND sheet_name = ? AND record_json IS NULL',
+            (record_json, room, sheet_name)
+        )
+    db.commit()
+    row = db.execute('SELECT submission_id FROM submissions WHERE room_number = ? AND sheet_name = ?',
+                     (room, sheet_name)).fetchone()
+    return row['submission_id']
+
+
+# 按提交ID查找索引记录；指定room时只在该房间内查找
+def get_submission(db, submission_id, room=None):
+    row = db.execute('SELECT * FROM submissions WHERE submission_id = ?', (submission_id,)).fetchone()
+    if row is None or (room is not None and row['room_number'] != room):
+        return None
+    return row
+
+
+# 由工作表名还原提交时间：'2025-01-02 10-20-30_1' -> '2025-01-02 10:20:30'
+def sheet_name_to_timestamp(sheet_name):
+    date_part, _, time_part = sheet_name.rsplit('_', 1)[0].partition(' ')
+    return f"{date_part} {time_part.replace('-', ':')}"
+
+
+# 扫描现有工作簿，将尚未建立索引的历史提交补录到索引表（按提交时间顺序分配序号）
+def index_existing_submissions(db, workbooks):
+    entries = []
+    for key in workbooks.list():
+        if key.endswith('.xlsx') and '/' not in key and key != 'Sheet.xlsx':
+            room = key[:-5]
+            for name in read_sheet_names(workbooks.local_path(key)):
+                entries.append((sheet_name_to_timestamp(name), room, name))
+
+    entries.sort()
+    before = db.total_changes
+    db.executemany(
+        'INSERT OR IGNORE INTO submissions (room_number, sheet_name, submitted_at, submission_id) '
+        'VALUES (?, ?, ?, ?)',
+        [(room, name, submitted_at, uuid.uuid4().hex) for submitted_at, room, name in entries]
+    )
+    db.commit()
+    return db.total_changes - before
 
 
 # 辅助函数：获取企业登记注册类型映射
@@ -755,30 +1429,19 @@ def add_fields_to_excel(ws, start_row, fields, form_data):
 
 
 # 获取历史记录
-@app.route('/get_history')
+@main_bp.route('/get_history')
 def get_history():
     if 'room' not in session:
         return jsonify({'success': False, 'message': '请先登录'})
 
     room = session['room']
-    excel_filename = f"{room}.xlsx"
-    excel_path = os.path.join(EXCEL_FOLDER, excel_filename)
 
     try:
-        if not os.path.exists(excel_path):
-            return jsonify({'success': True, 'records': []})
-
-        wb = load_workbook(excel_path, read_only=True)
-        # 排除默认的Sheet
-        sheet_names = [name for name in wb.sheetnames if name != 'Sheet']
-        # 转换回原始时间戳格式
-        records = []
-        for name in sheet_names:
-            timestamp = name.replace('-', ':').rsplit('_', 1)[0]  # 还原冒号，去除可能的计数器
-            records.append({'timestamp': timestamp})
-
-        # 按时间戳排序（最新的在前）
-        records.sort(key=lambda x: x['timestamp'], reverse=True)
+        # 从提交索引读取，不再打开工作簿
+        rows = get_db().execute(
+            'SELECT * FROM submissions WHERE room_number = ? ORDER BY seq DESC', (room,)
+        ).fetchall()
+        records = [submission_summary(row) for row in rows]
 
         return jsonify({'success': True, 'records': records})
     except Exception as e:
@@ -786,55 +1449,66 @@ def get_history():
         return jsonify({'success': False, 'message': f'获取历史记录失败: {str(e)}'})
 
 
+# 历史记录列表中的一项：提交ID、工作表名，以及兼容旧接口的timestamp参数
+def submission_summary(row):
+    return {
+        'id': row['submission_id'],
+        'sheet_name': row['sheet_name'],
+        'submitted_at': row['submitted_at'],
+        'timestamp': row['sheet_name'].replace('-', ':').rsplit('_', 1)[0]  # 还原冒号，去除可能的计数器
+    }
+
+
+# 读取工作簿中的提交记录工作表名（排除默认的Sheet）
+def read_sheet_names(excel_path):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, read_only=True)
+    try:
+        return [name for name in wb.sheetnames if name != 'Sheet']
+    finally:
+        wb.close()
+
+
 # 下载Excel文件
-@app.route('/download_excel')
+@main_bp.route('/download_excel')
+@admission.limit('export')
 def download_excel():
     if 'room' not in session:
         return jsonify({'success': False, 'message': '请先登录'})
 
     room = session['room']
+    submission_id = request.args.get('id')
     timestamp = request.args.get('timestamp')
-    excel_filename = f"{room}.xlsx"
-    excel_path = os.path.join(EXCEL_FOLDER, excel_filename)
+    excel_path = get_storage('workbooks').local_path(workbook_key(room))
+
+    if not submission_id and not timestamp:
+        return jsonify({'success': False, 'message': '参数缺失'})
 
     if not os.path.exists(excel_path):
         return jsonify({'success': False, 'message': '文件不存在'})
 
     try:
         # 创建一个临时Excel文件，只包含请求的工作表
-        wb = load_workbook(excel_path)
-        sheet_name = timestamp.replace(':', '-')  # 转换为工作表名格式
-
-        # 检查工作表是否存在
-        if sheet_name not in wb.sheetnames:
-            # 检查带有计数器的版本
-            found = False
-            counter = 1
-            while not found and counter <= 100:  # 限制最大尝试次数
-                temp_name = f"{sheet_name}_{counter}"
-                if temp_name in wb.sheetnames:
-                    sheet_name = temp_name
-                    found = True
-                counter += 1
-
-            if not found:
+        if submission_id:
+            # 按提交ID直接定位工作表
+            row = get_submission(get_db(), submission_id, room)
+            if row is None:
                 return jsonify({'success': False, 'message': '记录不存在'})
-
-        # 删除其他工作表
-        for name in list(wb.sheetnames):
-            if name != sheet_name:
-                del wb[name]
-
-        # 保存到临时内存
-        temp_file = io.BytesIO()
-        wb.save(temp_file)
-        temp_file.seek(0)
+            sheet_name = row['sheet_name']
+            temp_file = run_heavy(export_single_sheet, excel_path, sheet_name)
+        else:
+            # 兼容旧参数：按时间戳还原工作表名
+            sheet_name = timestamp.replace(':', '-')  # 转换为工作表名格式
+            temp_file = run_heavy(export_single_sheet, excel_path, sheet_name, True)
+        if temp_file is None:
+            return jsonify({'success': False, 'message': '记录不存在'})
 
         # 提供下载
         return send_file(
             temp_file,
             as_attachment=True,
-            download_name=f"{room}_{timestamp.replace(':', '-')}.xlsx",
+            download_name=f"{room}_{sheet_name}.xlsx",
             mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
     except Exception as e:
@@ -842,22 +1516,310 @@ def download_excel():
         return jsonify({'success': False, 'message': f'下载失败: {str(e)}'})
 
 
-# 获取记录详情
-@app.route('/get_record')
+# 导出只包含单个工作表的工作簿，返回内存文件；工作表不存在时返回None
+# match_counter为True时，同时查找同一秒内重复提交产生的带计数器后缀的工作表
+# 不经 openpyxl 加载整本工作簿：只复制该工作表用到的部件（见 xlsx_writer.extract_sheet）
+def export_single_sheet(excel_path, sheet_name, match_counter=False):
+    sheet_names = xlsx_writer.sheet_names(excel_path)
+
+    # 检查工作表是否存在
+    if sheet_name not in sheet_names:
+        if not match_counter:
+            return None
+
+        # 检查带有计数器的版本（限制最大尝试次数）
+        sheet_name = next((f"{sheet_name}_{counter}" for counter in range(1, 101)
+                           if f"{sheet_name}_{counter}" in sheet_names), None)
+        if sheet_name is None:
+            return None
+
+    # 保存到临时内存
+    temp_file = io.BytesIO()
+    xlsx_writer.extract_sheet(excel_path, temp_file, sheet_name)
+    temp_file.seek(0)
+    return temp_file
+
+
+# 获取记录详情：返回一次提交的完整结构化内容（各板块字段、成员、获奖及图片位置）
+@main_bp.route('/get_record')
 def get_record():
     if 'room' not in session:
         return jsonify({'success': False, 'message': '请先登录'})
 
-    return jsonify({'success': True, 'message': '记录详情'})
+    submission_id = request.args.get('id')
+    if not submission_id:
+        return jsonify({'success': False, 'message': '参数缺失'})
 
+    row = get_submission(get_db(), submission_id, session['room'])
+    if row is None:
+        return jsonify({'success': False, 'message': '记录不存在'})
+
+    return record_response(row)
+
+
+# 返回记录详情的JSON响应
+def record_response(row):
+    try:
+        record = load_submission_record(row)
+        if record is None:
+            return jsonify({'success': False, 'message': '记录不存在'})
+        return jsonify({
+            'success': True,
+            'record': {
+                'id': row['submission_id'],
+                'room': row['room_number'],
+                'sheet_name': row['sheet_name'],
+                'submitted_at': row['submitted_at'],
+                **record,
+                'images': image_references(row['submission_id'], record['images'])
+            }
+        })
+    except Exception as e:
+        print(f"获取记录详情出错: {str(e)}")
+        return jsonify({'success': False, 'message': f'获取记录失败: {str(e)}'})
+
+
+# 旧数据（没有保存结构化记录）解析结果的进程内缓存：
+# 键为（提交ID，工作簿版本），工作簿被改写后版本变化，自动失效
+RECORD_CACHE_SIZE = 256
+_record_cache = OrderedDict()
+_record_cache_lock = threading.Lock()
+
+
+# 读取结构化记录：优先使用提交时保存的JSON，其次是进程内缓存，最后才解析工作簿
+def load_submission_record(row):
+    if row['record_json']:
+        return json.loads(row['record_json'])
+
+    workbooks = get_storage('workbooks')
+    version = workbooks.version(workbook_key(row['room_number']))
+    if version is None:
+        return None
+    key = (row['submission_id'], version)
+
+    with _record_cache_lock:
+        if key in _record_cache:
+            _record_cache.move_to_end(key)
+            return _record_cache[key]
+
+    excel_path = workbooks.local_path(workbook_key(row['room_number']))
+    record = run_heavy(read_submission_record, excel_path, row['sheet_name'])
+    if record is not None:
+        with _record_cache_lock:
+            _record_cache[key] = record
+            while len(_record_cache) > RECORD_CACHE_SIZE:
+                _record_cache.popitem(last=False)
+    return record
+
+
+# 从工作簿中读取指定工作表的结构化记录
+def read_submission_record(excel_path, sheet_name):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        if sheet_name not in wb.sheetnames:
+            return None
+        return parse_submission_record(wb[sheet_name].iter_rows(values_only=True))
+    finally:
+        wb.close()
+
+
+# 提交记录工作表中的板块标题
+SECTION_TITLES = ["项目负责人信息", "企业信息", "项目成员信息", "赛事获奖信息", "知识产权信息", "企业资质信息", "投融资信息"]
+# 图片所在行的标签（图片按出现顺序编号，与工作表中的图片顺序一致）
+IMAGE_LABELS = ("营业执照照片", "发明专利证书", "软件著作权证书")
+
+
+# 将提交记录工作表的各行（values_only）解析为结构化记录
+def parse_submission_record(rows):
+    record = {'fields': [], 'sections': [], 'members': [], 'awards': [], 'images': []}
+    section = None
+    table_headers = None
+
+    for row_number, row in enumerate(rows, 1):
+        # 空单元格在内存中为''，从文件读回时为None，统一为''
+        row = ['' if cell is None else cell for cell in row]
+        label = row[0] if row else ''
+        value = row[1] if len(row) > 1 else ''
+        if label == '':
+            continue
+
+        if label in SECTION_TITLES:
+            section = {'title': label, 'fields': []}
+            record['sections'].append(section)
+            table_headers = None
+            continue
+
+        if label in IMAGE_LABELS or (isinstance(label, str) and label.startswith("获奖记录 ")):
+            record['images'].append({'index': len(record['images']), 'label': label, 'row': row_number})
+            continue
+
+        if section is None:
+            # 板块之前的行（提交时间）
+            record['fields'].append({'label': label, 'value': value})
+            continue
+
+        if section['title'] in ("项目成员信息", "赛事获奖信息"):
+            if label == "序号":
+                table_headers = [header for header in row if header != '']
+                continue
+            if table_headers and str(label).isdigit():
+                item = dict(zip(table_headers, row))
+                if section['title'] == "项目成员信息":
+                    record['members'].append(item)
+                else:
+                    record['awards'].append({
+                        'competition': item.get("赛事完整名称"),
+                        'prize': item.get("所获奖项"),
+                        'has_image': item.get("图片证明") == "有图片"
+                    })
+                continue
+
+        section['fields'].append({'label': label, 'value': value})
+
+    return record
+
+
+# 为记录中的图片附上各尺寸的访问地址
+def image_references(submission_id, images):
+    sizes = list(current_app.config['IMAGE_SIZES']) + ['original']
+    return [
+        {**image, 'urls': {size: url_for('main.submission_image', submission_id=submission_id,
+                                         index=image['index'], size=size) for size in sizes}}
+        for image in images
+    ]
+
+
+# 记录中每张图片对应的上传文件（按图片序号），没有上传的为None
+def submission_image_sources(record, business_license_path, invention_patent_path, software_copyright_path,
+                             award_certificate_paths):
+    sources = []
+    for image in record['images']:
+        label = image['label']
+        if label == "营业执照照片":
+            sources.append(business_license_path)
+        elif label == "发明专利证书":
+            sources.append(invention_patent_path)
+        elif label == "软件著作权证书":
+            sources.append(software_copyright_path)
+        else:
+            # "获奖记录 N 证明图片"
+            number = int(label.split()[1])
+            sources.append(award_certificate_paths[number - 1] if number <= len(award_certificate_paths) else None)
+    return sources
+
+
+# 把上传的原图存入提交的图片目录：<提交ID>/original-<序号><扩展名>
+def store_submission_images(images, submission_id, sources):
+    for index, path in enumerate(sources):
+        if not path or not os.path.exists(path):
+            continue
+        ext = os.path.splitext(path)[1].lower() or '.png'
+        images.put_file(f"{submission_id}/original-{index}{ext}", path)
+
+
+# 查找某张图片原图的键
+def find_original_image(keys, submission_id, index):
+    prefix = f"{submission_id}/original-{index}."
+    for key in keys:
+        if key.startswith(prefix):
+            return key
+    return None
+
+
+# 旧提交没有保留原图，从工作表中提取嵌入的图片（按锚点行与记录中的图片对应）
+def extract_workbook_images(images, excel_path, sheet_name, submission_id):
+    from openpyxl import load_workbook
+
+    if os.path.exists(excel_path):
+        wb = load_workbook(excel_path)
+        if sheet_name in wb.sheetnames:
+            ws = wb[sheet_name]
+            record = parse_submission_record(ws.iter_rows(values_only=True))
+            index_by_row = {image['row']: image['index'] for image in record['images']}
+            existing = images.list(f"{submission_id}/")
+            for embedded in ws._images:
+                index = index_by_row.get(embedded.anchor._from.row + 1)
+                if index is not None and find_original_image(existing, submission_id, index) is None:
+                    extension = xlsx_writer.MEDIA_FORMATS.get(embedded.format, ('png',))[0]
+                    images.put_bytes(f"{submission_id}/original-{index}.{extension}", embedded._data())
+    # 标记已提取，缺失的图片不再重复加载工作簿
+    images.put_bytes(f"{submission_id}/.extracted", b'')
+
+
+# 返回指定尺寸图片的 (本地文件路径, MIME类型)，缩略图只在第一次请求时生成
+# 不存在或不是可识别的图片时返回None；在后台执行器中运行
+def ensure_image_variant(images, excel_path, sheet_name, submission_id, index, size, box):
+    from PIL import Image as PILImage
+
+    variant = f"{submission_id}/{size}-{index}.jpg"
+    keys = images.list(f"{submission_id}/")
+    if box is not None and variant in keys:
+        return images.local_path(variant), 'image/jpeg'
+
+    original = find_original_image(keys, submission_id, index)
+    if original is None and f"{submission_id}/.extracted" not in keys:
+        extract_workbook_images(images, excel_path, sheet_name, submission_id)
+        original = find_original_image(images.list(f"{submission_id}/"), submission_id, index)
+    if original is None:
+        return None
+
+    # MIME类型按图片内容识别，不按文件扩展名；无法识别或已损坏的图片视为不存在
+    try:
+        img = PILImage.open(images.local_path(original))
+        if box is None:
+            mimetype = PILImage.MIME.get(img.format)
+            return (images.local_path(original), mimetype) if mimetype else None
+        img.thumbnail(box)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+    except (OSError, PILImage.DecompressionBombError):
+        return None
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=85, optimize=True)
+    images.put_bytes(variant, output.getvalue())
+    return images.local_path(variant), 'image/jpeg'
+
+
+# 提交图片：用户只能查看本房间的图片，管理员可查看全部
+# 同一地址的内容永不改变，可长期缓存；支持 ETag 协商与 Range 请求
+@main_bp.route('/images/<submission_id>/<int:index>')
+@main_bp.route('/images/<submission_id>/<int:index>/<size>')
+def submission_image(submission_id, index, size='original'):
+    if 'admin_logged_in' in session:
+        room = None
+    elif 'room' in session:
+        room = session['room']
+    else:
+        abort(403)
+
+    sizes = current_app.config['IMAGE_SIZES']
+    if size != 'original' and size not in sizes:
+        abort(404)
+
+    row = get_submission(get_db(), submission_id, room)
+    if row is None:
+        abort(404)
+
+    excel_path = get_storage('workbooks').local_path(workbook_key(row['room_number']))
+    variant = run_heavy(ensure_image_variant, get_storage('images'), excel_path, row['sheet_name'],
+                        submission_id, index, size, sizes.get(size))
+    if variant is None:
+        abort(404)
+    path, mimetype = variant
+
+    # 内容由地址唯一确定，ETag 也只取决于地址，多台服务器之间保持一致
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=f"{submission_id}-{index}-{size}",
+                         max_age=current_app.config['IMAGE_MAX_AGE'])
+    # 禁止浏览器按内容猜测类型（只按图片类型显示）
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    # 图片需要登录才能查看，只允许浏览器缓存，不允许共享缓存
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
 
-from flask import Blueprint, render_template, request, jsonify, session, send_file, redirect, url_for
-import os
-import io
-from datetime import datetime
-from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Font
-from openpyxl.drawing.image import Image
 
 # 管理员蓝图
 admin_bp = Blueprint('admin', __name__)
@@ -873,6 +1835,7 @@ def admin_login():
 
 # 管理员登录处理
 @admin_bp.route('/admin/login', methods=['POST'])
+@admission.limit('auth')
 def admin_login_process():
     data = request.get_json()  # 修改为获取JSON数据，与前端保持一致
     username = data.get('username')
@@ -909,6 +1872,192 @@ def admin_logout():
     return redirect(url_for('admin.admin_login'))
 
 
+# 用户管理：房间列表（含停用状态与提交数）
+@admin_bp.route('/admin/users')
+def admin_users():
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    rows = get_db().execute('''
+        SELECT users.room_number, users.created_at, users.disabled, COUNT(submissions.seq) AS submissions
+        FROM users LEFT JOIN submissions ON submissions.room_number = users.room_number
+        GROUP BY users.room_number
+    ''').fetchall()
+    users = [
+        {'room': row['room_number'], 'created_at': row['created_at'], 'disabled': bool(row['disabled']),
+         'submissions': row['submissions']}
+        for row in rows
+    ]
+    users.sort(key=lambda user: room_sort_key(user['room']))
+    return jsonify({'success': True, 'users': users})
+
+
+# 导入文件的表头（中英文均可）；没有表头时第一列为房间号、第二列为密码
+USER_IMPORT_HEADERS = {
+    'room': ('房间号', 'room', 'room_number'),
+    'password': ('密码', '初始密码', 'password'),
+}
+
+
+# 读取导入文件（CSV 或 xlsx），返回 [(行号, 房间号, 密码)]
+def read_user_import(file):
+    if file.filename.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = [list(row) for row in wb.active.iter_rows(values_only=True)]
+        finally:
+            wb.close()
+    else:
+        data = file.read()
+        try:
+            text = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            text = data.decode('gbk')  # Excel 另存的中文 CSV
+        rows = list(csv.reader(io.StringIO(text)))
+
+    def cell(value):
+        if value is None:
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)  # xlsx 中的房间号可能读成 101.0
+        return str(value).strip()
+
+    rows = [[cell(value) for value in row] for row in rows]
+    room_col, password_col, start = 0, 1, 0
+    if rows:
+        header = [value.lower() for value in rows[0]]
+        if any(name in header for name in USER_IMPORT_HEADERS['room']):
+            room_col = next(header.index(name) for name in USER_IMPORT_HEADERS['room'] if name in header)
+            password_col = next((header.index(name) for name in USER_IMPORT_HEADERS['password'] if name in header),
+                                None)
+            start = 1
+
+    entries = []
+    for line, row in enumerate(rows[start:], start + 1):
+        if not any(row):
+            continue
+        room = row[room_col] if room_col < len(row) else ''
+        password = row[password_col] if password_col is not None and password_col < len(row) else ''
+        entries.append((line, room, password))
+    return entries
+
+
+# 对比导入内容与现有用户，得到待新增、待更新密码、未变化的房间及逐行错误
+def diff_user_import(db, entries, update_existing):
+    existing = {row['room_number']: row['password_hash']
+                for row in db.execute('SELECT room_number, password_hash FROM users')}
+    diff = {'create': [], 'update': [], 'unchanged': [], 'errors': []}
+    seen = {}
+    for line, room, password in entries:
+        if not room:
+            diff['errors'].append({'row': line, 'room': room, 'message': '房间号不能为空'})
+        elif not password:
+            diff['errors'].append({'row': line, 'room': room, 'message': '密码不能为空'})
+        elif room in seen:
+            diff['errors'].append({'row': line, 'room': room, 'message': f'与第{seen[room]}行房间号重复'})
+        else:
+            seen[room] = line
+            password_hash = hash_password(password)
+            if room not in existing:
+                diff['create'].append((room, password_hash))
+            elif update_existing and existing[room] != password_hash:
+                diff['update'].append((room, password_hash))
+            else:
+                diff['unchanged'].append(room)
+    return diff
+
+
+# 批量导入房间与初始密码：一个事务内 executemany 写入；dry_run 时只返回差异
+# update_existing 为真时同时重置已有房间的密码，否则已有房间保持不变
+@admin_bp.route('/admin/users/import', methods=['POST'])
+def admin_import_users():
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'success': False, 'message': '请上传CSV或xlsx文件'})
+    dry_run = request.form.get('dry_run') in ('1', 'true', 'yes')
+    update_existing = request.form.get('update_existing') in ('1', 'true', 'yes')
+
+    try:
+        entries = read_user_import(file)
+    except Exception as e:
+        print(f"读取用户导入文件出错: {str(e)}")
+        return jsonify({'success': False, 'message': f'无法读取文件: {str(e)}'})
+
+    db = get_db()
+    diff = diff_user_import(db, entries, update_existing)
+    if not dry_run and (diff['create'] or diff['update']):
+        try:
+            with db:
+                db.executemany('INSERT INTO users (room_number, password_hash) VALUES (?, ?)', diff['create'])
+                db.executemany('UPDATE users SET password_hash = ? WHERE room_number = ?',
+                               [(password_hash, room) for room, password_hash in diff['update']])
+        except sqlite3.IntegrityError as e:
+            # 导入期间有房间自行注册，整批回滚，重新导入即可
+            return jsonify({'success': False, 'message': f'导入失败，请重试: {str(e)}'})
+
+    return jsonify({
+        'success': True,
+        'dry_run': dry_run,
+        'created': [room for room, _ in diff['create']],
+        'updated': [room for room, _ in diff['update']],
+        'unchanged': diff['unchanged'],
+        'errors': diff['errors']
+    })
+
+
+# 批量操作：reset（重置密码）、disable（停用）、enable（启用）、delete（删除账号，提交数据保留）
+USER_BULK_ACTIONS = ('reset', 'disable', 'enable', 'delete')
+
+
+@admin_bp.route('/admin/users/bulk', methods=['POST'])
+def admin_bulk_users():
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    data = request.get_json() or {}
+    action = data.get('action')
+    rooms = [str(room).strip() for room in data.get('rooms') or []]
+    dry_run = bool(data.get('dry_run'))
+    if action not in USER_BULK_ACTIONS:
+        return jsonify({'success': False, 'message': '不支持的操作'})
+    if not rooms:
+        return jsonify({'success': False, 'message': '请选择房间'})
+    # 新密码可省略（随机生成），指定时必须是非空字符串
+    password = data.get('password')
+    if action == 'reset' and password is not None and (not isinstance(password, str) or not password.strip()):
+        return jsonify({'success': False, 'message': '密码不能为空'})
+
+    db = get_db()
+    existing = {row['room_number'] for row in db.execute('SELECT room_number FROM users')}
+    errors = [{'room': room, 'message': '房间号不存在'} for room in rooms if room not in existing]
+    targets = list(dict.fromkeys(room for room in rooms if room in existing))
+
+    result = {'success': True, 'dry_run': dry_run, 'action': action, 'affected': targets, 'errors': errors}
+    if dry_run or not targets:
+        return jsonify(result)
+
+    with db:
+        if action == 'reset':
+            # 未指定新密码时为每个房间生成随机密码，只在本次响应中返回
+            passwords = {room: password or secrets.token_urlsafe(6) for room in targets}
+            db.executemany('UPDATE users SET password_hash = ? WHERE room_number = ?',
+                           [(hash_password(passwords[room]), room) for room in targets])
+            if not password:
+                result['passwords'] = passwords
+        elif action in ('disable', 'enable'):
+            db.executemany('UPDATE users SET disabled = ? WHERE room_number = ?',
+                           [(1 if action == 'disable' else 0, room) for room in targets])
+        else:
+            db.executemany('DELETE FROM users WHERE room_number = ?', [(room,) for room in targets])
+            db.executemany('DELETE FROM drafts WHERE room_number = ?', [(room,) for room in targets])
+    return jsonify(result)
+
+
 # 获取所有房间的表单记录
 @admin_bp.route('/admin/get_all_rooms')
 def get_all_rooms():
@@ -916,37 +2065,17 @@ def get_all_rooms():
         return jsonify({'success': False, 'message': '请先登录'})
 
     try:
-        # 获取所有房间的Excel文件
+        # 从提交索引读取所有房间的表单记录，不再逐个打开工作簿
         rooms = []
-        if os.path.exists(EXCEL_FOLDER) and os.path.isdir(EXCEL_FOLDER):
-            for filename in os.listdir(EXCEL_FOLDER):
-                if filename.endswith('.xlsx') and filename != 'Sheet.xlsx':
-                    room_number = filename[:-5]  # 去除.xlsx扩展名
-                    excel_path = os.path.join(EXCEL_FOLDER, filename)
-
-                    # 获取该房间的所有表单记录
-                    wb = load_workbook(excel_path, read_only=True)
-                    # 排除默认的Sheet
-                    sheet_names = [name for name in wb.sheetnames if name != 'Sheet']
-
-                    records = []
-                    for name in sheet_names:
-                        timestamp = name.replace('-', ':').rsplit('_', 1)[0]
-                        records.append({
-                            'timestamp': timestamp,
-                            'sheet_name': name
-                        })
-
-                    # 按时间戳排序
-                    records.sort(key=lambda x: x['timestamp'], reverse=True)
-
-                    rooms.append({
-                        'room_number': room_number,
-                        'records': records
-                    })
+        rows = get_db().execute('SELECT * FROM submissions ORDER BY room_number, seq DESC').fetchall()
+        for room_number, group in groupby(rows, key=lambda row: row['room_number']):
+            rooms.append({
+                'room_number': room_number,
+                'records': [submission_summary(row) for row in group]
+            })
 
         # 按房间号从小到大排序
-        rooms.sort(key=lambda x: int(x['room_number']))
+        rooms.sort(key=lambda x: room_sort_key(x['room_number']))
 
         return jsonify({'success': True, 'rooms': rooms})
     except Exception as e:
@@ -954,8 +2083,54 @@ def get_all_rooms():
         return jsonify({'success': False, 'message': f'获取记录失败: {str(e)}'})
 
 
+# 管理员获取任意记录的详情
+@admin_bp.route('/admin/get_record')
+def admin_get_record():
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    submission_id = request.args.get('id')
+    if not submission_id:
+        return jsonify({'success': False, 'message': '参数缺失'})
+
+    row = get_submission(get_db(), submission_id)
+    if row is None:
+        return jsonify({'success': False, 'message': '记录不存在'})
+
+    return record_response(row)
+
+
+# 管理员查看某个房间所有提交中的图片（证照、获奖证明等），按提交时间倒序
+@admin_bp.route('/admin/room_images')
+def admin_room_images():
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    room = request.args.get('room')
+    if not room:
+        return jsonify({'success': False, 'message': '参数缺失'})
+
+    try:
+        rows = get_db().execute(
+            'SELECT * FROM submissions WHERE room_number = ? ORDER BY seq DESC', (room,)
+        ).fetchall()
+        submissions = []
+        for row in rows:
+            record = load_submission_record(row)
+            if record and record['images']:
+                submissions.append({
+                    **submission_summary(row),
+                    'images': image_references(row['submission_id'], record['images'])
+                })
+        return jsonify({'success': True, 'room': room, 'submissions': submissions})
+    except Exception as e:
+        print(f"获取房间图片出错: {str(e)}")
+        return jsonify({'success': False, 'message': f'获取图片失败: {str(e)}'})
+
+
 # 管理员下载单个表单
 @admin_bp.route('/admin/download_single')
+@admission.limit('export')
 def download_single():
     if 'admin_logged_in' not in session:
         return jsonify({'success': False, 'message': '请先登录'})
@@ -963,33 +2138,28 @@ def download_single():
     room = request.args.get('room')
     sheet_name = request.args.get('sheet_name')
 
+    # 优先按提交ID定位，room/sheet_name 作为兼容参数保留
+    submission_id = request.args.get('id')
+    if submission_id:
+        row = get_submission(get_db(), submission_id)
+        if row is None:
+            return jsonify({'success': False, 'message': '记录不存在'})
+        room, sheet_name = row['room_number'], row['sheet_name']
+
     if not room or not sheet_name:
         return jsonify({'success': False, 'message': '参数缺失'})
 
-    excel_filename = f"{room}.xlsx"
-    excel_path = os.path.join(EXCEL_FOLDER, excel_filename)
+    excel_path = get_storage('workbooks').local_path(workbook_key(room))
 
     if not os.path.exists(excel_path):
         return jsonify({'success': False, 'message': '文件不存在'})
 
     try:
         # 创建临时文件，只包含请求的工作表
-        wb = load_workbook(excel_path)
-
-        # 检查工作表是否存在
-        if sheet_name not in wb.sheetnames:
+        temp_file = run_heavy(export_single_sheet, excel_path, sheet_name)
+        if temp_file is None:
             return jsonify({'success': False, 'message': '记录不存在'})
 
-        # 删除其他工作表
-        for name in list(wb.sheetnames):
-            if name != sheet_name:
-                del wb[name]
-
-        # 保存到临时内存
-        temp_file = io.BytesIO()
-        wb.save(temp_file)
-        temp_file.seek(0)
-
         # 提供下载
         return send_file(
             temp_file,
@@ -1004,6 +2174,7 @@ def download_single():
 
 # 管理员批量下载表单
 @admin_bp.route('/admin/download_batch', methods=['POST'])
+@admission.limit('export')
 def download_batch():
     if 'admin_logged_in' not in session:
         return jsonify({'success': False, 'message': '请先登录'})
@@ -1015,82 +2186,18 @@ def download_batch():
         return jsonify({'success': False, 'message': '请选择要下载的记录'})
 
     try:
-        # 创建一个新的Excel工作簿
-        wb = Workbook()
-        # 删除默认工作表
-        default_sheet = wb.active
-        wb.remove(default_sheet)
-
-        # 遍历选中的记录，添加到新工作簿
+        # 带提交ID的记录先解析为房间与工作表名
+        db = get_db()
+        resolved_records = []
         for record in selected_records:
-            room = record.get('room')
-            sheet_name = record.get('sheet_name')
-
-            if not room or not sheet_name:
-                continue
-
-            excel_filename = f"{room}.xlsx"
-            excel_path = os.path.join(EXCEL_FOLDER, excel_filename)
-
-            if not os.path.exists(excel_path):
-                continue
+            if record.get('id'):
+                row = get_submission(db, record['id'])
+                if row is None:
+                    continue
+                record = {'room': row['room_number'], 'sheet_name': row['sheet_name']}
+            resolved_records.append(record)
 
-            # 打开源工作簿（需启用read_only=False以支持图片操作）
-            source_wb = load_workbook(excel_path, read_only=False, data_only=True)
-            if sheet_name not in source_wb.sheetnames:
-                source_wb.close()
-                continue
-
-            # 复制工作表到新工作簿
-            source_ws = source_wb[sheet_name]
-            new_sheet_name = f"room_{room}_{sheet_name}"
-            # 确保工作表名不超过31个字符
-            if len(new_sheet_name) > 31:
-                new_sheet_name = new_sheet_name[:31]
-
-            # 处理重复的工作表名
-            counter = 1
-            original_new_name = new_sheet_name
-            while new_sheet_name in wb.sheetnames:
-                new_sheet_name = f"{original_new_name}_{counter}"
-                counter += 1
-
-            target_ws = wb.create_sheet(title=new_sheet_name)
-
-            # 1. 复制单元格数据
-            for row in source_ws.iter_rows(values_only=True):
-                target_ws.append(row)
-
-            # 2. 复制图片（关键新增逻辑）
-            from openpyxl.drawing.image import Image
-            import io
-            for img in source_ws._images:
-                # 获取图片在源工作表中的位置
-                anchor = img.anchor
-
-                # 正确获取图片数据
-                img_bytes = img._data()  # 调用函数获取字节数据
-                img_stream = io.BytesIO(img_bytes)  # 创建字节流
-
-                # 创建新图片对象
-                new_img = Image(img_stream)
-                # 保持图片位置不变
-                new_img.anchor = anchor
-                # 添加到目标工作表
-                target_ws.add_image(new_img)
-
-            # 3. 复制列宽和行高
-            for col in source_ws.column_dimensions:
-                target_ws.column_dimensions[col].width = source_ws.column_dimensions[col].width
-            for row in source_ws.row_dimensions:
-                target_ws.row_dimensions[row].height = source_ws.row_dimensions[row].height
-
-            source_wb.close()
-
-        # 保存到临时内存
-        temp_file = io.BytesIO()
-        wb.save(temp_file)
-        temp_file.seek(0)
+        temp_file = run_heavy(build_batch_workbook, get_storage('workbooks'), resolved_records)
 
         # 提供下载
         return send_file(
@@ -1104,9 +2211,861 @@ def download_batch():
         return jsonify({'success': False, 'message': f'下载失败: {str(e)}'})
 
 
-# 注册蓝图
-app.register_blueprint(admin_bp)
+# 将选中的多条记录合并为一个工作簿（含图片、列宽和行高），返回内存文件
+def build_batch_workbook(workbooks, selected_records):
+    from openpyxl import Workbook, load_workbook
+    from openpyxl.drawing.image import Image
+
+    # 创建一个新的Excel工作簿
+    wb = Workbook()
+    # 删除默认工作表
+    default_sheet = wb.active
+    wb.remove(default_sheet)
+
+    # 遍历选中的记录，添加到新工作簿
+    for record in selected_records:
+        room = record.get('room')
+        sheet_name = record.get('sheet_name')
+
+        if not room or not sheet_name:
+            continue
+
+        excel_path = workbooks.local_path(workbook_key(room))
+
+        if not os.path.exists(excel_path):
+            continue
+
+        # 打开源工作簿（需启用read_only=False以支持图片操作）
+        source_wb = load_workbook(excel_path, read_only=False, data_only=True)
+        if sheet_name not in source_wb.sheetnames:
+            source_wb.close()
+            continue
+
+        # 复制工作表到新工作簿
+        source_ws = source_wb[sheet_name]
+        new_sheet_name = f"room_{room}_{sheet_name}"
+        # 确保工作表名不超过31个字符
+        if len(new_sheet_name) > 31:
+            new_sheet_name = new_sheet_name[:31]
+
+        # 处理重复的工作表名
+        counter = 1
+        original_new_name = new_sheet_name
+        while new_sheet_name in wb.sheetnames:
+            new_sheet_name = f"{original_new_name}_{counter}"
+            counter += 1
+
+        target_ws = wb.create_sheet(title=new_sheet_name)
+
+        # 1. 复制单元格数据
+        for row in source_ws.iter_rows(values_only=True):
+            target_ws.append(row)
+
+        # 2. 复制图片（关键新增逻辑）
+        for img in source_ws._images:
+            # 获取图片在源工作表中的位置
+            anchor = img.anchor
+
+            # 正确获取图片数据
+            img_bytes = img._data()  # 调用函数获取字节数据
+            img_stream = io.BytesIO(img_bytes)  # 创建字节流
+
+            # 创建新图片对象
+            new_img = Image(img_stream)
+            # 保持图片位置不变
+            new_img.anchor = anchor
+            # 添加到目标工作表
+            target_ws.add_image(new_img)
+
+        # 3. 复制列宽和行高
+        for col in source_ws.column_dimensions:
+            target_ws.column_dimensions[col].width = source_ws.column_dimensions[col].width
+        for row in source_ws.row_dimensions:
+            target_ws.row_dimensions[row].height = source_ws.row_dimensions[row].height
+
+        source_wb.close()
+
+    # 保存到临时内存
+    temp_file = io.BytesIO()
+    wb.save(temp_file)
+    temp_file.seek(0)
+    return temp_file
+
+
+# 增量导出的列：提交元数据 + 回填解析得到的表单字段
+EXPORT_META_COLUMNS = ['seq', 'id', 'room', 'sheet_name', 'submitted_at']
+EXPORT_FIELD_COLUMNS = [
+    'projectLeaderName', 'projectLeaderCollege', 'projectLeaderGrade', 'projectLeaderGender',
+    'projectLeaderPhone', 'projectType',
+    'enterpriseAccount', 'enterpriseName', 'establishmentDate', 'registeredCapital', 'incubationStartDate',
+    'areaOccupied', 'registrationType', 'techField', 'coreTechField1', 'coreTechField2', 'coreTechField3',
+    'industryCategory1', 'industryCategory2', 'industryCategory3', 'industryCategory4', 'taxpayerType',
+    'totalRevenue', 'netProfit', 'exportAmount', 'rdExpenditure', 'taxPayment',
+    'awards',
+    'ipApplications', 'ipAuthorizations', 'inventionPatents', 'softwareCopyrights', 'techContracts',
+    'techContractAmount', 'nationalProjects',
+    'isHighTechEnterprise', 'highTechCertificateNo', 'isTechSme', 'techSmeCode', 'isInnovativeSme',
+    'isSpecializedSme', 'isGiantSme',
+    'financingAmount', 'incubatorFundAmount', 'bankLoanAmount'
+]
+EXPORT_MIMETYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+
+
+# 读取同一房间的多条提交记录，返回按输入顺序排列的表单数据列表
+def read_submissions(excel_path, sheet_names):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        return [parse_submission_sheet(wb[name]) if name in wb.sheetnames else None for name in sheet_names]
+    finally:
+        wb.close()
+
+
+# 按序号顺序逐条产出导出行；相邻的同一房间记录只打开一次工作簿
+def iter_export_rows(workbooks, index_rows):
+    for room, group in groupby(index_rows, key=lambda row: row['room_number']):
+        group = list(group)
+        excel_path = workbooks.local_path(workbook_key(room))
+        if not os.path.exists(excel_path):
+            continue
+        parsed = run_heavy(read_submissions, excel_path, [row['sheet_name'] for row in group])
+        for row, form_data in zip(group, parsed):
+            if form_data is None:
+                continue
+            export_row = {
+                'seq': row['seq'],
+                'id': row['submission_id'],
+                'room': room,
+                'sheet_name': row['sheet_name'],
+                'submitted_at': row['submitted_at']
+            }
+            for column in EXPORT_FIELD_COLUMNS:
+                export_row[column] = form_data.get(column)
+            yield export_row
+
+
+# 管理员增量导出：只导出游标之后新增的提交记录
+# 参数：since（上次返回的序号水位）或 since_time（提交时间，YYYY-MM-DD HH:MM:SS），
+#      format=xlsx|csv|ndjson，limit 可选
+# 新的水位通过响应头 X-Export-Watermark 返回，下次请求时作为 since 传入
+@admin_bp.route('/admin/export_since')
+@admission.limit('export')
+def export_since():
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({'success': False, 'message': '不支持的导出格式'})
+
+    try:
+        since = request.args.get('since', 0, type=int)
+        since_time = request.args.get('since_time')
+        limit = request.args.get('limit', -1, type=int)
+
+        db = get_db()
+        if since_time:
+            index_rows = db.execute(
+                'SELECT * FROM submissions WHERE submitted_at > ? ORDER BY seq LIMIT ?', (since_time, limit)
+            ).fetchall()
+        else:
+            index_rows = db.execute(
+                'SELECT * FROM submissions WHERE seq > ? ORDER BY seq LIMIT ?', (since, limit)
+            ).fetchall()
+        watermark = index_rows[-1]['seq'] if index_rows else since
+
+        rows = iter_export_rows(get_storage('workbooks'), index_rows)
+
+        if export_format == 'xlsx':
+            # 生成xlsx是CPU密集操作，放到执行器中完成
+            body = run_heavy(build_export_xlsx, list(rows))
+        elif export_format == 'csv':
+            body = stream_with_context(generate_export_csv(rows))
+        else:
+            body = stream_with_context(
+                json.dumps(row, ensure_ascii=False, default=str) + '\n' for row in rows
+            )
+
+        response = current_app.response_class(body, mimetype=EXPORT_MIMETYPES[export_format])
+        response.headers['X-Export-Watermark'] = str(watermark)
+        if index_rows:
+            response.headers['X-Export-Watermark-Time'] = index_rows[-1]['submitted_at']
+        response.headers['Content-Disposition'] = (
+            f"attachment; filename=submissions_{since}_{watermark}.{export_format}"
+        )
+        return response
+    except Exception as e:
+        print(f"增量导出出错: {str(e)}")
+        return jsonify({'success': False, 'message': f'导出失败: {str(e)}'})
+
+
+# 逐行生成CSV（带BOM，Excel打开中文不乱码）
+def generate_export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_META_COLUMNS + EXPORT_FIELD_COLUMNS)
+    buffer.write('\ufeff')
+    writer.writeheader()
+    for row in rows:
+        row = dict(row, awards=json.dumps(row['awards'] or [], ensure_ascii=False))
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+# 以只写模式生成xlsx表格（每条提交一行），返回字节内容
+def build_export_xlsx(rows):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('submissions')
+    ws.append(EXPORT_META_COLUMNS + EXPORT_FIELD_COLUMNS)
+    for row in rows:
+        row = dict(row, awards=json.dumps(row['awards'] or [], ensure_ascii=False))
+        ws.append([row[column] for column in EXPORT_META_COLUMNS + EXPORT_FIELD_COLUMNS])
+    temp_file = io.BytesIO()
+    wb.save(temp_file)
+    return temp_file.getvalue()
+
+
+# 选出报表包含的记录：每个房间最新一次提交，按房间号排序，可按项目类型过滤
+def select_report_records(db, workbooks, definition):
+    index_rows = db.execute(
+        'SELECT room_number, sheet_name, MAX(seq) AS seq FROM submissions GROUP BY room_number'
+    ).fetchall()
+    index_rows = sorted(index_rows, key=lambda row: room_sort_key(row['room_number']))
+    records = [{'room': row['room_number'], 'sheet_name': row['sheet_name']} for row in index_rows]
+
+    project_type = definition.get('project_type')
+    if project_type:
+        labels = {project_type, {'1': '在孵企业', '2': '创业团队'}.get(project_type)}
+        selected = []
+        for record in records:
+            excel_path = workbooks.local_path(workbook_key(record['room']))
+            if not os.path.exists(excel_path):
+                continue
+            form_data = run_heavy(read_submissions, excel_path, [record['sheet_name']])[0]
+            if form_data and form_data.get('projectType') in labels:
+                selected.append(record)
+        records = selected
+    return records
+
+
+# 读取报表当前已发布版本的信息，没有时返回None
+def get_report_status(name):
+    current_path = os.path.join(current_app.config['REPORT_FOLDER'], name, 'current.json')
+    try:
+        with open(current_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# 原子写入：先写临时文件，再替换目标文件
+def write_file_atomic(path, data):
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+# 生成并发布一个报表版本；数据没有变化时跳过（force为True时强制生成）
+# 同一报表同时只允许一个进程生成，其他进程直接跳过；返回新版本信息或None
+def build_report(name, force=False):
+    definition = current_app.config['REPORT_DEFINITIONS'][name]
+    report_dir = os.path.join(current_app.config['REPORT_FOLDER'], name)
+    os.makedirs(report_dir, exist_ok=True)
+
+    lock_fd = os.open(os.path.join(report_dir, '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+
+        db = get_db()
+        watermark = db.execute('SELECT COALESCE(MAX(seq), 0) FROM submissions').fetchone()[0]
+        current = get_report_status(name)
+        if not force and current and current['watermark'] == watermark:
+            return None
+
+        started = time.monotonic()
+        workbooks = get_storage('workbooks')
+        records = select_report_records(db, workbooks, definition)
+        temp_file = run_heavy(build_batch_workbook, workbooks, records)
+        data = temp_file.getvalue()
+
+        # 版本号：生成时间 + 数据水位，文件名按时间排序
+        version = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{watermark}"
+        filename = f"{version}.xlsx"
+        write_file_atomic(os.path.join(report_dir, filename), data)
+
+        status = {
+            'name': name,
+            'title': definition.get('title', name),
+            'version': version,
+            'file': filename,
+            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'watermark': watermark,
+            'records': len(records),
+            'size': len(data),
+            'build_seconds': round(time.monotonic() - started, 2)
+        }
+        # 替换 current.json 即完成发布，读取方看到的总是完整的版本
+        write_file_atomic(os.path.join(report_dir, 'current.json'),
+                          json.dumps(status, ensure_ascii=False).encode('utf-8'))
+
+        # 清理过期版本
+        versions = sorted(f for f in os.listdir(report_dir) if f.endswith('.xlsx'))
+        for old in versions[:-current_app.config['REPORT_KEEP_VERSIONS']]:
+            try:
+                os.remove(os.path.join(report_dir, old))
+            except OSError:
+                pass
+        return status
+    finally:
+        os.close(lock_fd)
+
+
+# 依次生成所有（或指定的）报表，单个报表失败不影响其他报表
+def build_reports(names=None, force=False):
+    results = {}
+    for name in names or current_app.config['REPORT_DEFINITIONS']:
+        try:
+            results[name] = build_report(name, force)
+        except Exception as e:
+            print(f"生成报表 {name} 出错: {str(e)}")
+            results[name] = {'error': str(e)}
+    return results
+
+
+# 进程内定时生成报表的后台线程（每个 worker 进程每个应用一个，靠文件锁与数据水位避免重复生成）
+_report_schedulers = set()
+
+
+def start_report_scheduler(flask_app):
+    interval = flask_app.config['REPORT_SCHEDULE_INTERVAL']
+    key = (os.getpid(), id(flask_app))
+    if interval <= 0 or key in _report_schedulers:
+        return
+    _report_schedulers.add(key)
+
+    def loop():
+        while True:
+            with flask_app.app_context():
+                build_reports()
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name='report-scheduler', daemon=True).start()
+
+
+# 报表列表及新鲜度（stale 表示生成后又有新的提交）
+@admin_bp.route('/admin/reports')
+def list_reports():
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    watermark = get_db().execute('SELECT COALESCE(MAX(seq), 0) FROM submissions').fetchone()[0]
+    reports = []
+    for name, definition in current_app.config['REPORT_DEFINITIONS'].items():
+        status = get_report_status(name)
+        reports.append({
+            'name': name,
+            'title': definition.get('title', name),
+            'ready': status is not None,
+            'version': status['version'] if status else None,
+            'generated_at': status['generated_at'] if status else None,
+            'records': status['records'] if status else 0,
+            'size': status['size'] if status else 0,
+            'stale': status is None or status['watermark'] < watermark
+        })
+    return jsonify({'success': True, 'reports': reports})
+
+
+# 下载报表的最新已发布版本
+@admin_bp.route('/admin/reports/<name>/download')
+def download_report(name):
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    if name not in current_app.config['REPORT_DEFINITIONS']:
+        return jsonify({'success': False, 'message': '报表不存在'})
+
+    status = get_report_status(name)
+    if not status:
+        return jsonify({'success': False, 'message': '报表尚未生成'})
+
+    return send_file(
+        os.path.join(current_app.config['REPORT_FOLDER'], name, status['file']),
+        as_attachment=True,
+        download_name=f"{name}_{status['version']}.xlsx",
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        conditional=True
+    )
+
+
+# 手动触发生成报表（后台执行，立即返回）
+@admin_bp.route('/admin/reports/<name>/build', methods=['POST'])
+def trigger_report_build(name):
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    if name not in current_app.config['REPORT_DEFINITIONS']:
+        return jsonify({'success': False, 'message': '报表不存在'})
+
+    flask_app = current_app._get_current_object()
+
+    def run():
+        with flask_app.app_context():
+            build_reports([name], force=True)
+
+    threading.Thread(target=run, name=f"report-{name}", daemon=True).start()
+    return jsonify({'success': True, 'message': '报表已开始生成'})
+
+
+# 分析快照的进程内缓存（快照文件路径 -> 快照）
+_analytics_snapshots = {}
+
+
+# 获取分析快照：先读进程内缓存或磁盘上的快照，再只解析其后新增的提交并合并
+def get_analytics_snapshot(period):
+    import analytics
+
+    folder = current_app.config['ANALYTICS_FOLDER']
+    path = os.path.join(folder, f"snapshot-{period}.npz")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    # 内存中的快照与文件一致时直接使用；文件被其他进程更新或删除（如恢复数据后）时重新加载
+    cached = _analytics_snapshots.get(path)
+    if cached is not None and cached[0] == mtime:
+        snapshot = cached[1]
+    else:
+        try:
+            snapshot = analytics.Snapshot.load(path)
+        except (OSError, ValueError):
+            snapshot = analytics.Snapshot.empty(period)
+
+    index_rows = get_db().execute(
+        'SELECT * FROM submissions WHERE seq > ? ORDER BY seq', (snapshot.watermark,)
+    ).fetchall()
+    if index_rows:
+        rows = iter_export_rows(get_storage('workbooks'), index_rows)
+        snapshot = snapshot.merge(rows, watermark=index_rows[-1]['seq'])
+        os.makedirs(folder, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        snapshot.save(temp_path)
+        os.replace(temp_path, path)
+        mtime = os.path.getmtime(path)
+
+    _analytics_snapshots[path] = (mtime, snapshot)
+    return snapshot
+
+
+# 管理员数据分析：某个数值字段的各房间同比增长、各期合计/分位数与异常值
+# 参数：field（如 totalRevenue）、period=year|quarter、format=json|csv
+@admin_bp.route('/admin/analytics')
+@admission.limit('export')
+def admin_analytics():
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    import analytics
+
+    field = request.args.get('field', 'totalRevenue')
+    period = request.args.get('period', 'year')
+    export_format = request.args.get('format', 'json')
+    if field not in analytics.NUMERIC_FIELDS or period not in analytics.PERIODS:
+        return jsonify({'success': False, 'message': '参数错误'})
+
+    try:
+        result = analytics.analyze(get_analytics_snapshot(period), field)
+        if export_format != 'csv':
+            return jsonify({'success': True, **result})
+
+        buffer = io.StringIO()
+        buffer.write('\ufeff')
+        columns = ['room', 'period', 'seq', 'value', 'previous', 'growth', 'outlier']
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(result['rows'])
+        response = current_app.response_class(buffer.getvalue(), mimetype='text/csv; charset=utf-8')
+        response.headers['Content-Disposition'] = f"attachment; filename=analytics_{field}_{period}.csv"
+        return response
+    except Exception as e:
+        print(f"数据分析出错: {str(e)}")
+        return jsonify({'success': False, 'message': f'分析失败: {str(e)}'})
+
+
+# 备份的数据区域
+def backup_storages():
+    return {'workbooks': get_storage('workbooks'), 'images': get_storage('images')}
+
+
+# 创建一个备份快照（数据库在线备份，工作簿与图片增量备份）
+def create_backup():
+    return backup.create_snapshot(current_app.config['BACKUP_FOLDER'], current_app.config['DATABASE'],
+                                  backup_storages(), keep=current_app.config['BACKUP_KEEP'],
+                                  step_sleep=current_app.config['BACKUP_STEP_SLEEP'])
+
+
+# 从快照恢复单个房间，恢复后清除依赖提交索引的派生数据（分析快照、报表）
+# 恢复期间持有与提交相同的房间写锁，本机的提交在恢复前后依次进行
+def restore_room_from_backup(room, at=None, name=None, dry_run=False):
+    root = current_app.config['BACKUP_FOLDER']
+    name = backup.find_snapshot(root, at=at, name=name)
+    if dry_run:
+        return backup.restore_room(root, name, room, current_app.config['DATABASE'], backup_storages(), True)
+    with room_write_lock(room):
+        plan = backup.restore_room(root, name, room, current_app.config['DATABASE'], backup_storages())
+    for period in ('year', 'quarter'):
+        path = os.path.join(current_app.config['ANALYTICS_FOLDER'], f"snapshot-{period}.npz")
+        if os.path.exists(path):
+            os.remove(path)
+    build_reports(force=True)
+    return plan
+
+
+# 备份列表
+@admin_bp.route('/admin/backups')
+def list_backups():
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    root = current_app.config['BACKUP_FOLDER']
+    snapshots = []
+    for name in reversed(backup.list_snapshots(root)):
+        manifest = backup.load_manifest(root, name)
+        snapshots.append({'name': name, 'created_at': manifest['created_at'], **manifest['summary']})
+    return jsonify({'success': True, 'backups': snapshots})
+
+
+# 立即备份（服务不停止）
+@admin_bp.route('/admin/backups', methods=['POST'])
+@admission.limit('export')
+def create_backup_now():
+    if 'admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    try:
+        return jsonify({'success': True, 'backup': create_backup()})
+    except backup.BackupError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    except Exception as e:
+        print(f"备份出错: {str(e)}")
+        return jsonify({'success': False, 'message': f'备份失败: {str(e)}'})
+
+
+# 整理一个房间工作簿中的图片，结果写入临时文件，不替换原工作簿（在后台进程中运行）
+# 返回统计，包括整理前后的大小与 openpyxl 完整加载耗时
+def compact_room_workbook(workbooks, key, quality=workbook_media.JPEG_QUALITY, measure=True):
+    from openpyxl import load_workbook
+
+    def load_seconds(path):
+        if not measure:
+            return None
+        started = time.perf_counter()
+        load_workbook(path).close()
+        return round(time.perf_counter() - started, 3)
+
+    version = workbooks.version(key)
+    if version is None:
+        return {'status': 'missing'}
+    path = workbooks.local_path(key)
+    fd, temp_path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        stats = workbook_media.compact_workbook(path, temp_path, quality)
+        return {
+            **stats,
+            'status': 'ok',
+            'version': version,
+            'temp_path': temp_path,
+            'bytes_before': os.path.getsize(path),
+            'bytes_after': os.path.getsize(temp_path),
+            'load_before': load_seconds(path),
+            'load_after': load_seconds(temp_path),
+        }
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+# 并行整理各房间工作簿中的图片（rooms 为空时整理全部房间），整理后更小的工作簿原子替换原文件；
+# 服务无需停止：替换时持有房间写锁并核对版本，整理期间有新提交的房间跳过，下次再整理
+# 返回 {房间: 统计}，status 为 compacted、unchanged、modified（期间有新提交）、dry_run 或 error
+def compact_workbooks(rooms=None, workers=None, dry_run=False, quality=workbook_media.JPEG_QUALITY, measure=True):
+    workbooks = get_storage('workbooks')
+    if not rooms:
+        rooms = [key[:-len('.xlsx')] for key in workbooks.list() if key.endswith('.xlsx') and '/' not in key]
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {executor.submit(compact_room_workbook, workbooks, workbook_key(room), quality, measure): room
+                   for room in rooms}
+        for future in as_completed(futures):
+            room = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                results[room] = {'status': 'error', 'message': str(e)}
+                continue
+            temp_path = result.pop('temp_path', None)
+            if result['status'] == 'ok':
+                result['saved'] = result['bytes_before'] - result['bytes_after']
+                if dry_run:
+                    result['status'] = 'dry_run'
+                elif result['saved'] <= 0:
+                    result['status'] = 'unchanged'
+                else:
+                    try:
+                        with room_write_lock(room):
+                            workbooks.put_file(workbook_key(room), temp_path, if_version=result['version'])
+                        result['status'] = 'compacted'
+                    except storage.StorageConflict:
+                        result['status'] = 'modified'
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            result.pop('version', None)
+            results[room] = result
+    return results
+
+
+# 应用工厂：创建应用时只读取配置，不创建目录、不连接数据库
+def create_app(config=None):
+    flask_app = Flask(__name__)
+    flask_app.config.update(default_config())
+    if config:
+        flask_app.config.update(config)
+
+    flask_app.teardown_appcontext(close_connection)
+    flask_app.register_blueprint(main_bp)
+    flask_app.register_blueprint(admin_bp)
+    flask_app.before_request(lambda: start_report_scheduler(flask_app))
+
+    @flask_app.cli.command('init-db')
+    def init_db_command():
+        init_db(flask_app)
+        print('数据库初始化完成')
+
+    @flask_app.cli.command('index-submissions')
+    def index_submissions_command():
+        count = index_existing_submissions(get_db(), get_storage('workbooks'))
+        print(f"已补录 {count} 条提交记录")
+
+    @flask_app.cli.command('build-reports')
+    @click.argument('names', nargs=-1)
+    @click.option('--force', is_flag=True, help='数据没有变化时也重新生成')
+    def build_reports_command(names, force):
+        for name, status in build_reports(names or None, force).items():
+            if status is None:
+                print(f"{name}: 已是最新，跳过")
+            elif 'error' in status:
+                print(f"{name}: 生成失败 {status['error']}")
+            else:
+                print(f"{name}: 已发布 {status['version']}（{status['records']} 条记录，{status['build_seconds']} 秒）")
+
+    @flask_app.cli.command('backup')
+    def backup_command():
+        summary = create_backup()
+        print(f"快照 {summary['name']}：{summary['files']} 个文件，重新读取 {summary['changed']} 个，"
+              f"新增 {summary['new_objects']} 个对象（{summary['new_bytes']} 字节），耗时 {summary['seconds']} 秒")
+
+    @flask_app.cli.command('list-backups')
+    def list_backups_command():
+        root = flask_app.config['BACKUP_FOLDER']
+        for name in backup.list_snapshots(root):
+            manifest = backup.load_manifest(root, name)
+            print(f"{name}\t{manifest['created_at']}\t{manifest['summary']['files']} 个文件")
+
+    @flask_app.cli.command('restore-room')
+    @click.argument('room')
+    @click.option('--at', 'at', type=click.DateTime(['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d']),
+                  help='恢复到该时间点之前最近的快照')
+    @click.option('--snapshot', 'name', help='指定快照名称（见 list-backups）')
+    @click.option('--dry-run', is_flag=True, help='只显示将要恢复的内容')
+    def restore_room_command(room, at, name, dry_run):
+        plan = restore_room_from_backup(room, at=at, name=name, dry_run=dry_run)
+        print(json.dumps(plan, ensure_ascii=False, indent=2))
+        if not dry_run:
+            print(f"房间 {room} 已恢复到快照 {plan['snapshot']}")
+
+    @flask_app.cli.command('compact-workbooks')
+    @click.argument('rooms', nargs=-1)
+    @click.option('--workers', type=int, help='并行进程数，默认为CPU核数')
+    @click.option('--quality', type=click.IntRange(1, 95), default=workbook_media.JPEG_QUALITY, show_default=True,
+                  help='照片重新编码的JPEG质量')
+    @click.option('--no-measure', is_flag=True, help='不测量整理前后的加载耗时')
+    @click.option('--dry-run', is_flag=True, help='只统计可节省的空间，不替换工作簿')
+    def compact_workbooks_command(rooms, workers, quality, no_measure, dry_run):
+        results = compact_workbooks(rooms, workers, dry_run, quality, measure=not no_measure)
+        total_before = total_after = 0
+        for room, result in sorted(results.items()):
+            if result['status'] in ('error', 'missing'):
+                print(f"{room}: {result['status']} {result.get('message', '')}")
+                continue
+            total_before += result['bytes_before']
+            total_after += result['bytes_after'] if result['status'] in ('compacted', 'dry_run') \
+                else result['bytes_before']
+            load = '' if result['load_before'] is None else \
+                f"，加载 {result['load_before']} -> {result['load_after']} 秒"
+            print(f"{room}: {result['status']} {result['bytes_before']} -> {result['bytes_after']} 字节"
+                  f"（图片 {result['images']} 个，重新编码 {result['reencoded']} 个，"
+                  f"合并重复 {result['duplicates']} 个{load}）")
+        print(f"合计 {total_before} -> {total_after} 字节，节省 {total_before - total_after} 字节")
+
+    return flask_app
+
+
+# 超级管理员蓝图（多基地部署时挂在根应用上，跨基地查看）
+super_bp = Blueprint('super', __name__)
+
+
+@super_bp.route('/super/login', methods=['POST'])
+@admission.limit('auth')
+def super_login():
+    data = request.get_json() or {}
+    expected = current_app.config['SUPER_ADMIN_PASSWORD_HASH']
+    if not expected:
+        return jsonify({'success': False, 'message': '未启用超级管理员'})
+
+    if data.get('username') == current_app.config['SUPER_ADMIN_USERNAME'] and \
+            hmac.compare_digest(hash_password(data.get('password') or ''), expected):
+        session['super_admin_logged_in'] = True
+        return jsonify({'success': True, 'message': '登录成功'})
+    return jsonify({'success': False, 'message': '用户名或密码错误'})
+
+
+@super_bp.route('/super/logout')
+def super_logout():
+    session.pop('super_admin_logged_in', None)
+    return jsonify({'success': True, 'message': '已退出登录'})
+
+
+# 在各基地上并行执行 func(基地名称)，每个基地在自己的应用上下文中运行（get_db 等即为该基地的数据）
+def fan_out_tenants(func):
+    dispatcher = current_app.extensions['tenant_dispatcher']
+
+    def run(tenant):
+        with dispatcher.get_app(tenant).app_context():
+            return func(tenant)
+
+    return tenants.fan_out(current_app.config['TENANTS'], run, current_app.config['TENANT_FANOUT_WORKERS'])
+
+
+# 单个基地的统计：用户数、停用数、提交数、有提交的房间数、最近提交时间
+def tenant_statistics(tenant):
+    db = get_db()
+    users = db.execute('SELECT COUNT(*) AS total, COALESCE(SUM(disabled), 0) AS disabled FROM users').fetchone()
+    submissions = db.execute(
+        'SELECT COUNT(*) AS total, COUNT(DISTINCT room_number) AS rooms, MAX(submitted_at) AS latest '
+        'FROM submissions'
+    ).fetchone()
+    return {
+        'users': users['total'],
+        'disabled_users': users['disabled'],
+        'submissions': submissions['total'],
+        'rooms_submitted': submissions['rooms'],
+        'latest_submission': submissions['latest']
+    }
+
+
+# 各基地概况与合计
+@super_bp.route('/super/tenants')
+def super_tenants():
+    if 'super_admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    statistics = fan_out_tenants(tenant_statistics)
+    rows = [{'tenant': name, 'title': title, **statistics[name]}
+            for name, title in current_app.config['TENANTS'].items()]
+    totals = {
+        field: sum(row.get(field, 0) for row in rows)
+        for field in ('users', 'disabled_users', 'submissions', 'rooms_submitted')
+    }
+    return jsonify({'success': True, 'tenants': rows, 'totals': totals})
+
+
+# 跨基地的最近提交，按提交时间倒序；可用 since_time 只看某个时间之后的提交
+@super_bp.route('/super/submissions')
+def super_submissions():
+    if 'super_admin_logged_in' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    since_time = request.args.get('since_time', '')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+    except ValueError:
+        return jsonify({'success': False, 'message': '参数错误'})
+
+    def recent(tenant):
+        rows = get_db().execute(
+            'SELECT * FROM submissions WHERE submitted_at > ? ORDER BY submitted_at DESC, seq DESC LIMIT ?',
+            (since_time, limit)
+        ).fetchall()
+        return [{'tenant': tenant, 'room': row['room_number'], **submission_summary(row)} for row in rows]
+
+    results = fan_out_tenants(recent)
+    errors = {tenant: result['error'] for tenant, result in results.items() if isinstance(result, dict)}
+    merged = heapq.merge(*(result for result in results.values() if isinstance(result, list)),
+                         key=lambda row: row['submitted_at'], reverse=True)
+    return jsonify({'success': True, 'submissions': list(islice(merged, limit)), 'errors': errors})
+
+
+# 多基地部署的根应用：按子域名把请求分发到各基地的应用（首次访问时创建），
+# 自身只提供超级管理员接口
+def create_multi_tenant_app(config=None):
+    base_config = default_config()
+    if config:
+        base_config.update(config)
+    if base_config['TENANT_MODE'] == 'path':
+        raise ValueError("不支持 TENANT_MODE=path：页面使用绝对路径发送请求，路径前缀下无法到达所属基地，请使用 subdomain")
+    if base_config['TENANT_MODE'] != 'subdomain':
+        raise ValueError(f"不支持的 TENANT_MODE: {base_config['TENANT_MODE']}")
+
+    root_app = Flask(__name__)
+    root_app.config.update(base_config)
+    root_app.register_blueprint(super_bp)
+
+    dispatcher = tenants.TenantDispatcher(
+        root_app.wsgi_app, base_config['TENANTS'],
+        lambda tenant: create_app(tenants.tenant_config(base_config, tenant)),
+        base_config['TENANT_DOMAIN']
+    )
+    root_app.extensions['tenant_dispatcher'] = dispatcher
+    root_app.wsgi_app = dispatcher
+
+    @root_app.cli.command('tenants')
+    def tenants_command():
+        for name, title in base_config['TENANTS'].items():
+            print(f"{name}\t{title}\t{os.path.join(base_config['TENANT_ROOT'], name)}")
+
+    return root_app
+
+
+# 按部署方式创建应用：
+#   单基地（默认）                create_app()
+#   多基地（设置 TENANT_MODE）    create_multi_tenant_app()
+#   维护某个基地（设置 TENANT）   该基地的应用，如 TENANT=base1 flask --app app build-reports
+def create_wsgi_app():
+    config = default_config()
+    if os.environ.get('TENANT'):
+        return create_app(tenants.tenant_config(config, os.environ['TENANT']))
+    if config['TENANT_MODE']:
+        return create_multi_tenant_app()
+    return create_app()
+
+
+# 供 gunicorn "app:app" 与 flask run 使用
+app = create_wsgi_app()
 
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
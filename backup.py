@@ -0,0 +1,328 @@
+"""在线增量备份与按房间恢复
+
+备份目录结构：
+    objects/<sha256前2位>/<sha256>    按内容寻址的文件（只读），相同内容只保存一份
+    snapshots/<时间>/manifest.json     快照清单：每个文件的存储版本、sha256 与大小
+    snapshots/<时间>/users.db          数据库快照
+    snapshots/<时间>/workbooks/...     房间工作簿
+    snapshots/<时间>/images/...        提交图片
+快照目录中的文件均为 objects 中对象的硬链接，每个快照都是一份完整可浏览的副本，但不额外占用空间。
+
+数据库通过 SQLite 在线备份接口分步复制，期间服务照常读写；
+工作簿与图片与上一个快照比较存储版本（本地为修改时间与大小），未变化的文件直接复用，不再读取。
+"""
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+
+import storage
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境下不做跨进程加锁
+    fcntl = None
+
+# 快照名称（即创建时间）的格式
+SNAPSHOT_FORMAT = '%Y%m%dT%H%M%S'
+
+# 数据库在线备份每一步复制的页数，步与步之间其他连接可以继续写入
+BACKUP_PAGES_PER_STEP = 256
+# 每一步之间的等待（秒）；sqlite3 默认 0.25 秒，大数据库的备份会因此持续数分钟
+BACKUP_STEP_SLEEP = 0
+
+
+class BackupError(Exception):
+    pass
+
+
+def object_path(root, digest):
+    return os.path.join(root, 'objects', digest[:2], digest)
+
+
+# 把数据流存为内容寻址的对象，返回 (sha256, 大小, 是否为新对象)
+def store_object(root, stream):
+    objects_dir = os.path.join(root, 'objects')
+    os.makedirs(objects_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=objects_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        path = object_path(root, digest.hexdigest())
+        if os.path.exists(path):
+            os.remove(temp_path)
+            return digest.hexdigest(), size, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.chmod(temp_path, 0o444)  # 对象被多个快照硬链接，禁止原地修改
+        os.replace(temp_path, path)
+        return digest.hexdigest(), size, True
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+# 在快照目录中链接对象（文件系统不支持硬链接时退化为复制）
+def _link(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+# 通过在线备份接口得到一致的数据库快照，存为对象
+def backup_database(root, database, step_sleep=BACKUP_STEP_SLEEP):
+    os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.join(root, 'objects'), suffix='.db.tmp')
+    os.close(fd)
+    try:
+        source = sqlite3.connect(database)
+        target = sqlite3.connect(temp_path)
+        try:
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=step_sleep)
+            # 快照是独立的文件，不依赖 -wal 文件
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            target.close()
+            source.close()
+        with open(temp_path, 'rb') as f:
+            return store_object(root, f)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def list_snapshots(root):
+    directory = os.path.join(root, 'snapshots')
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory)
+                  if not name.startswith('.') and os.path.exists(os.path.join(directory, name, 'manifest.json')))
+
+
+def snapshot_dir(root, name):
+    return os.path.join(root, 'snapshots', name)
+
+
+def load_manifest(root, name):
+    with open(os.path.join(snapshot_dir(root, name), 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+# 同一备份目录同时只允许一个备份或清理任务
+@contextlib.contextmanager
+def _backup_lock(root):
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(root, exist_ok=True)
+    fd = os.open(os.path.join(root, '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise BackupError('已有备份正在进行')
+        yield
+    finally:
+        os.close(fd)
+
+
+# 创建一个快照：storages 为 {区域: 存储后端}（如 workbooks、images），keep 为保留的快照数，
+# step_sleep 为数据库备份每一步之间的等待（秒）
+# 返回快照概要（名称、文件数、新读取的文件数、新增对象数与字节数、耗时）
+def create_snapshot(root, database, storages, keep=None, now=None, step_sleep=BACKUP_STEP_SLEEP):
+    started = datetime.now()
+    now = now or started
+    with _backup_lock(root):
+        name = now.strftime(SNAPSHOT_FORMAT)
+        if os.path.exists(snapshot_dir(root, name)):
+            raise BackupError(f"快照 {name} 已存在")
+        snapshots = list_snapshots(root)
+        previous = load_manifest(root, snapshots[-1])['files'] if snapshots else {}
+
+        staging = os.path.join(root, 'snapshots', f".{name}.tmp")
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        os.makedirs(staging)
+
+        summary = {'name': name, 'files': 0, 'changed': 0, 'new_objects': 0, 'new_bytes': 0}
+        files = {}
+        try:
+            for area, backend in storages.items():
+                for key in backend.list():
+                    version = backend.version(key)
+                    if version is None:
+                        continue  # 列出后已被删除
+                    entry = f"{area}/{key}"
+                    known = previous.get(entry)
+                    if known and known['version'] == version and os.path.exists(object_path(root, known['sha256'])):
+                        digest, size = known['sha256'], known['size']
+                    else:
+                        with contextlib.closing(backend.open_read(key)) as stream:
+                            digest, size, new = store_object(root, stream)
+                        summary['changed'] += 1
+                        if new:
+                            summary['new_objects'] += 1
+                            summary['new_bytes'] += size
+                    files[entry] = {'version': version, 'sha256': digest, 'size': size}
+                    _link(object_path(root, digest), os.path.join(staging, *entry.split('/')))
+
+            digest, size, new = backup_database(root, database, step_sleep)
+            if new:
+                summary['new_objects'] += 1
+                summary['new_bytes'] += size
+            _link(object_path(root, digest), os.path.join(staging, 'users.db'))
+
+            summary['files'] = len(files)
+            manifest = {
+                'created_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+                'database': {'sha256': digest, 'size': size},
+                'files': files,
+                'summary': summary
+            }
+            with open(os.path.join(staging, 'manifest.json'), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=1)
+            # 整个目录改名发布，不会出现不完整的快照
+            os.rename(staging, snapshot_dir(root, name))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if keep:
+            _prune(root, keep)
+    summary['seconds'] = round((datetime.now() - started).total_seconds(), 3)
+    return summary
+
+
+# 只保留最近 keep 个快照，并删除不再被任何快照引用的对象
+def _prune(root, keep):
+    snapshots = list_snapshots(root)
+    for name in snapshots[:-keep]:
+        shutil.rmtree(snapshot_dir(root, name))
+
+    referenced = set()
+    for name in list_snapshots(root):
+        manifest = load_manifest(root, name)
+        referenced.add(manifest['database']['sha256'])
+        referenced.update(entry['sha256'] for entry in manifest['files'].values())
+
+    objects_dir = os.path.join(root, 'objects')
+    for current, dirs, filenames in os.walk(objects_dir):
+        for filename in filenames:
+            if filename not in referenced and not filename.endswith('.tmp'):
+                os.remove(os.path.join(current, filename))
+
+
+# 选择快照：指定名称，或不晚于 at（datetime）的最近一个快照，都不指定时为最新快照
+def find_snapshot(root, at=None, name=None):
+    snapshots = list_snapshots(root)
+    if name:
+        if name not in snapshots:
+            raise BackupError(f"快照不存在: {name}")
+        return name
+    if at is not None:
+        snapshots = [snapshot for snapshot in snapshots
+                     if datetime.strptime(snapshot, SNAPSHOT_FORMAT) <= at]
+    if not snapshots:
+        raise BackupError('没有符合条件的快照')
+    return snapshots[-1]
+
+
+# 从快照恢复单个房间：工作簿、该房间各次提交的图片与提交索引（以及已被删除的账号）
+# 快照之后该房间的新提交会从索引中移除，其图片一并删除；dry_run 时只返回恢复计划
+# 调用方需持有该房间的写锁；工作簿以读取计划时的版本做条件写入，期间被其他服务器改写时抛出 BackupError
+def restore_room(root, name, room, database, storages, dry_run=False):
+    manifest = load_manifest(root, name)
+    snapshot_db = sqlite3.connect(f"file:{os.path.join(snapshot_dir(root, name), 'users.db')}?immutable=1",
+                                  uri=True)
+    snapshot_db.row_factory = sqlite3.Row
+    try:
+        rows = snapshot_db.execute('SELECT * FROM submissions WHERE room_number = ? ORDER BY seq',
+                                   (room,)).fetchall()
+        user = snapshot_db.execute('SELECT * FROM users WHERE room_number = ?', (room,)).fetchone()
+    finally:
+        snapshot_db.close()
+
+    workbooks, images = storages['workbooks'], storages['images']
+    workbook_key = f"{room}.xlsx"
+    workbook_version = workbooks.version(workbook_key)
+    workbook_entry = f"workbooks/{workbook_key}"
+    image_entries = [entry for entry in manifest['files']
+                     if any(entry.startswith(f"images/{row['submission_id']}/") for row in rows)]
+
+    live = sqlite3.connect(database)
+    live.row_factory = sqlite3.Row
+    try:
+        current_ids = {row['submission_id'] for row in live.execute(
+            'SELECT submission_id FROM submissions WHERE room_number = ?', (room,))}
+        snapshot_ids = {row['submission_id'] for row in rows}
+        removed_images = [key for submission_id in sorted(current_ids - snapshot_ids)
+                          for key in images.list(f"{submission_id}/")]
+        plan = {
+            'snapshot': name,
+            'room': room,
+            'workbook': workbook_entry in manifest['files'],
+            'submissions': len(rows),
+            'images': len(image_entries),
+            'removed_submissions': sorted(current_ids - snapshot_ids),
+            'restored_submissions': sorted(snapshot_ids - current_ids),
+            'removed_images': len(removed_images),
+            'restore_user': user is not None and live.execute(
+                'SELECT 1 FROM users WHERE room_number = ?', (room,)).fetchone() is None
+        }
+        if dry_run:
+            return plan
+
+        # 先恢复文件（工作簿最后写入），再替换索引
+        for entry in image_entries + ([workbook_entry] if plan['workbook'] else []):
+            area, _, key = entry.partition('/')
+            fd, temp_path = tempfile.mkstemp(suffix='.restore')
+            os.close(fd)
+            shutil.copyfile(object_path(root, manifest['files'][entry]['sha256']), temp_path)
+            try:
+                storages[area].put_file(key, temp_path,
+                                        if_version=workbook_version if entry == workbook_entry else storage.ANY_VERSION)
+            except storage.StorageConflict:
+                raise BackupError(f"恢复期间房间 {room} 有新的提交，请重新恢复")
+        if not plan['workbook']:
+            # 快照时该房间还没有提交
+            if workbooks.version(workbook_key) != workbook_version:
+                raise BackupError(f"恢复期间房间 {room} 有新的提交，请重新恢复")
+            workbooks.delete(workbook_key)
+
+        live_columns = {row[1] for row in live.execute('PRAGMA table_info(submissions)')}
+        with live:
+            live.execute('DELETE FROM submissions WHERE room_number = ?', (room,))
+            if rows:
+                columns = [column for column in rows[0].keys() if column in live_columns]
+                live.executemany(
+                    f"INSERT INTO submissions ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    [tuple(row[column] for column in columns) for row in rows]
+                )
+            if plan['restore_user']:
+                user_columns = {row[1] for row in live.execute('PRAGMA table_info(users)')}
+                columns = [column for column in user.keys() if column in user_columns and column != 'id']
+                live.execute(
+                    f"INSERT INTO users ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    tuple(user[column] for column in columns)
+                )
+
+        # 被移除的提交不再有索引，其图片也不会再被访问
+        for key in removed_images:
+            images.delete(key)
+        return plan
+    finally:
+        live.close()
@@ -0,0 +1,127 @@
+"""构建前端静态资源
+
+用法（在仓库根目录执行，模板需先解压到 templates，见 README）：
+    npm install
+    python build_assets.py
+
+生成内容（均位于 static/dist）：
+    app.<hash>.css            Tailwind 预编译、按模板裁剪并压缩后的样式
+    font-awesome.<hash>.css   Font Awesome 样式（字体地址已改写为本地指纹文件）
+    fonts/*.<hash>.*          Font Awesome 字体文件
+    manifest.json             逻辑文件名 -> 指纹文件名 的映射，供 asset_url() 使用
+每个文本文件同时生成 .gz（以及安装了 brotli 时的 .br）预压缩版本。
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_CSS = os.path.join(BASE_DIR, 'assets', 'app.css')
+TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
+DIST_DIR = os.path.join(BASE_DIR, 'static', 'dist')
+NODE_MODULES = os.path.join(BASE_DIR, 'node_modules')
+FONT_AWESOME_DIR = os.path.join(NODE_MODULES, 'font-awesome')
+
+# 需要生成预压缩版本的文件类型（字体本身已压缩，不再处理）
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.ttf', '.eot')
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# 计算内容指纹
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+# 写入指纹文件及其预压缩版本，返回相对于 DIST_DIR 的文件名
+def write_asset(logical_name, data):
+    stem, ext = os.path.splitext(logical_name)
+    hashed_name = f"{stem}.{fingerprint(data)}{ext}"
+    path = os.path.join(DIST_DIR, hashed_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    if ext in COMPRESSIBLE_EXTENSIONS:
+        with open(path + '.gz', 'wb') as f:
+            # mtime=0 保证相同内容得到相同的压缩结果
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+    return hashed_name.replace(os.sep, '/')
+
+
+# 使用 Tailwind CLI 编译、裁剪并压缩样式
+def build_tailwind_css():
+    tailwind_bin = os.environ.get('TAILWIND_BIN') or os.path.join(NODE_MODULES, '.bin', 'tailwindcss')
+    if not os.path.exists(tailwind_bin) and not shutil.which(tailwind_bin):
+        sys.exit('未找到 tailwindcss，请先执行 npm install 或设置 TAILWIND_BIN')
+    # 没有模板时 Tailwind 会裁剪掉全部工具类，生成的样式不可用
+    if not os.path.isdir(TEMPLATE_DIR) or not any(name.endswith('.html') for name in os.listdir(TEMPLATE_DIR)):
+        sys.exit(f"未找到模板 {TEMPLATE_DIR}，请先执行 unzip -j D281__TGH.zip 'D281__TGH/templates/*' -d templates")
+
+    result = subprocess.run(
+        [tailwind_bin, '-c', os.path.join(BASE_DIR, 'tailwind.config.js'),
+         '-i', SOURCE_CSS, '--minify'],
+        cwd=BASE_DIR, check=True, capture_output=True
+    )
+    return result.stdout
+
+
+# 本地化 Font Awesome：复制字体并改写样式中的字体地址
+def build_font_awesome(manifest):
+    css_path = os.path.join(FONT_AWESOME_DIR, 'css', 'font-awesome.min.css')
+    if not os.path.exists(css_path):
+        sys.exit('未找到 font-awesome，请先执行 npm install')
+
+    fonts_dir = os.path.join(FONT_AWESOME_DIR, 'fonts')
+    font_names = {}
+    for filename in sorted(os.listdir(fonts_dir)):
+        with open(os.path.join(fonts_dir, filename), 'rb') as f:
+            hashed = write_asset(f"fonts/{filename}", f.read())
+        font_names[filename] = hashed
+        manifest[f"fonts/{filename}"] = hashed
+
+    with open(css_path, encoding='utf-8') as f:
+        css = f.read()
+
+    # ../fonts/fontawesome-webfont.woff2?v=4.7.0 -> fonts/fontawesome-webfont.<hash>.woff2
+    def replace_url(match):
+        filename = match.group(1)
+        if filename not in font_names:
+            return match.group(0)
+        return f"url('{font_names[filename]}{match.group(2) or ''}')"
+
+    css = re.sub(r"url\('\.\./fonts/([^'?#]+)(?:\?[^'#]*)?(#[^']*)?'\)", replace_url, css)
+    return css.encode('utf-8')
+
+
+def main():
+    if os.path.exists(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+
+    manifest = {}
+    manifest['app.css'] = write_asset('app.css', build_tailwind_css())
+    manifest['font-awesome.css'] = write_asset('font-awesome.css', build_font_awesome(manifest))
+
+    with open(os.path.join(DIST_DIR, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    for logical_name, hashed_name in sorted(manifest.items()):
+        print(f"{logical_name} -> {hashed_name}")
+
+
+if __name__ == '__main__':
+    main()
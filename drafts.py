@@ -0,0 +1,94 @@
+"""表单草稿的增量更新
+
+草稿是房间正在填写、尚未提交的表单内容，为一个 JSON 对象（建议与 /get_last_submission 返回的 data 结构相同，
+回填时可直接复用）。前端在字段变化时只发送改动，格式为 JSON Patch（RFC 6902）中的 add、remove、replace：
+    [{"op": "replace", "path": "/totalRevenue", "value": "1200"},
+     {"op": "add", "path": "/awards/-", "value": {"competition": "", "prize": ""}},
+     {"op": "remove", "path": "/awards/0"}]
+路径为 JSON Pointer（"~1" 表示 "/"，"~0" 表示 "~"）；add 到对象中已存在的键时覆盖原值。
+一组操作要么全部生效，要么（任一操作无效时）全部不生效。
+"""
+import copy
+
+SUPPORTED_OPS = ('add', 'remove', 'replace')
+
+
+class PatchError(Exception):
+    pass
+
+
+def parse_pointer(path):
+    if not isinstance(path, str) or (path and not path.startswith('/')):
+        raise PatchError(f"路径无效: {path!r}")
+    if not path:
+        return []
+    return [token.replace('~1', '/').replace('~0', '~') for token in path[1:].split('/')]
+
+
+def _list_index(container, token, path, allow_end=False):
+    if token == '-' and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith('0')):
+        raise PatchError(f"路径中的数组下标无效: {path}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchError(f"数组下标超出范围: {path}")
+    return index
+
+
+def _resolve_parent(document, tokens, path):
+    target = document
+    for token in tokens[:-1]:
+        if isinstance(target, dict):
+            if token not in target:
+                raise PatchError(f"路径不存在: {path}")
+            target = target[token]
+        elif isinstance(target, list):
+            target = target[_list_index(target, token, path)]
+        else:
+            raise PatchError(f"路径不存在: {path}")
+    return target
+
+
+# 对草稿应用一组操作，返回新的草稿（不修改传入的对象）
+def apply_patch(document, operations):
+    if not isinstance(operations, list):
+        raise PatchError('操作列表应为数组')
+    document = copy.deepcopy(document)
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get('op') not in SUPPORTED_OPS:
+            raise PatchError(f"不支持的操作: {operation!r}")
+        op = operation['op']
+        path = operation.get('path')
+        tokens = parse_pointer(path)
+        if op != 'remove' and 'value' not in operation:
+            raise PatchError(f"缺少 value: {path}")
+        value = operation.get('value')
+
+        if not tokens:
+            # 替换整个草稿
+            if op == 'remove' or not isinstance(value, dict):
+                raise PatchError('草稿必须是对象')
+            document = copy.deepcopy(value)
+            continue
+
+        parent = _resolve_parent(document, tokens, path)
+        token = tokens[-1]
+        if isinstance(parent, dict):
+            if op != 'add' and token not in parent:
+                raise PatchError(f"路径不存在: {path}")
+            if op == 'remove':
+                del parent[token]
+            else:
+                parent[token] = copy.deepcopy(value)
+        elif isinstance(parent, list):
+            index = _list_index(parent, token, path, allow_end=op == 'add')
+            if op == 'add':
+                parent.insert(index, copy.deepcopy(value))
+            elif op == 'remove':
+                del parent[index]
+            else:
+                parent[index] = copy.deepcopy(value)
+        else:
+            raise PatchError(f"路径不存在: {path}")
+    return document
@@ -0,0 +1,26 @@
+# gunicorn 配置，启动方式：gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+
+# gthread：每个进程有多个请求线程，导出/提交等耗时请求只占用一个线程，
+# 登录、获取当前用户等轻量请求由其余线程继续处理
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+timeout = 300
+
+# 在主进程中预先加载应用，worker fork 后以写时复制方式共享只读内存页
+preload_app = True
+
+# 预加载时一并导入 openpyxl/Pillow（应用本身按需懒加载），所有 worker 共享这部分内存；
+# 设置 PRELOAD_HEAVY_IMPORTS=0 可关闭
+if os.environ.get('PRELOAD_HEAVY_IMPORTS', '1') == '1':
+    import openpyxl  # noqa: F401
+    from PIL import Image  # noqa: F401
+
+# openpyxl/Pillow 的耗时操作交给每个 worker 内的有界进程池执行
+raw_env = [
+    f"HEAVY_EXECUTOR={os.environ.get('HEAVY_EXECUTOR', 'process')}",
+    f"HEAVY_WORKERS={os.environ.get('HEAVY_WORKERS', '2')}",
+]
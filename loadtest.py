@@ -0,0 +1,97 @@
+"""简单压测：并发执行批量导出的同时，测量轻量接口的响应时间
+
+用法：
+    python loadtest.py --url http://127.0.0.1:8000 --room 101 --password 123456 \\
+        --admin admin --admin-password 123 --exports 4
+"""
+import argparse
+import http.cookiejar
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+
+def make_opener():
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+
+def post_json(opener, url, data):
+    req = urllib.request.Request(url, data=json.dumps(data).encode(), headers={'Content-Type': 'application/json'})
+    with opener.open(req) as resp:
+        return resp.read()
+
+
+# 以管理员身份持续发起批量导出（导出该管理员可见的全部记录）
+# 结果计入 results：ok 为成功次数，其余按HTTP状态码（或 error）计数；被拒绝的请求稍等后继续
+def export_loop(base_url, admin, admin_password, stop, results, lock):
+    opener = make_opener()
+    post_json(opener, f"{base_url}/admin/login", {'username': admin, 'password': admin_password})
+    rooms = json.loads(opener.open(f"{base_url}/admin/get_all_rooms").read())['rooms']
+    records = [{'room': r['room_number'], 'sheet_name': rec['sheet_name']} for r in rooms for rec in r['records']]
+    while not stop.is_set():
+        try:
+            post_json(opener, f"{base_url}/admin/download_batch", {'records': records})
+            outcome = 'ok'
+        except urllib.error.HTTPError as e:
+            outcome = str(e.code)
+        except urllib.error.URLError:
+            outcome = 'error'
+        with lock:
+            results[outcome] += 1
+        if outcome != 'ok':
+            stop.wait(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--room', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--admin', default='admin')
+    parser.add_argument('--admin-password', default='123')
+    parser.add_argument('--exports', type=int, default=4, help='并发批量导出数')
+    parser.add_argument('--duration', type=float, default=20.0, help='测量时长（秒）')
+    args = parser.parse_args()
+
+    opener = make_opener()
+    post_json(opener, f"{args.url}/login", {'room': args.room, 'password': args.password})
+
+    stop = threading.Event()
+    results = Counter()
+    lock = threading.Lock()
+    threads = [threading.Thread(target=export_loop,
+                                args=(args.url, args.admin, args.admin_password, stop, results, lock), daemon=True)
+               for _ in range(args.exports)]
+    for t in threads:
+        t.start()
+    time.sleep(1)  # 等待导出请求进入服务端
+
+    latencies = []
+    with lock:
+        results.clear()  # 只统计测量期间的导出
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        opener.open(f"{args.url}/get_current_user").read()
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.05)
+    stop.set()
+    with lock:
+        results = dict(results)
+
+    latencies.sort()
+    print(f"/get_current_user 在 {args.exports} 个并发批量导出期间共请求 {len(latencies)} 次")
+    print(f"p50={statistics.median(latencies):.1f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1]:.1f}ms max={latencies[-1]:.1f}ms")
+    completed = results.pop('ok', 0)
+    rejected = sum(results.values())
+    print(f"批量导出：完成 {completed} 次（{completed / args.duration:.2f}/s），"
+          f"失败 {rejected} 次 {results or ''}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,387 @@
+"""工作簿与图片的存储后端
+
+所有后端提供相同的接口，键为相对路径（如 "101.xlsx"、"<提交ID>/original-0.jpg"）：
+    version(key)        当前版本标识，不存在时为 None（本地为修改时间与大小，对象存储为 ETag）
+    list(prefix)        列出以 prefix 开头的键
+    open_read(key)      以流的方式读取
+    open_write(key)     以流的方式写入，关闭时整体提交
+    put_file(key, path) 把本地文件写入存储（文件随后归存储所有，调用方不再使用）
+    put_bytes(key, data)
+    local_path(key)     返回保存最新版本的本地文件路径，供 openpyxl、Pillow、send_file 使用；
+                        对象不存在时返回的路径也不存在
+    delete(key)
+写入时可传入 if_version 做乐观并发控制：None 表示键必须不存在，其他值表示当前版本必须一致，
+否则抛出 StorageConflict，由调用方重新读取后重试。
+
+LocalStorage   本地目录（单机部署，默认）
+S3Storage      S3 兼容的对象存储（AWS S3、MinIO 等），需要安装 boto3
+CachedStorage  为远端存储加一层本地读缓存，多台应用服务器共用同一个存储桶时使用
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境下不做跨进程加锁
+    fcntl = None
+
+# if_version 的默认值：不检查版本
+ANY_VERSION = object()
+
+
+class StorageConflict(Exception):
+    def __init__(self, key):
+        super().__init__(f"{key} 已被其他请求修改")
+        self.key = key
+
+
+# 与目标在同一目录下的临时文件名，保证 os.replace 是原子操作
+def _temp_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+class LocalStorage:
+    def __init__(self, root):
+        self.root = root
+
+    def local_path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def version(self, key):
+        try:
+            stat = os.stat(self.local_path(key))
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def list(self, prefix=''):
+        directory, _, name_prefix = prefix.rpartition('/')
+        base = self.local_path(directory) if directory else self.root
+        if not os.path.isdir(base):
+            return []
+        keys = []
+        for current, dirs, files in os.walk(base):
+            relative = os.path.relpath(current, self.root).replace(os.sep, '/')
+            for filename in files:
+                key = filename if relative == '.' else f"{relative}/{filename}"
+                if key.startswith(prefix) and not filename.endswith('.tmp') and filename != '.lock':
+                    keys.append(key)
+        return sorted(keys)
+
+    def open_read(self, key):
+        return open(self.local_path(key), 'rb')
+
+    @contextlib.contextmanager
+    def open_write(self, key, if_version=ANY_VERSION):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = _temp_path(path)
+        try:
+            with open(temp_path, 'wb') as f:
+                yield f
+            self.put_file(key, temp_path, if_version)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def put_file(self, key, path, if_version=ANY_VERSION):
+        target = self.local_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.dirname(os.path.abspath(path)) != os.path.dirname(target):
+            # 先复制到目标目录再替换，跨文件系统时也保持原子
+            temp_path = _temp_path(target)
+            shutil.copyfile(path, temp_path)
+            os.remove(path)
+            path = temp_path
+
+        with self._lock():
+            if if_version is not ANY_VERSION and self.version(key) != if_version:
+                os.remove(path)
+                raise StorageConflict(key)
+            os.replace(path, target)
+        return self.version(key)
+
+    def put_bytes(self, key, data, if_version=ANY_VERSION):
+        with self.open_write(key, if_version) as f:
+            f.write(data)
+        return self.version(key)
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    # 版本检查与替换之间持有目录锁，多个进程同时写同一个键时只有一个成功
+    @contextlib.contextmanager
+    def _lock(self):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.root, exist_ok=True)
+        fd = os.open(os.path.join(self.root, '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class S3Storage:
+    def __init__(self, bucket, prefix='', endpoint_url=None, region_name=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.region_name = region_name
+        self._client = None
+
+    # 客户端不能跨进程传递，交给后台进程池时去掉，在子进程中重新创建
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_client'] = None
+        return state
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('s3', endpoint_url=self.endpoint_url, region_name=self.region_name)
+        return self._client
+
+    def _key(self, key):
+        return self.prefix + key
+
+    @staticmethod
+    def _error_code(error):
+        return error.response.get('Error', {}).get('Code')
+
+    def version(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))['ETag']
+        except ClientError as e:
+            if self._error_code(e) in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def list(self, prefix=''):
+        keys = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            for item in page.get('Contents', []):
+                keys.append(item['Key'][len(self.prefix):])
+        return sorted(keys)
+
+    def open_read(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+
+    @contextlib.contextmanager
+    def open_write(self, key, if_version=ANY_VERSION):
+        # 内容较小时留在内存，较大时自动落盘
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as f:
+            yield f
+            f.seek(0)
+            self._put(key, f, if_version)
+
+    def put_file(self, key, path, if_version=ANY_VERSION):
+        try:
+            with open(path, 'rb') as f:
+                return self._put(key, f, if_version)
+        finally:
+            os.remove(path)
+
+    def put_bytes(self, key, data, if_version=ANY_VERSION):
+        return self._put(key, data, if_version)
+
+    def _put(self, key, body, if_version):
+        from botocore.exceptions import ClientError
+
+        conditions = {}
+        if if_version is None:
+            conditions['IfNoneMatch'] = '*'
+        elif if_version is not ANY_VERSION:
+            conditions['IfMatch'] = if_version
+        try:
+            response = self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=body, **conditions)
+        except ClientError as e:
+            if self._error_code(e) in ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409'):
+                raise StorageConflict(key)
+            # 要求的版本已被删除
+            if 'IfMatch' in conditions and self._error_code(e) in ('NoSuchKey', '404'):
+                raise StorageConflict(key)
+            raise
+        return response['ETag']
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+
+class CachedStorage:
+    """远端存储 + 本地读缓存：读取前比较版本，只有远端变化时才重新下载；超过容量时淘汰最久未使用的文件"""
+
+    # 淘汰时删到容量上限的这个比例以下，避免之后每次写入缓存都触发淘汰
+    EVICT_TO = 0.9
+
+    def __init__(self, backend, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.backend = backend
+        self.cache = LocalStorage(cache_dir)
+        self.max_bytes = max_bytes
+        # 缓存总大小（字节）：第一次写入缓存时统计一次，之后随本进程的写入、删除增减，淘汰时重新统计
+        self._size = None
+        self._size_lock = threading.Lock()
+
+    # 锁不能跨进程传递，交给后台进程池时去掉，在子进程中重新创建并重新统计缓存大小
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_size'] = None
+        state['_size_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._size_lock = threading.Lock()
+
+    def version(self, key):
+        return self.backend.version(key)
+
+    def list(self, prefix=''):
+        return self.backend.list(prefix)
+
+    def open_read(self, key):
+        return open(self.local_path(key), 'rb')
+
+    @contextlib.contextmanager
+    def open_write(self, key, if_version=ANY_VERSION):
+        with self.backend.open_write(key, if_version) as f:
+            yield f
+        self._discard(key)
+
+    def put_file(self, key, path, if_version=ANY_VERSION):
+        # 上传后把文件留在缓存中，本节点接下来读取时无需下载
+        cached_path = self.cache.local_path(key)
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        temp_path = _temp_path(cached_path)
+        shutil.copyfile(path, temp_path)
+        try:
+            version = self.backend.put_file(key, path, if_version)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self._store(key, temp_path, version)
+        return version
+
+    def put_bytes(self, key, data, if_version=ANY_VERSION):
+        version = self.backend.put_bytes(key, data, if_version)
+        cached_path = self.cache.local_path(key)
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        temp_path = _temp_path(cached_path)
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        self._store(key, temp_path, version)
+        return version
+
+    def delete(self, key):
+        self.backend.delete(key)
+        self._discard(key)
+
+    def local_path(self, key):
+        path = self.cache.local_path(key)
+        version = self.backend.version(key)
+        if version is None:
+            self._discard(key)
+            return path
+        if self._cached_version(path) == version and os.path.exists(path):
+            os.utime(path)  # 记录最近使用时间，供淘汰时参考
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = _temp_path(path)
+        body = self.backend.open_read(key)
+        try:
+            with open(temp_path, 'wb') as f:
+                shutil.copyfileobj(body, f, 1024 * 1024)
+        finally:
+            body.close()
+        self._store(key, temp_path, version)
+        return path
+
+    @staticmethod
+    def _cached_version(path):
+        try:
+            with open(path + '.version', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _file_size(path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def _store(self, key, temp_path, version):
+        path = self.cache.local_path(key)
+        delta = self._file_size(temp_path) - self._file_size(path)
+        os.replace(temp_path, path)
+        version_temp = _temp_path(path + '.version')
+        with open(version_temp, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(version_temp, path + '.version')
+        self._account(delta)
+
+    def _discard(self, key):
+        path = self.cache.local_path(key)
+        size = self._file_size(path)
+        self.cache.delete(key)
+        if size:
+            self._account(-size)
+
+    # 记录缓存大小的变化，超过上限时才遍历缓存目录做淘汰
+    def _account(self, delta):
+        with self._size_lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += delta
+            over = self._size > self.max_bytes
+        if over:
+            self._evict()
+
+    # 遍历缓存目录，返回 ([(最近使用时间, 大小, 路径)], 总大小)
+    def _scan(self):
+        entries = []
+        total = 0
+        for current, dirs, files in os.walk(self.cache.root):
+            for filename in files:
+                if filename.endswith(('.version', '.tmp')) or filename == '.lock':
+                    continue
+                path = os.path.join(current, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        return entries, total
+
+    # 按最近使用时间从旧到新删除，直到低于容量上限的 EVICT_TO；
+    # 重新统计的大小也包含其他进程写入的文件
+    def _evict(self):
+        entries, total = self._scan()
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes * self.EVICT_TO:
+                break
+            for stale in (path, path + '.version'):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            total -= size
+        with self._size_lock:
+            self._size = total
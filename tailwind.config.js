@@ -0,0 +1,10 @@
+const path = require('path')
+
+/** 只扫描模板（仓库根目录的 templates，见 README），生成的CSS仅包含页面实际用到的类 */
+module.exports = {
+  content: [path.join(__dirname, 'templates', '**', '*.html')],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+}
@@ -0,0 +1,115 @@
+"""多基地（租户）部署
+
+一个部署同时服务多个孵化基地，每个基地是一个独立的 Flask 应用实例，拥有自己的数据库、
+工作簿与图片目录（对象存储时为独立的前缀）以及会话，互相之间看不到数据：
+    TENANT_ROOT/<基地>/users.db
+    TENANT_ROOT/<基地>/excel_files/ images/ uploads/ reports/ analytics_cache/ backups/
+准入通道的槽位与排队计数也按基地分开（ADMISSION_DIR/<基地>/），
+一个基地的批量导出排满时不会让其他基地的请求返回 503。
+请求按子域名（<基地>.TENANT_DOMAIN）分发到对应基地的应用；
+各基地的应用在该基地第一次收到请求时才创建，每个工作进程缓存一份。
+其余请求（如超级管理员接口）由根应用处理。
+
+不支持按路径前缀（/t/<基地>/...）区分基地：页面中的请求地址都是绝对路径（如 fetch('/submit_form')、
+location.href = '/user'），在前缀下打开的页面会把请求发到根路径，无法到达所属基地。
+"""
+import hashlib
+import hmac
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 基地名称：小写字母、数字与连字符，可直接用作目录名、子域名与对象存储前缀
+TENANT_NAME_PATTERN = re.compile(r'^[a-z0-9][a-z0-9-]{0,31}$')
+
+# 解析基地列表："base1:一号基地,base2" -> {'base1': '一号基地', 'base2': 'base2'}
+def parse_tenants(value):
+    tenants = {}
+    for item in (value or '').split(','):
+        name, _, title = item.strip().partition(':')
+        if not name:
+            continue
+        if not TENANT_NAME_PATTERN.match(name):
+            raise ValueError(f"基地名称无效: {name}")
+        tenants[name] = title.strip() or name
+    return tenants
+
+
+# 某个基地的配置：在整体配置的基础上替换各数据目录，并使用独立的会话密钥与 Cookie，
+# 一个基地的登录状态在其他基地无效
+def tenant_config(config, tenant):
+    if tenant not in config['TENANTS']:
+        raise ValueError(f"未配置的基地: {tenant}")
+    root = os.path.join(config['TENANT_ROOT'], tenant)
+    return {
+        **config,
+        'TENANT': tenant,
+        'TENANT_TITLE': config['TENANTS'][tenant],
+        'DATABASE': os.path.join(root, 'users.db'),
+        'UPLOAD_FOLDER': os.path.join(root, 'uploads'),
+        'EXCEL_FOLDER': os.path.join(root, 'excel_files'),
+        'IMAGE_FOLDER': os.path.join(root, 'images'),
+        'REPORT_FOLDER': os.path.join(root, 'reports'),
+        'ANALYTICS_FOLDER': os.path.join(root, 'analytics_cache'),
+        'BACKUP_FOLDER': os.path.join(root, 'backups'),
+        'STORAGE_CACHE_FOLDER': os.path.join(config['STORAGE_CACHE_FOLDER'], tenant),
+        'ADMISSION_DIR': os.path.join(config['ADMISSION_DIR'], tenant),
+        'S3_PREFIX': f"{config['S3_PREFIX']}{tenant}/",
+        'SECRET_KEY': hmac.new(config['SECRET_KEY'].encode('utf-8'), tenant.encode('utf-8'),
+                               hashlib.sha256).hexdigest(),
+        'SESSION_COOKIE_NAME': f"session_{tenant}",
+    }
+
+
+class TenantDispatcher:
+    """WSGI 分发：识别请求所属基地并转交该基地的应用，识别不到时交给根应用"""
+
+    def __init__(self, root_app, tenants, factory, domain=None):
+        self.root_app = root_app
+        self.tenants = tenants
+        self.factory = factory  # 基地名称 -> WSGI 应用
+        self.domain = domain
+        self.apps = {}
+        self.lock = threading.Lock()
+
+    def get_app(self, tenant):
+        app = self.apps.get(tenant)
+        if app is None:
+            with self.lock:
+                app = self.apps.get(tenant)
+                if app is None:
+                    app = self.apps[tenant] = self.factory(tenant)
+        return app
+
+    def _tenant_from_host(self, environ):
+        host = environ.get('HTTP_HOST', '').split(':')[0].lower()
+        if self.domain:
+            suffix = '.' + self.domain
+            if not host.endswith(suffix):
+                return None
+            name = host[:-len(suffix)]
+        else:
+            name = host.split('.')[0]
+        return name if name in self.tenants else None
+
+    def __call__(self, environ, start_response):
+        tenant = self._tenant_from_host(environ)
+        if tenant is not None:
+            return self.get_app(tenant)(environ, start_response)
+        return self.root_app(environ, start_response)
+
+
+# 在各基地上并行执行 func(基地名称)，返回 {基地: 结果}；单个基地出错不影响其他基地
+def fan_out(tenant_names, func, workers=8):
+    def run(tenant):
+        try:
+            return func(tenant)
+        except Exception as e:
+            return {'error': str(e)}
+
+    tenant_names = list(tenant_names)
+    if not tenant_names:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(tenant_names)), thread_name_prefix='fan-out') as executor:
+        return dict(zip(tenant_names, executor.map(run, tenant_names)))
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 测试直接导入仓库根目录下的模块（app、storage、xlsx_writer 等）
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
@@ -0,0 +1,30 @@
+"""管理端批量操作房间账号"""
+import app
+
+
+def make_client(tmp_path):
+    flask_app = app.create_app({'DATABASE': str(tmp_path / 'users.db'), 'SECRET_KEY': 'test'})
+    app.init_db(flask_app)
+    client = flask_app.test_client()
+    assert client.post('/register', json={'room': '101', 'password': 'old'}).get_json()['success']
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    return client
+
+
+def test_bulk_reset_rejects_invalid_password(tmp_path):
+    client = make_client(tmp_path)
+    for password in (123456, ['a'], '', '  '):
+        response = client.post('/admin/users/bulk', json={'action': 'reset', 'rooms': ['101'], 'password': password})
+        assert response.status_code == 200
+        assert response.get_json() == {'success': False, 'message': '密码不能为空'}
+
+
+def test_bulk_reset_sets_given_or_random_password(tmp_path):
+    client = make_client(tmp_path)
+    result = client.post('/admin/users/bulk', json={'action': 'reset', 'rooms': ['101'], 'password': 'abc'}).get_json()
+    assert result['success'] and result['affected'] == ['101'] and 'passwords' not in result
+    assert client.post('/login', json={'room': '101', 'password': 'abc'}).get_json()['success']
+
+    result = client.post('/admin/users/bulk', json={'action': 'reset', 'rooms': ['101']}).get_json()
+    assert list(result['passwords']) == ['101']
@@ -0,0 +1,75 @@
+"""准入控制：排队计数"""
+import json
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import admission
+import app
+import tenants
+
+pytestmark = pytest.mark.skipif(admission.fcntl is None, reason='需要 fcntl')
+
+
+def lanes(queue=2):
+    return {
+        'high': {'priority': 0, 'limit': 1, 'queue': queue, 'timeout': 5, 'retry_after': 1},
+        'low': {'priority': 1, 'limit': 1, 'queue': queue, 'timeout': 0.2, 'retry_after': 7},
+    }
+
+
+def test_checking_waiters_does_not_take_a_queue_position(tmp_path):
+    control = admission.Admission(str(tmp_path), lanes(queue=1))
+    directory = control._lane_dir('high')
+    assert admission._enter_queue(directory, 1)
+
+    # 低优先级通道查看排队情况时，高优先级通道的排队位置不受影响
+    assert control._higher_priority_waiting('low')
+    assert not admission._enter_queue(directory, 1)
+    admission._leave_queue(directory)
+    assert not control._higher_priority_waiting('low')
+    assert admission._enter_queue(directory, 1)
+
+
+def test_queue_counts_of_exited_processes_are_dropped(tmp_path):
+    control = admission.Admission(str(tmp_path), lanes(queue=1))
+    directory = control._lane_dir('high')
+    dead = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                          capture_output=True, text=True, check=True).stdout.strip()
+    with open(tmp_path / 'high' / 'queue.lock', 'w') as f:
+        json.dump({dead: 1}, f)
+
+    assert not control._higher_priority_waiting('low')
+    assert admission._enter_queue(directory, 1)
+
+
+def test_low_priority_lane_yields_while_high_priority_requests_wait(tmp_path):
+    control = admission.Admission(str(tmp_path), lanes())
+    running = control.acquire('high')
+    waiting = threading.Thread(target=lambda: control.release(control.acquire('high')))
+    waiting.start()
+    try:
+        while not control._higher_priority_waiting('low'):
+            time.sleep(0.01)
+        with pytest.raises(admission.AdmissionRejected) as rejected:
+            control.acquire('low')
+        assert rejected.value.retry_after == 7
+    finally:
+        control.release(running)
+        waiting.join()
+    control.release(control.acquire('low'))
+
+
+# 各基地使用各自的准入目录，一个基地排满不影响其他基地
+def test_tenants_have_separate_lanes(tmp_path):
+    config = {**app.default_config(), 'TENANTS': {'base1': 'base1', 'base2': 'base2'},
+              'ADMISSION_DIR': str(tmp_path), 'SECRET_KEY': 'test'}
+    first = admission.Admission(tenants.tenant_config(config, 'base1')['ADMISSION_DIR'], lanes(queue=1))
+    second = admission.Admission(tenants.tenant_config(config, 'base2')['ADMISSION_DIR'], lanes(queue=1))
+    assert admission._enter_queue(first._lane_dir('high'), 1)
+    assert not first._higher_priority_waiting('high') and first._higher_priority_waiting('low')
+    assert not second._higher_priority_waiting('low')
+    assert admission._enter_queue(second._lane_dir('high'), 1)
@@ -0,0 +1,39 @@
+"""趋势分析：各统计期的分位数与异常值标记"""
+import pytest
+
+np = pytest.importorskip('numpy')
+analytics = pytest.importorskip('analytics')
+
+
+def snapshot(values_by_year, field='inventionPatents'):
+    rows = []
+    for year, values in values_by_year.items():
+        for value in values:
+            rows.append({'seq': len(rows) + 1, 'room': str(len(rows)), 'submitted_at': f"{year}-03-01",
+                         field: value})
+    return analytics.Snapshot.empty().merge(rows)
+
+
+def test_percentiles_match_numpy_per_period():
+    rng = np.random.default_rng(0)
+    years = {2022: list(rng.integers(0, 1000, 37)) + [None] * 3, 2023: [5], 2024: [None, None]}
+    summaries, _ = analytics.period_summary(snapshot(years, 'totalRevenue'), 'totalRevenue')
+
+    assert [summary['period'] for summary in summaries] == ['2022', '2023', '2024']
+    expected = np.percentile(np.array(years[2022][:37], dtype=float), analytics.PERCENTILES)
+    assert [summaries[0][f"p{p}"] for p in analytics.PERCENTILES] == pytest.approx(list(expected))
+    assert summaries[0]['count'] == 37 and summaries[0]['total'] == float(sum(years[2022][:37]))
+    assert summaries[1]['p90'] == 5.0
+    assert summaries[2]['count'] == 0 and summaries[2]['p50'] is None
+
+
+def test_zero_mad_does_not_flag_every_value():
+    # 大多为0时绝对中位差为0，改用平均绝对偏差，1 和 2 不是异常值
+    _, outliers = analytics.period_summary(snapshot({2024: [0, 0, 0, 1, 2]}), 'inventionPatents')
+    assert not outliers.any()
+
+    _, outliers = analytics.period_summary(snapshot({2024: [0] * 20 + [1, 40]}), 'inventionPatents')
+    assert outliers.tolist() == [False] * 21 + [True]
+
+    _, outliers = analytics.period_summary(snapshot({2024: [3, 3, 3], 2025: [1, 2, 3, 2, 100]}), 'inventionPatents')
+    assert outliers.tolist() == [False] * 7 + [True]
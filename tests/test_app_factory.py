@@ -0,0 +1,46 @@
+"""应用工厂：导入 app、创建应用时不写入当前目录，也不加载重量级依赖"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import app
+from conftest import REPO_DIR
+
+HEAVY_MODULES = ('openpyxl', 'PIL', 'numpy', 'boto3')
+
+BOOT_SCRIPT = '''
+import json, sys
+import app
+app.create_app()
+print(json.dumps(sorted(name for name in {modules!r} if name in sys.modules)))
+'''
+
+
+def test_boot_does_not_touch_working_directory(tmp_path):
+    env = {key: value for key, value in os.environ.items() if key not in ('TENANT', 'TENANT_MODE', 'TENANTS')}
+    env['PYTHONPATH'] = REPO_DIR
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    result = subprocess.run(
+        [sys.executable, '-c', BOOT_SCRIPT.format(modules=HEAVY_MODULES)],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True
+    )
+
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+    assert os.listdir(tmp_path) == []
+
+
+# 多基地部署时模块级的 app 不是某个基地的应用，init_db() 不再以它为默认值
+def test_init_db_requires_an_app(tmp_path):
+    with pytest.raises(RuntimeError):
+        app.init_db()
+
+    flask_app = app.create_app({'DATABASE': str(tmp_path / 'users.db')})
+    app.init_db(flask_app)
+    with flask_app.app_context():
+        app.init_db()
+    with sqlite3.connect(tmp_path / 'users.db') as db:
+        assert db.execute("SELECT username FROM admins").fetchall() == [('admin',)]
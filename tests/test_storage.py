@@ -0,0 +1,120 @@
+"""存储后端：条件写入冲突与本地读缓存（对象存储用 moto 模拟）"""
+import os
+
+import pytest
+
+import storage
+
+boto3 = pytest.importorskip('boto3')
+moto = pytest.importorskip('moto')
+
+BUCKET = 'manager-test'
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    for name, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_SESSION_TOKEN', 'testing'), ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket=BUCKET)
+        yield storage.S3Storage(BUCKET, 'workbooks/', region_name='us-east-1')
+
+
+@pytest.fixture(params=['local', 's3'])
+def backend(request, tmp_path):
+    if request.param == 'local':
+        return storage.LocalStorage(str(tmp_path / 'local'))
+    return request.getfixturevalue('s3')
+
+
+def test_create_only_write_conflicts_when_key_exists(backend):
+    version = backend.put_bytes('101.xlsx', b'first', if_version=None)
+    assert version is not None and backend.version('101.xlsx') == version
+
+    with pytest.raises(storage.StorageConflict):
+        backend.put_bytes('101.xlsx', b'second', if_version=None)
+    with backend.open_read('101.xlsx') as f:
+        assert f.read() == b'first'
+
+
+def test_conditional_write_conflicts_on_stale_version(backend, tmp_path):
+    stale = backend.put_bytes('101.xlsx', b'v1')
+    current = backend.put_bytes('101.xlsx', b'v2', if_version=stale)
+    assert current != stale
+
+    with pytest.raises(storage.StorageConflict):
+        with backend.open_write('101.xlsx', if_version=stale) as f:
+            f.write(b'lost update')
+    source = tmp_path / 'upload'
+    source.write_bytes(b'lost update')
+    with pytest.raises(storage.StorageConflict):
+        backend.put_file('101.xlsx', str(source), if_version=stale)
+
+    with backend.open_read('101.xlsx') as f:
+        assert f.read() == b'v2'
+    assert backend.version('101.xlsx') == current
+
+
+class CountingBackend:
+    """记录下载次数的远端存储"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.downloads = 0
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def open_read(self, key):
+        self.downloads += 1
+        return self.backend.open_read(key)
+
+
+def read(cached, key):
+    with open(cached.local_path(key), 'rb') as f:
+        return f.read()
+
+
+def test_cached_storage_revalidates_against_remote_version(s3, tmp_path):
+    remote = CountingBackend(s3)
+    node_a = storage.CachedStorage(s3, str(tmp_path / 'cache-a'))
+    node_b = storage.CachedStorage(remote, str(tmp_path / 'cache-b'))
+
+    node_a.put_bytes('101.xlsx', b'v1', if_version=None)
+    assert read(node_b, '101.xlsx') == b'v1'
+    assert read(node_b, '101.xlsx') == b'v1'
+    assert remote.downloads == 1  # 远端未变化时使用缓存
+
+    # 另一台服务器写入新版本后重新下载
+    node_a.put_bytes('101.xlsx', b'v2', if_version=s3.version('101.xlsx'))
+    assert read(node_b, '101.xlsx') == b'v2'
+    assert remote.downloads == 2
+
+    # 本节点写入的内容直接留在缓存中
+    node_b.put_bytes('101.xlsx', b'v3', if_version=s3.version('101.xlsx'))
+    assert read(node_b, '101.xlsx') == b'v3'
+    assert remote.downloads == 2
+
+    # 远端删除后缓存随之失效
+    node_a.delete('101.xlsx')
+    assert not os.path.exists(node_b.local_path('101.xlsx'))
+
+    with pytest.raises(storage.StorageConflict):
+        node_b.put_bytes('102.xlsx', b'x', if_version='"stale"')
+
+
+def test_cached_storage_evicts_least_recently_used(s3, tmp_path):
+    cached = storage.CachedStorage(s3, str(tmp_path / 'cache'), max_bytes=2500)
+    for index in range(3):
+        cached.put_bytes(f"{index}.bin", bytes(1000))
+        os.utime(cached.cache.local_path(f"{index}.bin"), (index, index))
+
+    # 写入第三个文件时超过上限，淘汰最久未使用的文件，删到上限的 90% 以下
+    cached.put_bytes('3.bin', bytes(1000))
+    remaining = sorted(name for name in os.listdir(tmp_path / 'cache') if name.endswith('.bin'))
+    assert remaining == ['2.bin', '3.bin']
+    assert cached._size == 2000
+
+    # 被淘汰的文件仍可从远端读取
+    assert read(cached, '0.bin') == bytes(1000)
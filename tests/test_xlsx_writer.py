@@ -0,0 +1,177 @@
+"""直接渲染的提交工作表与原 openpyxl 写法逐项一致
+
+data/submission_openpyxl.xlsx 由改为直接渲染之前的 write_submission（openpyxl 逐个单元格写入、
+insert_image_to_excel 插入图片）以 submission_form() 与 make_images() 生成。
+"""
+import io
+import os
+import shutil
+import zipfile
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import app
+import storage
+import xlsx_writer
+import validation
+
+openpyxl = pytest.importorskip('openpyxl')
+PILImage = pytest.importorskip('PIL.Image')
+
+REFERENCE = os.path.join(os.path.dirname(__file__), 'data', 'submission_openpyxl.xlsx')
+REFERENCE_SHEET = '2024-01-01 10-00-00'
+TIMESTAMP = '2024-01-01 10:00:00'
+
+# 测试图片：(文件名, 模式, 尺寸, 颜色)，照片与带透明通道的图片各走一条编码路径
+IMAGES = [
+    ('license.jpg', 'RGB', (800, 600), (200, 30, 30)),
+    ('patent.png', 'RGBA', (500, 700), (30, 30, 200, 128)),
+    ('copyright.jpg', 'RGB', (120, 90), (30, 160, 30)),
+    ('award.jpg', 'RGB', (1000, 400), (220, 200, 20)),
+]
+
+
+def submission_form():
+    fields = [
+        ('projectLeaderName', ' 张三 <&> '), ('projectLeaderPhone', '13800138000'), ('projectType', '1'),
+        ('projectLeaderGender', 'male'), ('enterpriseName', '测"试'), ('registrationType', '173'),
+        ('totalRevenue', '1200'), ('inventionPatents', '1'), ('softwareCopyrights', '1'),
+        ('isHighTechEnterprise', 'yes'), ('financingAmount', ''),
+    ]
+    members = [('member_name[]', name) for name in ('李四', '王五')]
+    members += [('member_gender[]', 'male'), ('member_gender[]', 'female')]
+    for key, value in (('member_isStudent[]', 'yes'), ('member_college[]', '计算机学院'),
+                       ('member_grade[]', '2021'), ('member_level[]', 'junior'),
+                       ('member_phone[]', '13900139000'), ('member_isOverseas[]', 'no')):
+        members += [(key, value)] * 2
+    awards = [('award_competition[]', '互联网+'), ('award_competition[]', '挑战杯'),
+              ('award_prize[]', '金奖'), ('award_prize[]', '银奖')]
+    # 与提交接口相同，先经过表单校验（数字字段转换为数值）
+    form, errors = validation.validate_submission(MultiDict(fields + members + awards), MultiDict(),
+                                                  app.get_registration_type_map())
+    assert not errors
+    return form
+
+
+def make_images(directory):
+    paths = []
+    for name, mode, size, color in IMAGES:
+        path = os.path.join(directory, name)
+        PILImage.new(mode, size, color).save(path)
+        paths.append(path)
+    return paths
+
+
+def render(tmp_path):
+    license_path, patent_path, copyright_path, award_path = make_images(str(tmp_path))
+    return app.render_submission_sheet(TIMESTAMP, submission_form(), license_path, patent_path,
+                                       copyright_path, [award_path, None])
+
+
+def image_summary(image):
+    with PILImage.open(io.BytesIO(image._data())) as img:
+        img = img.convert('RGBA')
+        center = img.getpixel((img.width // 2, img.height // 2))
+        return (image.anchor._from.row, image.anchor._from.col, image.width, image.height, img.size), center
+
+
+def assert_same_sheet(actual, expected):
+    assert actual.max_row == expected.max_row
+    assert actual.max_column == expected.max_column
+    for actual_row, expected_row in zip(actual.iter_rows(), expected.iter_rows()):
+        for cell, reference in zip(actual_row, expected_row):
+            assert cell.value == reference.value, cell.coordinate
+            assert (cell.font.b, cell.font.sz) == (reference.font.b, reference.font.sz), cell.coordinate
+    for row in range(1, expected.max_row + 1):
+        assert actual.row_dimensions[row].height == expected.row_dimensions[row].height, row
+    for column in range(1, expected.max_column + 1):
+        letter = openpyxl.utils.get_column_letter(column)
+        assert actual.column_dimensions[letter].width == expected.column_dimensions[letter].width, letter
+
+    assert len(actual._images) == len(expected._images)
+    for image, reference in zip(actual._images, expected._images):
+        (layout, center), (expected_layout, expected_center) = image_summary(image), image_summary(reference)
+        assert layout == expected_layout
+        # 照片改为 JPEG 编码，颜色允许少量误差
+        assert all(abs(a - b) <= 4 for a, b in zip(center, expected_center)), (center, expected_center)
+
+
+# 每次比较重新加载：openpyxl 读取一次图片数据后即关闭文件
+def load_reference():
+    return openpyxl.load_workbook(REFERENCE)[REFERENCE_SHEET]  # 原写法的工作簿另有一个空的默认工作表
+
+
+def test_new_workbook_matches_openpyxl(tmp_path):
+    reference = load_reference()
+    sheet = render(tmp_path)
+    workbooks = storage.LocalStorage(str(tmp_path / 'excel'))
+    name = app.write_submission(workbooks, '101.xlsx', TIMESTAMP, sheet)
+    assert name == REFERENCE_SHEET
+
+    workbook = openpyxl.load_workbook(workbooks.local_path('101.xlsx'))
+    assert workbook.sheetnames == [name]
+    assert_same_sheet(workbook[name], reference)
+    assert app.parse_submission_record(sheet.iter_rows()) == \
+        app.parse_submission_record(reference.iter_rows(values_only=True))
+
+
+def test_append_to_openpyxl_workbook(tmp_path):
+    sheet = render(tmp_path)
+    workbooks = storage.LocalStorage(str(tmp_path / 'excel'))
+    os.makedirs(workbooks.root)
+    shutil.copy(REFERENCE, workbooks.local_path('101.xlsx'))
+    name = app.write_submission(workbooks, '101.xlsx', TIMESTAMP, sheet)
+    assert name == REFERENCE_SHEET + '_1'
+
+    # 已有的工作表与新追加的工作表都与原写法一致
+    workbook = openpyxl.load_workbook(workbooks.local_path('101.xlsx'))
+    assert workbook.sheetnames == load_reference().parent.sheetnames + [name]
+    assert_same_sheet(workbook[REFERENCE_SHEET], load_reference())
+    assert_same_sheet(workbook[name], load_reference())
+
+
+def raw_entries(path):
+    """各条目压缩后的原始数据"""
+    entries = {}
+    with open(path, 'rb') as fp, zipfile.ZipFile(fp) as archive:
+        for info in archive.infolist():
+            fp.seek(info.header_offset)
+            name_length, extra_length = xlsx_writer.LOCAL_HEADER.unpack(fp.read(xlsx_writer.LOCAL_HEADER.size))[-2:]
+            fp.seek(info.header_offset + xlsx_writer.LOCAL_HEADER.size + name_length + extra_length)
+            entries[info.filename] = (info.compress_type, fp.read(info.compress_size))
+    return entries
+
+
+def test_append_copies_existing_parts_without_recompressing(tmp_path):
+    target = tmp_path / 'appended.xlsx'
+    xlsx_writer.append_sheet(REFERENCE, str(target), 'new', render(tmp_path))
+
+    with zipfile.ZipFile(target) as archive:
+        assert archive.testzip() is None
+    before, after = raw_entries(REFERENCE), raw_entries(target)
+    rewritten = {'xl/workbook.xml', 'xl/_rels/workbook.xml.rels', '[Content_Types].xml', 'xl/styles.xml'}
+    assert list(after)[:len(before)] == list(before)
+    for name, entry in before.items():
+        if name not in rewritten:
+            assert after[name] == entry, name
+
+
+def test_extract_sheet_keeps_only_that_sheet(tmp_path):
+    workbooks = storage.LocalStorage(str(tmp_path / 'excel'))
+    os.makedirs(workbooks.root)
+    shutil.copy(REFERENCE, workbooks.local_path('101.xlsx'))
+    for second in range(1, 3):
+        app.write_submission(workbooks, '101.xlsx', TIMESTAMP[:-2] + f"{second:02d}", render(tmp_path))
+
+    for name in (REFERENCE_SHEET, '2024-01-01 10-00-02'):
+        target = tmp_path / 'single.xlsx'
+        assert xlsx_writer.extract_sheet(workbooks.local_path('101.xlsx'), str(target), name)
+        with zipfile.ZipFile(target) as archive:
+            assert archive.testzip() is None
+            assert len([part for part in archive.namelist() if part.startswith('xl/media/')]) == 4
+        workbook = openpyxl.load_workbook(target)
+        assert workbook.sheetnames == [name]
+        assert_same_sheet(workbook[name], load_reference())
+
+    assert not xlsx_writer.extract_sheet(workbooks.local_path('101.xlsx'), str(tmp_path / 'none.xlsx'), 'missing')
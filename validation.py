@@ -0,0 +1,222 @@
+"""提交表单的校验与类型转换
+
+在保存图片、读写工作簿之前对整个表单做一次校验，一次返回全部错误：
+    - 数值字段（千元、件、项、平方米）转换为数值，件/项必须为非负整数
+    - 统一社会信用代码（18 位，含校验位）与联系电话的格式
+    - 成员、获奖各列表的长度一致
+    - 项目类型、性别、登记注册类型等取值在代码表中
+    - 上传的证明材料必须是图片（按文件内容识别，不看文件名）
+校验通过后返回转换后的表单，数值字段以 int/float 写入工作簿与结构化记录，下游统计无需再解析字符串。
+只有在孵企业才填写的字段，仅在项目类型为在孵企业时校验。
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+from werkzeug.datastructures import MultiDict
+
+# 数值字段：字段 -> (标签, 是否必须为整数, 是否允许负数)
+NUMBER_FIELDS = {
+    'registeredCapital': ('企业成立时注册资本(千元)', False, False),
+    'areaOccupied': ('占用孵化器场地面积(平方米)', False, False),
+    'totalRevenue': ('在孵企业总收入(千元)', False, False),
+    'netProfit': ('在孵企业净利润(千元)', False, True),
+    'exportAmount': ('在孵企业出口总额(千元)', False, False),
+    'rdExpenditure': ('研究与试验发展经费(千元)', False, False),
+    'taxPayment': ('实际上缴税费(千元)', False, False),
+    'ipApplications': ('当年知识产权申请数(件)', True, False),
+    'ipAuthorizations': ('当年知识产权授权数(件)', True, False),
+    'inventionPatents': ('其中：发明专利(件)', True, False),
+    'softwareCopyrights': ('软件著作权(件)', True, False),
+    'techContracts': ('技术合同成交数量(项)', True, False),
+    'techContractAmount': ('技术合同成交额(千元)', False, False),
+    'nationalProjects': ('当年承担国家级科技计划项目数(项)', True, False),
+    'financingAmount': ('获得投融资金额(千元)', False, False),
+    'incubatorFundAmount': ('其中：获得孵化器孵化基金投资额(千元)', False, False),
+    'bankLoanAmount': ('其中：获银行贷款额(千元)', False, False),
+}
+
+# 仅在孵企业填写的字段
+ENTERPRISE_FIELDS = {
+    'enterpriseAccount', 'registeredCapital', 'areaOccupied', 'registrationType', 'taxpayerType',
+    'totalRevenue', 'netProfit', 'exportAmount', 'rdExpenditure', 'taxPayment',
+}
+
+# 单选字段的代码表：字段 -> (标签, 可选值)；登记注册类型的代码表由调用方传入
+YES_NO = {'yes', 'no'}
+CODE_FIELDS = {
+    'projectLeaderGender': ('项目负责人性别', {'male', 'female'}),
+    'taxpayerType': ('企业纳税人类型', {'general', 'small'}),
+    'isHighTechEnterprise': ('是否高新技术企业', YES_NO),
+    'isTechSme': ('是否是科技型中小企业', YES_NO),
+    'isInnovativeSme': ('是否创新型中小企业', YES_NO),
+    'isSpecializedSme': ('是否专精特新中小企业', YES_NO),
+    'isGiantSme': ('是否专精特新“小巨人”企业', YES_NO),
+}
+
+PROJECT_TYPES = {'1', '2'}
+
+# 成员列表：字段 -> (标签, 代码表；None 表示不限)
+MEMBER_FIELDS = {
+    'member_name[]': ('成员姓名', None),
+    'member_gender[]': ('成员性别', {'male', 'female'}),
+    'member_isStudent[]': ('是否在校生', YES_NO),
+    'member_college[]': ('成员学院', None),
+    'member_grade[]': ('成员年级', None),
+    'member_level[]': ('成员层次', {'undergraduate', 'junior'}),
+    'member_phone[]': ('成员联系电话', None),
+    'member_isOverseas[]': ('是否留学人员', YES_NO),
+}
+AWARD_FIELDS = {
+    'award_competition[]': '赛事完整名称',
+    'award_prize[]': '所获奖项',
+}
+
+# 上传的图片：字段 -> 标签
+IMAGE_FIELDS = {
+    'businessLicense': '营业执照照片',
+    'inventionPatentCertificate': '发明专利证书',
+    'softwareCopyrightCertificate': '软件著作权证书',
+    'award_certificate[]': '获奖证明图片',
+}
+
+# 统一社会信用代码（GB 32100-2015）：字符集不含 I、O、S、V、Z，第 18 位为校验位
+CREDIT_CODE_CHARS = '0123456789ABCDEFGHJKLMNPQRTUWXY'
+CREDIT_CODE_WEIGHTS = (1, 3, 9, 27, 19, 26, 16, 17, 20, 29, 25, 13, 8, 24, 10, 30, 28)
+CREDIT_CODE_PATTERN = re.compile(rf'^[{CREDIT_CODE_CHARS}]{{18}}$')
+
+# 手机号，或带区号的固定电话（可带分机号）
+PHONE_PATTERN = re.compile(r'^(1[3-9]\d{9}|0\d{2,3}-?\d{7,8}(-\d{1,6})?)$')
+
+
+def is_valid_credit_code(code):
+    if not CREDIT_CODE_PATTERN.match(code):
+        return False
+    total = sum(CREDIT_CODE_CHARS.index(char) * weight for char, weight in zip(code, CREDIT_CODE_WEIGHTS))
+    return CREDIT_CODE_CHARS[(31 - total % 31) % 31] == code[17]
+
+
+def is_valid_phone(phone):
+    return bool(PHONE_PATTERN.match(phone))
+
+
+# 上传的文件是否为可识别的图片，检查后回到文件开头
+def is_image_upload(file):
+    from PIL import Image as PILImage
+
+    try:
+        with PILImage.open(file.stream) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+    finally:
+        file.stream.seek(0)
+
+
+# 解析数值（允许千分位逗号），整数值返回 int，其余返回 float；无法解析时返回 None
+def parse_number(value):
+    text = value.strip().replace(',', '').replace('，', '')
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        return None
+    if not number.is_finite():
+        return None
+    if number == number.to_integral_value():
+        return int(number)
+    return float(number)
+
+
+class FormErrors:
+    def __init__(self):
+        self.errors = []
+
+    def add(self, field, message, index=None):
+        error = {'field': field, 'message': message}
+        if index is not None:
+            error['index'] = index
+        self.errors.append(error)
+
+
+# 校验提交的表单；返回 (转换后的表单, 错误列表)，错误列表为空表示通过
+# registration_types 为登记注册类型代码表（代码 -> 名称）
+def validate_submission(form, files, registration_types):
+    cleaned = MultiDict(form)
+    errors = FormErrors()
+
+    project_type = form.get('projectType', '')
+    if project_type not in PROJECT_TYPES:
+        errors.add('projectType', '请选择项目类型')
+    enterprise = project_type == '1'
+
+    def applies(field):
+        return enterprise or field not in ENTERPRISE_FIELDS
+
+    for field, (label, integer, allow_negative) in NUMBER_FIELDS.items():
+        value = form.get(field, '')
+        if not applies(field) or not value.strip():
+            continue
+        number = parse_number(value)
+        if number is None:
+            errors.add(field, f"{label}必须是数字")
+        elif integer and not isinstance(number, int):
+            errors.add(field, f"{label}必须是整数")
+        elif number < 0 and not allow_negative:
+            errors.add(field, f"{label}不能为负数")
+        else:
+            cleaned[field] = number
+
+    code_fields = dict(CODE_FIELDS, registrationType=('企业登记注册类型', registration_types))
+    for field, (label, codes) in code_fields.items():
+        value = form.get(field, '')
+        if applies(field) and value and value not in codes:
+            errors.add(field, f"{label}的取值无效")
+
+    account = form.get('enterpriseAccount', '').strip().upper()
+    if enterprise and account:
+        if is_valid_credit_code(account):
+            cleaned['enterpriseAccount'] = account
+        else:
+            errors.add('enterpriseAccount', '统一社会信用代码应为18位且校验位正确')
+
+    phone = form.get('projectLeaderPhone', '').strip()
+    if phone:
+        if is_valid_phone(phone):
+            cleaned['projectLeaderPhone'] = phone
+        else:
+            errors.add('projectLeaderPhone', '项目负责人联系电话格式不正确')
+
+    # 成员与获奖按下标对应，各列表长度必须一致
+    members = {field: form.getlist(field) for field in MEMBER_FIELDS}
+    member_count = len(members['member_name[]'])
+    for field, (label, codes) in MEMBER_FIELDS.items():
+        values = members[field]
+        if len(values) != member_count:
+            errors.add(field, f"{label}的数量（{len(values)}）与成员人数（{member_count}）不一致")
+            continue
+        for i, value in enumerate(values):
+            if codes is not None and value and value not in codes:
+                errors.add(field, f"第{i + 1}位成员的{label}取值无效", i)
+    phones = members['member_phone[]']
+    for i, phone in enumerate(phones):
+        if phone.strip() and not is_valid_phone(phone.strip()):
+            errors.add('member_phone[]', f"第{i + 1}位成员的联系电话格式不正确", i)
+    # setlist 传入空列表会在 MultiDict 中留下空项（items()、序列化时出错），没有成员时不改写
+    if phones and len(phones) == member_count:
+        cleaned.setlist('member_phone[]', [phone.strip() for phone in phones])
+
+    award_count = len(form.getlist('award_competition[]'))
+    for field, label in AWARD_FIELDS.items():
+        count = len(form.getlist(field))
+        if count != award_count:
+            errors.add(field, f"{label}的数量（{count}）与获奖记录数（{award_count}）不一致")
+    certificates = len(files.getlist('award_certificate[]'))
+    if certificates > award_count:
+        errors.add('award_certificate[]', f"获奖证明图片的数量（{certificates}）多于获奖记录数（{award_count}）")
+
+    for field, label in IMAGE_FIELDS.items():
+        for i, file in enumerate(files.getlist(field)):
+            if file and file.filename and not is_image_upload(file):
+                errors.add(field, f"{label}必须是图片文件", i if field.endswith('[]') else None)
+
+    return cleaned, errors.errors
@@ -0,0 +1,183 @@
+"""工作簿内嵌图片的编码与整理
+
+提交时嵌入工作表的图片已缩放到显示尺寸，照片编码为 JPEG，带透明通道的图片保留 PNG（encode_image）。
+早期的工作簿把照片存为 PNG，同一张证书在多次提交中反复嵌入，compact_workbook 整理这类工作簿：
+    - 大于显示尺寸（绘图部件中的锚点范围）的图片缩小到显示尺寸
+    - 重新编码后更小时替换为新的编码（扩展名随格式变化）；不需要缩小的 JPEG 保持原样
+    - 内容相同的图片部件只保留一份，各绘图部件的关系指向同一个部件
+工作表、绘图部件本身与其余部件连同压缩数据原样复制，单元格内容与图片位置、显示大小均不变。
+"""
+import hashlib
+import io
+import math
+import posixpath
+import re
+import zipfile
+from xml.etree import ElementTree
+
+import xlsx_writer
+
+# 内嵌照片的 JPEG 质量
+JPEG_QUALITY = 85
+
+DRAWING_NS = xlsx_writer.DRAWING_NS
+DRAWINGML_NS = xlsx_writer.DRAWINGML_NS
+REL_NS = xlsx_writer.REL_NS
+
+
+# 编码内嵌图片：照片为 JPEG，带透明通道的图片为 PNG，返回 (格式, 数据)
+def encode_image(img, quality=JPEG_QUALITY):
+    output = io.BytesIO()
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img.save(output, format='PNG', optimize=True)
+        return 'png', output.getvalue()
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.save(output, format='JPEG', quality=quality, optimize=True)
+    return 'jpeg', output.getvalue()
+
+
+# 各图片部件的最大显示尺寸（像素）；有锚点无法确定尺寸时不缩小该图片
+def display_sizes(archive, names):
+    sizes = {}
+    unknown = set()
+    for part in names:
+        if not re.fullmatch(r'xl/drawings/[^/]+\.xml', part) or xlsx_writer.rels_part(part) not in names:
+            continue
+        rels = ElementTree.fromstring(archive.read(xlsx_writer.rels_part(part)))
+        targets = {rel.get('Id'): xlsx_writer.resolve_target(xlsx_writer.rels_part(part), rel.get('Target', ''))
+                   for rel in rels if rel.get('TargetMode') != 'External'}
+        root = ElementTree.fromstring(archive.read(part))
+        for anchor in root:
+            ext = anchor.find(f"{{{DRAWING_NS}}}ext")
+            if ext is None:
+                ext = anchor.find(f".//{{{DRAWINGML_NS}}}xfrm/{{{DRAWINGML_NS}}}ext")
+            for blip in anchor.iter(f"{{{DRAWINGML_NS}}}blip"):
+                media = targets.get(blip.get(f"{{{REL_NS}}}embed"))
+                if media is None:
+                    continue
+                if ext is None or not ext.get('cx') or not ext.get('cy'):
+                    unknown.add(media)
+                    continue
+                width = math.ceil(int(ext.get('cx')) / xlsx_writer.EMU_PER_PIXEL)
+                height = math.ceil(int(ext.get('cy')) / xlsx_writer.EMU_PER_PIXEL)
+                current = sizes.get(media, (0, 0))
+                sizes[media] = (max(current[0], width), max(current[1], height))
+    for media in unknown:
+        sizes.pop(media, None)
+    return sizes
+
+
+# 整理工作簿中的图片并写入 target（source、target 为文件路径或文件对象）
+# 返回统计：图片部件数、重新编码数、去除的重复部件数
+def compact_workbook(source, target, quality=JPEG_QUALITY):
+    from PIL import Image as PILImage
+
+    stats = {'images': 0, 'reencoded': 0, 'duplicates': 0}
+    with xlsx_writer.open_source(source) as fp, zipfile.ZipFile(fp) as archive:
+        names = archive.namelist()
+        sizes = display_sizes(archive, names)
+        media_parts = [name for name in names if name.startswith('xl/media/')]
+        stats['images'] = len(media_parts)
+
+        renamed = {}  # 原部件 -> 新部件（被合并的重复部件指向保留的部件）
+        contents = {}  # 保留的部件 -> (原部件, 新数据；None 表示原样复制)
+        by_digest = {}
+        taken = set(names)
+        for part in media_parts:
+            data = archive.read(part)
+            new_part, new_data = part, None
+            try:
+                img = PILImage.open(io.BytesIO(data))
+                img.load()
+            except Exception:
+                img = None  # 非位图（如 EMF）保持不变
+            if img is not None:
+                size = sizes.get(part)
+                resized = bool(size) and (img.width > size[0] or img.height > size[1])
+                if resized:
+                    img.thumbnail((max(size[0], 1), max(size[1], 1)))
+                # 不缩小的 JPEG 不再重新编码，避免每次整理都损失画质
+                if img.format == 'JPEG' and not resized:
+                    encoded = data
+                else:
+                    media_format, encoded = encode_image(img, quality)
+                if len(encoded) < len(data):
+                    extension = xlsx_writer.MEDIA_FORMATS[media_format][0]
+                    new_part = f"{posixpath.splitext(part)[0]}.{extension}"
+                    if new_part != part and new_part in taken:
+                        new_part = f"{posixpath.splitext(part)[0]}-{len(taken)}.{extension}"
+                    new_data = encoded
+                    stats['reencoded'] += 1
+
+            digest = hashlib.sha256(data if new_data is None else new_data).hexdigest()
+            if digest in by_digest:
+                renamed[part] = by_digest[digest]
+                stats['duplicates'] += 1
+                continue
+            by_digest[digest] = new_part
+            renamed[part] = new_part
+            contents[new_part] = (part, new_data)
+            taken.add(new_part)
+
+        changed = {part: new_part for part, new_part in renamed.items() if part != new_part}
+        replaced = {}
+        for rels_part in names:
+            if not rels_part.endswith('.rels') or not changed:
+                continue
+            xml = archive.read(rels_part).decode('utf-8')
+
+            def retarget(match):
+                element = match.group(0)
+                if 'TargetMode="External"' in element:
+                    return element
+                target = re.search(r'\bTarget="([^"]*)"', element)
+                part = xlsx_writer.resolve_target(rels_part, target.group(1)) if target else None
+                if part not in changed:
+                    return element
+                return element.replace(target.group(0), f'Target="/{changed[part]}"')
+
+            rewritten = re.sub(r'<Relationship\b[^>]*>', retarget, xml)
+            if rewritten != xml:
+                replaced[rels_part] = rewritten
+
+        types_xml = archive.read('[Content_Types].xml').decode('utf-8')
+        # 去掉已不存在的图片部件的单独声明，并补充新扩展名的默认类型
+        types_xml = re.sub(r'<Override\b[^>]*\bPartName="/([^"]*)"[^>]*/>',
+                           lambda match: '' if match.group(1) in changed else match.group(0), types_xml)
+        additions = ''
+        for extension, content_type in xlsx_writer.MEDIA_FORMATS.values():
+            if any(part.endswith('.' + extension) for part in contents) and \
+                    not re.search(rf'Extension="{extension}"', types_xml, re.IGNORECASE):
+                additions += f'<Default Extension="{extension}" ContentType="{content_type}"/>'
+        replaced['[Content_Types].xml'] = types_xml.replace('</Types>', additions + '</Types>', 1)
+
+        # 改写的部件与重新编码的图片先写入内存中的 zip，再与其余部件一起按原样复制到 target
+        added = io.BytesIO()
+        with zipfile.ZipFile(added, 'w', zipfile.ZIP_DEFLATED) as parts:
+            for name, text in replaced.items():
+                xlsx_writer.write_text(parts, name, text)
+            for new_part, (original, new_data) in contents.items():
+                if new_data is not None:
+                    parts.writestr(zipfile.ZipInfo(new_part, archive.getinfo(original).date_time), new_data,
+                                   zipfile.ZIP_STORED)
+
+        with zipfile.ZipFile(added) as parts, xlsx_writer.ZipCopier(target) as output:
+            written = set()
+            for info in archive.infolist():
+                name = info.filename
+                if name in replaced:
+                    output.copy(added, parts.getinfo(name))
+                elif name in renamed:
+                    new_part = renamed[name]
+                    if new_part in written:
+                        continue  # 重复的图片
+                    original, new_data = contents[new_part]
+                    if new_data is None:
+                        output.copy(fp, archive.getinfo(original))
+                    else:
+                        output.copy(added, parts.getinfo(new_part))
+                    written.add(new_part)
+                else:
+                    output.copy(fp, info)
+    return stats
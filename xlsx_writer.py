@@ -0,0 +1,542 @@
+"""提交记录工作表的直接渲染
+
+每次提交生成的工作表结构固定（标签与值、分节标题、成员与获奖表格、证明图片），
+不经过 openpyxl 的单元格对象，直接按行输出 SpreadsheetML：
+    Sheet           登记单元格、行高、列宽与图片；iter_rows() 的结果与 openpyxl 的
+                    ws.iter_rows(values_only=True) 一致，可直接交给记录解析函数
+    SheetImage      已编码的图片（PNG 或 JPEG 数据与像素尺寸），写入冲突重试时无需重新编码
+    write_workbook  生成只包含一个工作表的新工作簿
+    append_sheet    把工作表追加到已有工作簿：其余部件连同压缩数据原样复制，只改写工作簿目录、
+                    关系、内容类型，以及（旧工作簿缺少表头样式时）样式表
+    extract_sheet   从已有工作簿中取出一个工作表，写成只包含该工作表的工作簿（同样按原样复制部件）
+    ZipCopier       按原样复制 zip 条目（不解压也不重新压缩），追加工作表与整理工作簿时使用
+字符串与 openpyxl 一样以内联字符串（inlineStr）写出，追加时不需要改写共享字符串表；
+新工作簿使用预先生成的样式表，其中表头样式（12 号粗体）固定为第 1 号单元格格式。
+"""
+import contextlib
+import io
+import os
+import posixpath
+import re
+import struct
+import zipfile
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACKAGE_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+DRAWING_NS = 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing'
+DRAWINGML_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+
+CONTENT_TYPES = {
+    'workbook': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml',
+    'worksheet': 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml',
+    'styles': 'application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml',
+    'drawing': 'application/vnd.openxmlformats-officedocument.drawing+xml',
+}
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# 与 openpyxl 相同：这些控制字符不能出现在 XML 中
+ILLEGAL_CHARACTERS = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+
+# 1 像素对应的 EMU（绘图部件中的长度单位）
+EMU_PER_PIXEL = 9525
+
+# 表头字体，与 openpyxl 的 Font(bold=True, size=12) 序列化结果相同
+HEADER_FONT = '<font><b val="1"/><sz val="12"/></font>'
+
+# 预置样式表：第 0 号为默认格式，第 1 号为表头格式
+STYLES_XML = (
+    XML_DECLARATION
+    + f'<styleSheet xmlns="{MAIN_NS}">'
+    '<fonts count="2"><font><name val="Calibri"/><family val="2"/><sz val="11"/></font>'
+    + HEADER_FONT + '</fonts>'
+    '<fills count="2"><fill><patternFill/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+# 单元格样式名称 -> 预置样式表中的单元格格式序号
+PRESET_STYLES = {'header': 1}
+
+
+# 图片格式 -> (扩展名, 内容类型)
+MEDIA_FORMATS = {
+    'png': ('png', 'image/png'),
+    'jpeg': ('jpg', 'image/jpeg'),
+}
+
+
+class SheetImage:
+    def __init__(self, data, width, height, format='png'):
+        self.data = data  # 编码后的图片数据，格式见 MEDIA_FORMATS
+        self.width = width
+        self.height = height
+        self.format = format
+
+
+def column_letter(column):
+    letters = ''
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+class Sheet:
+    def __init__(self):
+        self.cells = {}  # (行, 列) -> (值, 样式名称)
+        self.row_heights = {}
+        self.column_widths = {}
+        self.images = []  # (行, 列, SheetImage)
+
+    def cell(self, row, column, value=None, style=None):
+        if isinstance(value, str) and ILLEGAL_CHARACTERS.search(value):
+            raise ValueError(f"{value!r} 包含不能写入工作表的字符")
+        self.cells[(row, column)] = (value, style)
+
+    # 在单元格位置插入图片（左上角对齐单元格，按原始像素尺寸显示）
+    def add_image(self, row, column, image):
+        self.images.append((row, column, image))
+
+    @property
+    def max_row(self):
+        return max((row for row, column in self.cells), default=1)
+
+    @property
+    def max_column(self):
+        return max((column for row, column in self.cells), default=1)
+
+    def iter_rows(self):
+        max_column = self.max_column
+        for row in range(1, self.max_row + 1):
+            yield tuple(self.cells.get((row, column), (None, None))[0] for column in range(1, max_column + 1))
+
+    # 逐段生成工作表 XML；styles 为样式名称 -> 单元格格式序号，drawing_rel 为绘图部件的关系ID
+    def iter_xml(self, styles, drawing_rel=None):
+        yield (f'{XML_DECLARATION}<worksheet xmlns="{MAIN_NS}" xmlns:r="{REL_NS}">'
+               '<sheetPr><outlinePr summaryBelow="1" summaryRight="1"/><pageSetUpPr/></sheetPr>'
+               f'<dimension ref="A1:{column_letter(self.max_column)}{self.max_row}"/>'
+               '<sheetViews><sheetView workbookViewId="0"><selection activeCell="A1" sqref="A1"/></sheetView>'
+               '</sheetViews><sheetFormatPr baseColWidth="8" defaultRowHeight="15"/>')
+        if self.column_widths:
+            yield '<cols>' + ''.join(
+                f'<col min="{column}" max="{column}" width="{width}" customWidth="1"/>'
+                for column, width in sorted(self.column_widths.items())
+            ) + '</cols>'
+
+        yield '<sheetData>'
+        rows = {}
+        for (row, column), (value, style) in self.cells.items():
+            rows.setdefault(row, []).append((column, value, style))
+        for row in sorted(rows.keys() | self.row_heights.keys()):
+            height = self.row_heights.get(row)
+            attributes = f' ht="{height}" customHeight="1"' if height is not None else ''
+            cells = ''.join(_cell_xml(row, column, value, styles.get(style, 0))
+                            for column, value, style in sorted(rows.get(row, ()), key=lambda cell: cell[0]))
+            yield f'<row r="{row}"{attributes}>{cells}</row>'
+        yield '</sheetData>'
+
+        yield '<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/>'
+        if drawing_rel:
+            yield f'<drawing r:id="{drawing_rel}"/>'
+        yield '</worksheet>'
+
+    # 绘图部件 XML，第 i 张图片对应关系ID rId<i+1>
+    def drawing_xml(self):
+        anchors = []
+        for i, (row, column, image) in enumerate(self.images, 1):
+            anchors.append(
+                f'<xdr:oneCellAnchor><xdr:from><xdr:col>{column - 1}</xdr:col><xdr:colOff>0</xdr:colOff>'
+                f'<xdr:row>{row - 1}</xdr:row><xdr:rowOff>0</xdr:rowOff></xdr:from>'
+                f'<xdr:ext cx="{image.width * EMU_PER_PIXEL}" cy="{image.height * EMU_PER_PIXEL}"/>'
+                f'<xdr:pic><xdr:nvPicPr><xdr:cNvPr id="{i}" name="Image {i}" descr="Picture"/><xdr:cNvPicPr/>'
+                f'</xdr:nvPicPr><xdr:blipFill><a:blip cstate="print" r:embed="rId{i}"/>'
+                '<a:stretch><a:fillRect/></a:stretch></xdr:blipFill>'
+                '<xdr:spPr><a:prstGeom prst="rect"/></xdr:spPr></xdr:pic><xdr:clientData/></xdr:oneCellAnchor>'
+            )
+        return (f'{XML_DECLARATION}<xdr:wsDr xmlns:xdr="{DRAWING_NS}" xmlns:a="{DRAWINGML_NS}" '
+                f'xmlns:r="{REL_NS}">' + ''.join(anchors) + '</xdr:wsDr>')
+
+
+def _cell_xml(row, column, value, style_id):
+    reference = f"{column_letter(column)}{row}"
+    style = f' s="{style_id}"' if style_id else ''
+    if value is None:
+        return f'<c r="{reference}"{style}/>' if style else ''
+    if isinstance(value, bool):
+        return f'<c r="{reference}"{style} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{reference}"{style}><v>{value!r}</v></c>'
+    value = str(value)
+    if not value:
+        return f'<c r="{reference}"{style} t="inlineStr"/>'
+    space = ' xml:space="preserve"' if value != value.strip() else ''
+    return f'<c r="{reference}"{style} t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
+
+
+def _relationships(relationships):
+    return (f'{XML_DECLARATION}<Relationships xmlns="{PACKAGE_REL_NS}">'
+            + ''.join(f'<Relationship Id="{rel_id}" Type="{rel_type}" Target={quoteattr(target)}/>'
+                      for rel_id, rel_type, target in relationships)
+            + '</Relationships>')
+
+
+def write_text(archive, name, text, compress_type=zipfile.ZIP_DEFLATED):
+    archive.writestr(zipfile.ZipInfo(name, (1980, 1, 1, 0, 0, 0)), text.encode('utf-8'), compress_type)
+
+
+# 写入工作表及其绘图、图片部件，返回需要登记的 (部件名, 内容类型)
+def _write_sheet_parts(archive, sheet, sheet_part, drawing_part, first_image, styles):
+    overrides = [(sheet_part, CONTENT_TYPES['worksheet'])]
+    drawing_rel = None
+    if sheet.images:
+        drawing_rel = 'rId1'
+        sheet_dir, _, sheet_file = sheet_part.rpartition('/')
+        write_text(archive, f"{sheet_dir}/_rels/{sheet_file}.rels",
+                    _relationships([(drawing_rel, f"{REL_NS}/drawing", f"/{drawing_part}")]))
+
+        drawing_dir, _, drawing_file = drawing_part.rpartition('/')
+        write_text(archive, drawing_part, sheet.drawing_xml())
+        image_rels = []
+        for i, (row, column, image) in enumerate(sheet.images):
+            media = f"xl/media/image{first_image + i}.{MEDIA_FORMATS[image.format][0]}"
+            # 图片已经压缩过，直接存储
+            archive.writestr(zipfile.ZipInfo(media, (1980, 1, 1, 0, 0, 0)), image.data, zipfile.ZIP_STORED)
+            image_rels.append((f"rId{i + 1}", f"{REL_NS}/image", f"/{media}"))
+        write_text(archive, f"{drawing_dir}/_rels/{drawing_file}.rels", _relationships(image_rels))
+        overrides.append((drawing_part, CONTENT_TYPES['drawing']))
+
+    info = zipfile.ZipInfo(sheet_part, (1980, 1, 1, 0, 0, 0))
+    info.compress_type = zipfile.ZIP_DEFLATED
+    with archive.open(info, 'w') as f:
+        for chunk in sheet.iter_xml(styles, drawing_rel):
+            f.write(chunk.encode('utf-8'))
+    return overrides
+
+
+def _sheet_entry(name, sheet_id, rel_id):
+    return f'<sheet xmlns:r="{REL_NS}" name={quoteattr(name)} sheetId="{sheet_id}" state="visible" r:id="{rel_id}"/>'
+
+
+def _override(part, content_type):
+    return f'<Override PartName="/{part}" ContentType="{content_type}"/>'
+
+
+# 生成只包含一个工作表的新工作簿，target 为可写入的文件对象或路径
+def write_workbook(target, sheet_name, sheet):
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as archive:
+        overrides = _write_sheet_parts(archive, sheet, 'xl/worksheets/sheet1.xml', 'xl/drawings/drawing1.xml', 1,
+                                       PRESET_STYLES)
+        write_text(archive, 'xl/styles.xml', STYLES_XML)
+        write_text(archive, 'xl/workbook.xml', (
+            f'{XML_DECLARATION}<workbook xmlns="{MAIN_NS}"><workbookPr/>'
+            '<bookViews><workbookView activeTab="0"/></bookViews>'
+            f'<sheets>{_sheet_entry(sheet_name, 1, "rId1")}</sheets>'
+            '<calcPr calcId="124519" fullCalcOnLoad="1"/></workbook>'
+        ))
+        write_text(archive, 'xl/_rels/workbook.xml.rels', _relationships([
+            ('rId1', f"{REL_NS}/worksheet", '/xl/worksheets/sheet1.xml'),
+            ('rId2', f"{REL_NS}/styles", 'styles.xml'),
+        ]))
+        write_text(archive, '_rels/.rels', _relationships([
+            ('rId1', f"{REL_NS}/officeDocument", 'xl/workbook.xml'),
+        ]))
+        overrides += [('xl/workbook.xml', CONTENT_TYPES['workbook']), ('xl/styles.xml', CONTENT_TYPES['styles'])]
+        write_text(archive, '[Content_Types].xml', (
+            f'{XML_DECLARATION}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            + ''.join(f'<Default Extension="{extension}" ContentType="{content_type}"/>'
+                      for extension, content_type in MEDIA_FORMATS.values())
+            + ''.join(_override(part, content_type) for part, content_type in overrides)
+            + '</Types>'
+        ))
+
+
+# 工作簿中的工作表名称（按工作簿中的顺序），source 为文件路径或文件对象
+def sheet_names(source):
+    with zipfile.ZipFile(source) as archive:
+        root = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    return [sheet.get('name') for sheet in root.iter(f"{{{MAIN_NS}}}sheet")]
+
+
+# 在样式表中查找表头格式（12 号粗体、无其他格式），没有时追加；返回 (样式表, 格式序号)
+def ensure_header_style(styles_xml):
+    root = ElementTree.fromstring(styles_xml)
+    fonts = root.find(f"{{{MAIN_NS}}}fonts")
+    cell_xfs = root.find(f"{{{MAIN_NS}}}cellXfs")
+    font_count = len(fonts) if fonts is not None else 0
+    xf_count = len(cell_xfs) if cell_xfs is not None else 0
+
+    for font_id, font in enumerate(fonts if fonts is not None else ()):
+        values = {child.tag.rpartition('}')[2]: child.get('val') for child in font}
+        if set(values) != {'b', 'sz'} or values['b'] not in (None, '1', 'true') or values['sz'] != '12':
+            continue
+        for xf_id, xf in enumerate(cell_xfs if cell_xfs is not None else ()):
+            if (xf.get('fontId') == str(font_id) and len(xf) == 0 and xf.get('quotePrefix') in (None, '0')
+                    and all(xf.get(attribute, '0') == '0' for attribute in ('numFmtId', 'fillId', 'borderId'))):
+                return styles_xml, xf_id
+
+    if fonts is None or cell_xfs is None:
+        raise ValueError('样式表缺少字体或单元格格式列表')
+    styles_xml = _append_to_list(styles_xml, 'fonts', HEADER_FONT, font_count + 1)
+    styles_xml = _append_to_list(
+        styles_xml, 'cellXfs',
+        f'<xf numFmtId="0" fontId="{font_count}" fillId="0" borderId="0" xfId="0" applyFont="1"/>', xf_count + 1
+    )
+    return styles_xml, xf_count
+
+
+def _append_to_list(xml, tag, child, count):
+    xml = re.sub(rf'(<{tag}\b[^>]*?\bcount=")\d+', rf'\g<1>{count}', xml, count=1)
+    if f'</{tag}>' not in xml:
+        raise ValueError(f"样式表中的 {tag} 格式无法识别")
+    return xml.replace(f'</{tag}>', child + f'</{tag}>', 1)
+
+
+def _next_number(names, pattern):
+    numbers = [int(match.group(1)) for match in map(re.compile(pattern).fullmatch, names) if match]
+    return max(numbers, default=0) + 1
+
+
+# 把工作表追加到 source 工作簿并写入 target（均为文件路径或文件对象），
+# 已有的工作表、图片等部件连同压缩数据原样复制，不解析其内容
+def append_sheet(source, target, sheet_name, sheet):
+    with open_source(source) as fp, zipfile.ZipFile(fp) as archive:
+        names = archive.namelist()
+        workbook_xml = archive.read('xl/workbook.xml').decode('utf-8')
+        rels_xml = archive.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+        types_xml = archive.read('[Content_Types].xml').decode('utf-8')
+        styles_xml, header_style = ensure_header_style(archive.read('xl/styles.xml').decode('utf-8'))
+
+        sheet_part = 'xl/worksheets/sheet%d.xml' % _next_number(names, r'xl/worksheets/sheet(\d+)\.xml')
+        drawing_part = 'xl/drawings/drawing%d.xml' % _next_number(names, r'xl/drawings/drawing(\d+)\.xml')
+        first_image = _next_number(names, r'xl/media/image(\d+)\.\w+')
+
+        rel_id = 'rId%d' % (max(map(int, re.findall(r'Id="rId(\d+)"', rels_xml)), default=0) + 1)
+        rels_xml = rels_xml.replace('</Relationships>', (
+            f'<Relationship Id="{rel_id}" Type="{REL_NS}/worksheet" Target="/{sheet_part}"/></Relationships>'
+        ), 1)
+        sheet_id = max(map(int, re.findall(r'<sheet\b[^>]*?\bsheetId="(\d+)"', workbook_xml)), default=0) + 1
+        workbook_xml = workbook_xml.replace('</sheets>', _sheet_entry(sheet_name, sheet_id, rel_id) + '</sheets>', 1)
+
+        replaced = {
+            'xl/workbook.xml': workbook_xml,
+            'xl/_rels/workbook.xml.rels': rels_xml,
+            'xl/styles.xml': styles_xml,
+        }
+        # 新部件与改写后的部件先写入内存中的 zip，再与原有部件一起按原样复制到 target
+        added = io.BytesIO()
+        with zipfile.ZipFile(added, 'w', zipfile.ZIP_DEFLATED) as parts:
+            overrides = _write_sheet_parts(parts, sheet, sheet_part, drawing_part, first_image,
+                                           {**PRESET_STYLES, 'header': header_style})
+            additions = ''.join(_override(part, content_type) for part, content_type in overrides)
+            for extension, content_type in {MEDIA_FORMATS[image.format] for row, column, image in sheet.images}:
+                if not re.search(rf'Extension="{extension}"', types_xml, re.IGNORECASE):
+                    additions += f'<Default Extension="{extension}" ContentType="{content_type}"/>'
+            replaced['[Content_Types].xml'] = types_xml.replace('</Types>', additions + '</Types>', 1)
+            for name, text in replaced.items():
+                write_text(parts, name, text)
+
+        with zipfile.ZipFile(added) as parts, ZipCopier(target) as output:
+            for info in archive.infolist():
+                if info.filename in replaced:
+                    output.copy(added, parts.getinfo(info.filename))
+                else:
+                    output.copy(fp, info)
+            for info in parts.infolist():
+                if info.filename not in replaced:
+                    output.copy(added, info)
+
+
+# 从 source 工作簿中取出名为 sheet_name 的工作表，写成只包含该工作表的工作簿 target（均为文件路径或文件对象）；
+# 工作表不存在时返回 False。该工作表关系链上的部件（绘图、图片等）与工作簿级部件（样式、主题、共享字符串等）
+# 连同压缩数据原样复制，其余工作表及只被它们引用的部件不写入；只改写工作簿目录、工作簿关系与内容类型
+def extract_sheet(source, target, sheet_name):
+    with open_source(source) as fp, zipfile.ZipFile(fp) as archive:
+        names = set(archive.namelist())
+        workbook_xml = archive.read('xl/workbook.xml').decode('utf-8')
+        sheets = list(ElementTree.fromstring(workbook_xml).iter(f"{{{MAIN_NS}}}sheet"))
+        index = next((i for i, sheet in enumerate(sheets) if sheet.get('name') == sheet_name), None)
+        if index is None:
+            return False
+
+        # 工作簿目录中只保留该工作表；工作表级的定义名称随之调整，活动工作表改为第一个
+        entries = re.findall(r'<sheet\b[^>]*/>', workbook_xml)
+        if len(entries) != len(sheets):
+            raise ValueError('工作簿目录格式无法识别')
+        workbook_xml = re.sub(r'<sheet\b[^>]*/>', lambda match: match.group(0) if match.group(0) == entries[index] else '',
+                              workbook_xml)
+
+        def local_name(match):
+            local = re.search(r'\blocalSheetId="(\d+)"', match.group(0))
+            if local is None:
+                return match.group(0)
+            if int(local.group(1)) != index:
+                return ''
+            return match.group(0).replace(local.group(0), 'localSheetId="0"', 1)
+
+        workbook_xml = re.sub(r'<definedName\b[^>]*>.*?</definedName>', local_name, workbook_xml, flags=re.DOTALL)
+        workbook_xml = re.sub(r'<definedNames>\s*</definedNames>', '', workbook_xml)
+        workbook_xml = re.sub(r'\s(?:activeTab|firstSheet)="\d+"', '', workbook_xml)
+
+        # 工作簿关系中去掉其他工作表与计算链（计算链引用了其他工作表，Excel 打开时会重新生成）
+        dropped = {sheet.get(f"{{{REL_NS}}}id") for i, sheet in enumerate(sheets) if i != index}
+        workbook_rels = re.sub(
+            r'<Relationship\b[^>]*/>',
+            lambda match: '' if re.search(r'\bId="([^"]*)"', match.group(0)).group(1) in dropped
+            or re.search(r'\bType="[^"]*/calcChain"', match.group(0)) else match.group(0),
+            archive.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+        )
+        replaced = {'xl/workbook.xml': workbook_xml, 'xl/_rels/workbook.xml.rels': workbook_rels}
+
+        # 从包关系出发，沿各部件的关系找出仍被引用的部件
+        kept = {'[Content_Types].xml', '_rels/.rels'}
+        pending = [('_rels/.rels', archive.read('_rels/.rels').decode('utf-8'))]
+        while pending:
+            rels_name, rels_xml = pending.pop()
+            for rel in ElementTree.fromstring(rels_xml):
+                if rel.get('TargetMode') == 'External':
+                    continue
+                part = resolve_target(rels_name, rel.get('Target', ''))
+                if part not in names or part in kept:
+                    continue
+                kept.add(part)
+                part_rels = rels_part(part)
+                if part_rels in names:
+                    kept.add(part_rels)
+                    pending.append((part_rels, replaced.get(part_rels) or archive.read(part_rels).decode('utf-8')))
+
+        replaced['[Content_Types].xml'] = re.sub(
+            r'<Override\b[^>]*\bPartName="/([^"]*)"[^>]*/>',
+            lambda match: match.group(0) if match.group(1) in kept else '',
+            archive.read('[Content_Types].xml').decode('utf-8')
+        )
+
+        added = io.BytesIO()
+        with zipfile.ZipFile(added, 'w', zipfile.ZIP_DEFLATED) as parts:
+            for name, text in replaced.items():
+                write_text(parts, name, text)
+        with zipfile.ZipFile(added) as parts, ZipCopier(target) as output:
+            for info in archive.infolist():
+                if info.filename in replaced:
+                    output.copy(added, parts.getinfo(info.filename))
+                elif info.filename in kept:
+                    output.copy(fp, info)
+    return True
+
+
+# 关系文件中的目标 -> 包内部件名（相对于关系所属部件的目录，或以 / 开头的绝对路径）
+def resolve_target(rels_name, target):
+    if target.startswith('/'):
+        return target[1:]
+    base = posixpath.dirname(posixpath.dirname(rels_name))
+    return posixpath.normpath(posixpath.join(base, target))
+
+
+# 部件 -> 它的关系文件
+def rels_part(part):
+    directory, _, name = part.rpartition('/')
+    return f"{directory}/_rels/{name}.rels"
+
+
+# 打开 zip 文件用于按原样复制条目：source 为路径时打开文件，为文件对象时直接使用
+@contextlib.contextmanager
+def open_source(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as fp:
+            yield fp
+    else:
+        yield source
+
+
+# zip 文件格式（APPNOTE 4.3.7、4.3.12、4.3.16）：本地文件头、中央目录项、中央目录结束记录
+LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+END_RECORD = struct.Struct('<4s4H2LH')
+ZIP32_LIMIT = 0xFFFFFFFF
+
+
+class ZipCopier:
+    """把已有 zip 文件中的条目连同压缩数据原样写入新的 zip 文件，不解压也不重新压缩
+
+    追加工作表时整本工作簿都要复制一遍，原样复制只有文件读写的开销，不会对已有部件重新做一遍压缩。
+    按 zip 文件格式直接读写文件头，只使用 ZipInfo 的公开属性，不依赖 zipfile 模块的内部实现；
+    不支持 ZIP64（工作簿远小于 4GB），超过限制时抛出 zipfile.LargeZipFile。
+    """
+
+    def __init__(self, target):
+        self.owns_file = isinstance(target, (str, os.PathLike))
+        self.fp = open(target, 'wb') if self.owns_file else target
+        self.entries = []  # (ZipInfo, 本地文件头偏移)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is None:
+                self._write_central_directory()
+        finally:
+            if self.owns_file:
+                self.fp.close()
+
+    # 复制 fp（zip 文件对象）中 info 对应的条目
+    def copy(self, fp, info):
+        if info.flag_bits & 0x1:
+            raise zipfile.BadZipFile(f"{info.filename} 已加密，无法复制")
+        if max(info.compress_size, info.file_size, self.fp.tell()) >= ZIP32_LIMIT:
+            raise zipfile.LargeZipFile(f"{info.filename} 超过 4GB")
+        fp.seek(info.header_offset)
+        header = fp.read(LOCAL_HEADER.size)
+        if len(header) != LOCAL_HEADER.size or header[:4] != b'PK\x03\x04':
+            raise zipfile.BadZipFile(f"{info.filename} 的文件头无效")
+        name_length, extra_length = LOCAL_HEADER.unpack(header)[-2:]
+        fp.seek(info.header_offset + LOCAL_HEADER.size + name_length + extra_length)
+
+        # 新的文件头直接写入 CRC 与大小（不使用数据描述符），文件名按 UTF-8 编码
+        offset = self.fp.tell()
+        name = info.filename.encode('utf-8')
+        flags = 0 if name.isascii() else 0x800
+        self.fp.write(LOCAL_HEADER.pack(b'PK\x03\x04', 20, flags, info.compress_type, *_dos_time(info.date_time),
+                                        info.CRC, info.compress_size, info.file_size, len(name), 0))
+        self.fp.write(name)
+        remaining = info.compress_size
+        while remaining:
+            chunk = fp.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                raise zipfile.BadZipFile(f"{info.filename} 数据不完整")
+            self.fp.write(chunk)
+            remaining -= len(chunk)
+        self.entries.append((info, offset))
+
+    def _write_central_directory(self):
+        if len(self.entries) > 0xFFFF:
+            raise zipfile.LargeZipFile('条目数超过 65535')
+        start = self.fp.tell()
+        for info, offset in self.entries:
+            name = info.filename.encode('utf-8')
+            flags = 0 if name.isascii() else 0x800
+            self.fp.write(CENTRAL_HEADER.pack(
+                b'PK\x01\x02', info.create_system << 8 | 20, 20, flags, info.compress_type,
+                *_dos_time(info.date_time), info.CRC, info.compress_size, info.file_size, len(name), 0, 0, 0,
+                info.internal_attr, info.external_attr, offset
+            ))
+            self.fp.write(name)
+        size = self.fp.tell() - start
+        if start >= ZIP32_LIMIT:
+            raise zipfile.LargeZipFile('zip 文件超过 4GB')
+        self.fp.write(END_RECORD.pack(b'PK\x05\x06', 0, 0, len(self.entries), len(self.entries), size, start, 0))
+
+
+# ZipInfo.date_time -> (DOS 时间, DOS 日期)
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day